@@ -1,15 +1,21 @@
 import nested_admin
 from django.contrib import admin, messages
 from django.contrib.admin import DateFieldListFilter
+from django.db.models import Count
 from django.contrib.admin.widgets import AutocompleteSelect
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.forms import AdminPasswordChangeForm
-from django.shortcuts import redirect
+from django.shortcuts import redirect, render
 from django.urls import reverse
 from django.utils.html import format_html
-from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
-from .models import User, Course, Enrollment, Topic, Test, Question, Answer, UserTestResult, Registration
+from .models import (
+    User, Course, Enrollment, Topic, Test, Question, Answer, UserTestResult, TestAttempt, Registration, Task,
+)
+from .enrollments import bulk_enroll, parse_usernames, summarize, refresh_enrollments, delete_enrollments
+from .search import search_condition, USER_INDEX, COURSE_INDEX
+from .topics import reorder_topics
+from .cloning import clone_course
 from django import forms
 from django_summernote.widgets import SummernoteWidget
 
@@ -76,6 +82,38 @@ class TopicInline(nested_admin.NestedStackedInline):
     form = TopicForm
 
 
+class CompactTopicInline(nested_admin.NestedTabularInline):
+    """
+    Темы курса без вложенных тестов: одна строка на тему, тест и вопросы
+    редактируются на странице темы. Страница курса грузится фиксированным
+    числом запросов, а POST содержит только поля тем.
+    """
+    model = Topic
+    extra = 0
+    max_num = 33
+    fields = ('order', 'title', 'video_title', 'video_url', 'duration_in_minutes', 'test_summary', 'edit_link')
+    readonly_fields = ('test_summary', 'edit_link')
+    verbose_name_plural = "Темы (тест темы — по ссылке «Открыть»; всё дерево сразу — ?tree=full)"
+
+    def get_queryset(self, request):
+        # course — для __str__ в заголовке строки
+        return super().get_queryset(request).select_related('course', 'test').annotate(
+            question_count=Count('test__questions')
+        )
+
+    @admin.display(description="Тест")
+    def test_summary(self, obj):
+        if obj.pk is None or not hasattr(obj, 'test'):
+            return "—"
+        return f"{obj.question_count} вопр."
+
+    @admin.display(description="")
+    def edit_link(self, obj):
+        if obj.pk is None:
+            return ""
+        return format_html('<a href="{}">Открыть</a>', reverse('admin:courses_topic_change', args=[obj.pk]))
+
+
 class CustomUserCreationForm(forms.ModelForm):
     password = forms.CharField(label="Password")
     curator = forms.ModelChoiceField(
@@ -113,9 +151,49 @@ class CustomUserChangeForm(forms.ModelForm):
 
 
 
+class BulkEnrollmentForm(forms.Form):
+    course = forms.ModelChoiceField(queryset=Course.objects.all(), label="Курс")
+    usernames = forms.CharField(
+        widget=forms.Textarea(attrs={'rows': 10}),
+        required=False,
+        label="Юзернеймы",
+        help_text="По одному в строке или CSV, первая колонка — username."
+    )
+    csv_file = forms.FileField(required=False, label="CSV-файл")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        usernames = parse_usernames(cleaned_data.get('usernames') or '')
+        csv_file = cleaned_data.get('csv_file')
+        if csv_file:
+            try:
+                usernames += parse_usernames(csv_file.read().decode('utf-8-sig'))
+            except UnicodeDecodeError:
+                raise forms.ValidationError("Файл должен быть в кодировке UTF-8.")
+        if not usernames:
+            raise forms.ValidationError("Укажите юзернеймы или загрузите CSV-файл.")
+        cleaned_data['username_list'] = usernames
+        return cleaned_data
+
+
+# --------------------------------------
+class IndexedSearchMixin:
+    """
+    Поиск через индекс courses.search: {lookup: индекс}. Если индекс не
+    подходит для запроса, работает обычный поиск по search_fields.
+    """
+    search_index = {}
+
+    def get_search_results(self, request, queryset, search_term):
+        condition = search_condition(search_term, self.search_index)
+        if condition is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(condition), False
+
+
 # --------------------------------------
 @admin.register(User)
-class UserAdmin(UserAdmin):
+class UserAdmin(IndexedSearchMixin, UserAdmin):
     form = CustomUserChangeForm
     add_form = CustomUserCreationForm
     model = User
@@ -123,6 +201,7 @@ class UserAdmin(UserAdmin):
     list_display = ('username', 'name', 'role', 'curator')
     list_filter = ('role', 'curator')
     search_fields = ('name', 'username')
+    search_index = {'pk': USER_INDEX}
     ordering = ('name',)
 
     fieldsets = (
@@ -158,23 +237,102 @@ class UserAdmin(UserAdmin):
 # --------------------------------------
 @admin.register(Course)
 class CourseAdmin(nested_admin.NestedModelAdmin):
-    list_display = ('title', 'description')
+    list_display = ('title', 'description', 'access_days')
     list_filter = ('title',)
-    inlines = [TopicInline]
+    inlines = [CompactTopicInline]
+    actions = ['bulk_enroll_students', 'reorder_course_topics', 'clone_courses']
+
+    def get_inlines(self, request, obj):
+        # Полное дерево тема → тест → вопросы → ответы — только по запросу
+        if request.GET.get('tree') == 'full':
+            return [TopicInline]
+        return self.inlines
+
+    @admin.action(description="Массово записать студентов")
+    def bulk_enroll_students(self, request, queryset):
+        if queryset.count() != 1:
+            messages.error(request, "Выберите ровно один курс.")
+            return None
+        url = reverse('admin:bulk_enroll')
+        return redirect(f"{url}?course={queryset.first().pk}")
+
+    @admin.action(description="Изменить порядок тем")
+    def reorder_course_topics(self, request, queryset):
+        if queryset.count() != 1:
+            messages.error(request, "Выберите ровно один курс.")
+            return None
+        return redirect('admin:reorder_topics', queryset.first().pk)
+
+    @admin.action(description="Создать копии курсов")
+    def clone_courses(self, request, queryset):
+        copies = [clone_course(course) for course in queryset.order_by('pk')]
+        titles = ', '.join(f"«{copy.title}»" for copy in copies)
+        messages.success(request, f"Создано копий: {len(copies)} ({titles}).")
+
+    def get_urls(self):
+        from django.urls import path
+        custom_urls = [
+            path('<int:pk>/reorder-topics/', self.admin_site.admin_view(self.reorder_topics_view),
+                 name='reorder_topics'),
+        ]
+        return custom_urls + super().get_urls()
+
+    def reorder_topics_view(self, request, pk):
+        course = Course.objects.filter(pk=pk).first()
+        if course is None:
+            messages.error(request, "Курс не найден.")
+            return redirect('admin:courses_course_changelist')
+        topics = list(Topic.objects.filter(course=course).order_by('order').values('id', 'title', 'ordinal'))
+
+        if request.method == 'POST':
+            # Новые позиции из формы; пустые и некорректные оставляют тему на месте.
+            # При равных позициях перемещённая тема встаёт перед той, что там была
+            def position(topic):
+                value = request.POST.get(f"position_{topic['id']}", '')
+                new = int(value) if value.isdigit() else topic['ordinal'] + 1
+                return new, new == topic['ordinal'] + 1, topic['ordinal']
+            ordered = sorted(topics, key=position)
+            reorder_topics(course.pk, [topic['id'] for topic in ordered])
+            messages.success(request, f"Порядок тем курса «{course.title}» сохранён.")
+            return redirect('admin:reorder_topics', course.pk)
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': f"Порядок тем: {course.title}",
+            'opts': self.model._meta,
+            'course': course,
+            'topics': [{**topic, 'position': topic['ordinal'] + 1} for topic in topics],
+        }
+        return render(request, 'admin/courses/course/reorder_topics.html', context)
 
 
 
 # --------------------------------------
 @admin.register(Enrollment)
-class EnrollmentAdmin(admin.ModelAdmin):
+class EnrollmentAdmin(IndexedSearchMixin, admin.ModelAdmin):
     autocomplete_fields = ['user']
 
     date_hierarchy = 'enrolled_at'
-    list_display = ('user_username', 'user_full_name', 'course_title', 'enrolled_at', 'refresh_enrolled_at_button', 'delete_button')
+    list_display = ('user_username', 'user_full_name', 'course_title', 'enrolled_at', 'expires_at', 'refresh_enrolled_at_button', 'delete_button')
     list_filter = ('user', 'course', ('enrolled_at', DateFieldListFilter),)
+    list_select_related = ('user', 'course')
     ordering = ['-enrolled_at', 'user__name']
 
     search_fields = ['user__username', 'user__name', 'course__title']
+    search_index = {'user': USER_INDEX, 'course': COURSE_INDEX}
+    actions = ['refresh_enrolled_at_selected']
+
+    @admin.action(description="Обновить Enrolled At у выбранных")
+    def refresh_enrolled_at_selected(self, request, queryset):
+        updated = refresh_enrollments(queryset)
+        messages.success(request, f"Дата обновлена у {updated} записей.")
+
+    def delete_queryset(self, request, queryset):
+        # Стандартное действие «Удалить выбранные» — одним DELETE
+        delete_enrollments(queryset)
+
+    def delete_model(self, request, obj):
+        delete_enrollments(Enrollment.objects.filter(pk=obj.pk))
 
     def user_username(self, obj):
         return obj.user.username
@@ -209,29 +367,52 @@ class EnrollmentAdmin(admin.ModelAdmin):
                  name='refresh_enrolled_at'),
             path('delete-enrollment/<int:pk>/', self.admin_site.admin_view(self.delete_enrollment),
                  name='delete_enrollment'),
+            path('bulk-enroll/', self.admin_site.admin_view(self.bulk_enroll_view),
+                 name='bulk_enroll'),
         ]
         return custom_urls + urls
 
+    def bulk_enroll_view(self, request):
+        results = None
+        if request.method == 'POST':
+            form = BulkEnrollmentForm(request.POST, request.FILES)
+            if form.is_valid():
+                results = bulk_enroll(form.cleaned_data['course'], form.cleaned_data['username_list'])
+                summary = summarize(results)
+                messages.success(
+                    request,
+                    f"Записано: {summary.get('enrolled', 0)}, уже были записаны: {summary.get('already_enrolled', 0)}, "
+                    f"не найдено: {summary.get('not_found', 0)}, не студенты: {summary.get('not_student', 0)}."
+                )
+        else:
+            form = BulkEnrollmentForm(initial={'course': request.GET.get('course')})
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': "Массовая запись на курс",
+            'opts': self.model._meta,
+            'form': form,
+            'results': results,
+        }
+        return render(request, 'admin/courses/enrollment/bulk_enroll.html', context)
+
     def refresh_enrolled_at(self, request, pk):
-        from .models import Enrollment
-        try:
-            enrollment = Enrollment.objects.get(pk=pk)
-            enrollment.enrolled_at = now()
-            enrollment.save()
-            messages.success(request, f"Дата {enrollment.user.name} успешно обновлена на текущее время.")
-        except Enrollment.DoesNotExist:
+        enrollment = Enrollment.objects.select_related('user').filter(pk=pk).first()
+        if enrollment is None:
             messages.error(request, "Запись не найдена.")
-        return redirect(request.META.get('HTTP_REFERER', 'admin:app_enrollment_changelist'))
+        else:
+            refresh_enrollments(Enrollment.objects.filter(pk=pk))
+            messages.success(request, f"Дата {enrollment.user.name} успешно обновлена на текущее время.")
+        return redirect(request.META.get('HTTP_REFERER', 'admin:courses_enrollment_changelist'))
 
     def delete_enrollment(self, request, pk):
-        from .models import Enrollment
-        try:
-            enrollment = Enrollment.objects.get(pk=pk)
-            enrollment.delete()
-            messages.success(request, f"Запись для {enrollment.user.name} успешно удалена.")
-        except Enrollment.DoesNotExist:
+        enrollment = Enrollment.objects.select_related('user').filter(pk=pk).first()
+        if enrollment is None:
             messages.error(request, "Запись не найдена.")
-        return redirect(request.META.get('HTTP_REFERER', 'admin:app_enrollment_changelist'))
+        else:
+            delete_enrollments(Enrollment.objects.filter(pk=pk))
+            messages.success(request, f"Запись для {enrollment.user.name} успешно удалена.")
+        return redirect(request.META.get('HTTP_REFERER', 'admin:courses_enrollment_changelist'))
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         if db_field.name == "user":  # Поле user
@@ -242,8 +423,9 @@ class EnrollmentAdmin(admin.ModelAdmin):
 # --------------------------------------
 @admin.register(Topic)
 class TopicAdmin(nested_admin.NestedModelAdmin):
-    list_display = ('title', 'course', 'order', 'video_url', 'video_title')
+    list_display = ('title', 'course', 'order', 'position', 'video_url', 'video_title')
     list_filter = ('course',)
+    list_select_related = ('course',)
     inlines = [TestInline]
 
 
@@ -284,6 +466,18 @@ class UserTestResultAdmin(admin.ModelAdmin):
 
 
 
+# --------------------------------------
+@admin.register(TestAttempt)
+class TestAttemptAdmin(admin.ModelAdmin):
+    list_display = ('user', 'test', 'score', 'passed', 'created_at')
+    list_filter = ('test__topic__course', 'passed')
+    list_select_related = ('user', 'test__topic')
+    date_hierarchy = 'created_at'
+    exclude = ('answers',)
+    readonly_fields = ('user', 'test', 'score', 'passed', 'created_at')
+
+
+
 # --------------------------------------
 @admin.register(Registration)
 class RegistrationAdmin(admin.ModelAdmin):
@@ -293,3 +487,11 @@ class RegistrationAdmin(admin.ModelAdmin):
     search_fields = ('name', 'phone', 'selected_pair')
     list_filter = ('selected_pair', ('created_at', DateFieldListFilter))
 
+
+# --------------------------------------
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'run_at', 'attempts', 'max_attempts', 'finished_at')
+    list_filter = ('status', 'name')
+    ordering = ['-run_at']
+    readonly_fields = ('attempts', 'last_error', 'locked_by', 'created_at', 'started_at', 'finished_at')
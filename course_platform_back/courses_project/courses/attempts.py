@@ -0,0 +1,120 @@
+# courses/attempts.py
+from collections import defaultdict
+
+from .models import TestAttempt
+
+# --------------------------------------
+# Упаковка ответов попытки.
+#
+# Ответы — пары (question_id, answer_id), отсортированные по вопросу
+# (несколько пар на вопрос — мультивыбор). Каждое число пишется как
+# varint (7 бит на байт) разности с предыдущим значением того же вида,
+# разность ответа — в zigzag, т.к. может быть отрицательной. Для id из
+# одного теста это обычно 2–3 байта на ответ вместо строки в таблице.
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value):
+    return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+
+def encode_answers(pairs):
+    """[(question_id, answer_id), ...] -> bytes"""
+    out = bytearray()
+    prev_question = prev_answer = 0
+    for question_id, answer_id in sorted(pairs):
+        _write_varint(out, question_id - prev_question)
+        _write_varint(out, _zigzag(answer_id - prev_answer))
+        prev_question, prev_answer = question_id, answer_id
+    return bytes(out)
+
+
+def decode_answers(data):
+    """bytes -> [(question_id, answer_id), ...]"""
+    values = []
+    value = shift = 0
+    for byte in bytes(data):
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values.append(value)
+        value = shift = 0
+
+    pairs = []
+    question_id = answer_id = 0
+    for i in range(0, len(values) - 1, 2):
+        question_id += values[i]
+        answer_id += _unzigzag(values[i + 1])
+        pairs.append((question_id, answer_id))
+    return pairs
+
+
+def group_answers(pairs):
+    """[(question_id, answer_id), ...] -> [{"question_id", "answer_ids"}, ...]"""
+    grouped = defaultdict(list)
+    for question_id, answer_id in pairs:
+        grouped[question_id].append(answer_id)
+    return [{"question_id": q_id, "answer_ids": a_ids} for q_id, a_ids in grouped.items()]
+
+
+# --------------------------------------
+
+
+def log_attempt(user_id, test_id, score, passed, pairs):
+    return TestAttempt.objects.create(
+        user_id=user_id, test_id=test_id, score=score, passed=passed,
+        answers=encode_answers(pairs),
+    )
+
+
+def attempt_history(user_id, test_id):
+    """Попытки пользователя по тесту, новые первыми, с распакованными ответами."""
+    attempts = TestAttempt.objects.filter(user_id=user_id, test_id=test_id).order_by('-created_at')
+    return [
+        {
+            "id": attempt['id'],
+            "score": attempt['score'],
+            "passed": attempt['passed'],
+            "created_at": attempt['created_at'],
+            "answers": group_answers(decode_answers(attempt['answers'])),
+        }
+        for attempt in attempts.values('id', 'score', 'passed', 'created_at', 'answers')
+    ]
+
+
+def answer_distribution(test_id, since=None, until=None):
+    """
+    Сколько раз выбирали каждый ответ каждого вопроса теста за период.
+    Читается только столбец answers по индексу (test, created_at) —
+    один запрос, подсчёт в памяти.
+    """
+    attempts = TestAttempt.objects.filter(test_id=test_id)
+    if since:
+        attempts = attempts.filter(created_at__gte=since)
+    if until:
+        attempts = attempts.filter(created_at__lt=until)
+
+    total = 0
+    counts = defaultdict(lambda: defaultdict(int))
+    for data in attempts.values_list('answers', flat=True).iterator():
+        total += 1
+        for question_id, answer_id in decode_answers(data):
+            counts[question_id][answer_id] += 1
+    return {
+        "attempts": total,
+        "questions": [
+            {"question_id": q_id, "answers": dict(answers)}
+            for q_id, answers in sorted(counts.items())
+        ],
+    }
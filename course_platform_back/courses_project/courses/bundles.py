@@ -0,0 +1,277 @@
+# courses/bundles.py
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Prefetch
+
+from .models import Course, Topic, Test, Question, Answer
+from .richtext import render_html
+from .topics import refresh_course_totals
+
+# --------------------------------------
+# Пакет курса: курс со всеми темами, тестами, вопросами и ответами одним
+# документом JSON или YAML.
+#
+#   format: courses-bundle
+#   version: 1
+#   course: {title, description, course_type, sub_type, access_days, img}
+#   topics:
+#     - {title, video_url, video_title, duration_in_minutes,
+#        test: null | {pass_mode, pass_threshold, pool_size, shuffle_answers,
+#                      questions: [{text, weight, multiple_choice,
+#                                   answers: [{text, is_correct}]}]}}
+#
+# Импорт сначала проверяет весь пакет полями моделей, затем пишет его в
+# одной транзакции: по bulk_create на уровень, pk берутся из RETURNING
+# (PostgreSQL, SQLite 3.35+). Темы идут в порядке списка. img — имя уже
+# лежащего в хранилище файла, сами файлы в пакет не входят.
+
+BUNDLE_FORMAT = 'courses-bundle'
+BUNDLE_VERSION = 1
+BULK_BATCH_SIZE = 500
+EXPORT_CHUNK_SIZE = 20
+
+COURSE_FIELDS = ('title', 'description', 'course_type', 'sub_type', 'access_days', 'img')
+TOPIC_FIELDS = ('title', 'video_url', 'video_title', 'duration_in_minutes')
+TEST_FIELDS = ('pass_mode', 'pass_threshold', 'pool_size', 'shuffle_answers')
+QUESTION_FIELDS = ('text', 'weight', 'multiple_choice')
+ANSWER_FIELDS = ('text', 'is_correct')
+
+
+class BundleError(ValueError):
+    """Пакет не прошёл проверку; errors — список "путь: сообщение"."""
+
+    def __init__(self, errors):
+        super().__init__(f"Пакет курса содержит ошибки: {len(errors)}")
+        self.errors = errors
+
+
+def parse_bundle(text, fmt='json'):
+    """Разбирает JSON или YAML (нужен PyYAML) в словарь пакета."""
+    if fmt == 'yaml':
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("Для YAML нужен пакет PyYAML.")
+        try:
+            data = yaml.safe_load(text)
+        except yaml.YAMLError as exc:
+            raise ValueError(f"Некорректный YAML: {exc}")
+    else:
+        data = json.loads(text)
+    if not isinstance(data, dict):
+        raise ValueError("Пакет курса должен быть объектом.")
+    return data
+
+
+# --------------------------------------
+# Проверка
+
+
+def _clean(model, fields, data, path, errors):
+    """Значения полей, прошедшие Field.clean; отсутствующие — по умолчанию модели."""
+    if not isinstance(data, dict):
+        errors.append(f"{path}: ожидается объект")
+        return None
+    nested = {'topics', 'test', 'questions', 'answers'}
+    for key in data.keys() - set(fields) - nested:
+        errors.append(f"{path}.{key}: неизвестное поле")
+    values = {}
+    for name in fields:
+        field = model._meta.get_field(name)
+        value = data[name] if name in data else field.get_default()
+        if value is None and field.empty_strings_allowed and not field.null:
+            value = ''
+        try:
+            values[name] = field.clean(value, None)
+        except ValidationError as exc:
+            errors.extend(f"{path}.{name}: {message}" for message in exc.messages)
+    return values
+
+
+def _items(data, key, path, errors):
+    items = data.get(key) or []
+    if not isinstance(items, list):
+        errors.append(f"{path}.{key}: ожидается список" if path else f"{key}: ожидается список")
+        return []
+    return items
+
+
+def validate_bundle(data):
+    """
+    Проверяет пакет целиком и возвращает очищенное дерево
+    {"course": {...}, "topics": [{..., "test": {..., "questions": [...]}}]}.
+    Все найденные ошибки собираются в BundleError.
+    """
+    errors = []
+    if data.get('format', BUNDLE_FORMAT) != BUNDLE_FORMAT:
+        errors.append(f"format: ожидается {BUNDLE_FORMAT}")
+    if data.get('version', BUNDLE_VERSION) != BUNDLE_VERSION:
+        errors.append(f"version: поддерживается только {BUNDLE_VERSION}")
+
+    course = _clean(Course, COURSE_FIELDS, data.get('course'), 'course', errors)
+    topics = []
+    for i, topic_data in enumerate(_items(data, 'topics', None, errors)):
+        path = f"topics[{i}]"
+        topic = _clean(Topic, TOPIC_FIELDS, topic_data, path, errors)
+        if topic is None:
+            continue
+        topic['test'] = None
+        if topic_data.get('test') is not None:
+            path = f"{path}.test"
+            test_data = topic_data['test']
+            test = _clean(Test, TEST_FIELDS, test_data, path, errors)
+            if test is not None:
+                test['questions'] = []
+                for j, question_data in enumerate(_items(test_data, 'questions', path, errors)):
+                    question_path = f"{path}.questions[{j}]"
+                    question = _clean(Question, QUESTION_FIELDS, question_data, question_path, errors)
+                    if question is None:
+                        continue
+                    question['answers'] = []
+                    for k, answer_data in enumerate(_items(question_data, 'answers', question_path, errors)):
+                        answer = _clean(Answer, ANSWER_FIELDS, answer_data, f"{question_path}.answers[{k}]", errors)
+                        if answer is not None:
+                            question['answers'].append(answer)
+                    test['questions'].append(question)
+                topic['test'] = test
+        topics.append(topic)
+
+    if errors:
+        raise BundleError(errors)
+    return {"course": course, "topics": topics}
+
+
+# --------------------------------------
+# Импорт
+
+
+def import_bundle(data, batch_size=BULK_BATCH_SIZE):
+    """
+    Создаёт курс из пакета: проверка, затем одна транзакция с bulk_create
+    на каждый уровень дерева. Возвращает созданный Course.
+    """
+    bundle = validate_bundle(data)
+    with transaction.atomic():
+        # Курс сохраняется обычным save — его receivers обновляют поиск и каталог
+        course = Course.objects.create(**bundle['course'])
+
+        topics = []
+        tests = []
+        for i, values in enumerate(bundle['topics']):
+            values = dict(values)
+            test_values = values.pop('test')
+            topic = Topic(course=course, order=(i + 1) * Topic.ORDER_GAP, ordinal=i, **values)
+            topics.append(topic)
+            if test_values is not None:
+                tests.append((topic, test_values))
+        Topic.objects.bulk_create(topics, batch_size=batch_size)
+
+        test_objects = []
+        questions = []
+        for topic, values in tests:
+            values = dict(values)
+            question_values = values.pop('questions')
+            test = Test(topic=topic, **values)
+            test_objects.append(test)
+            questions.extend((test, question) for question in question_values)
+        Test.objects.bulk_create(test_objects, batch_size=batch_size)
+
+        question_objects = []
+        answers = []
+        for test, values in questions:
+            values = dict(values)
+            answer_values = values.pop('answers')
+            # bulk_create минует save() — text_html считаем сами
+            question = Question(test=test, text_html=render_html(values['text']), **values)
+            question_objects.append(question)
+            answers.extend(
+                Answer(question=question, text_html=render_html(answer['text']), **answer) for answer in answer_values
+            )
+        Question.objects.bulk_create(question_objects, batch_size=batch_size)
+        Answer.objects.bulk_create(answers, batch_size=batch_size)
+        refresh_course_totals([course.pk])
+    course.refresh_from_db(fields=['topic_count', 'total_minutes'])
+    return course
+
+
+# --------------------------------------
+# Экспорт
+
+
+def _values(obj, fields):
+    values = {}
+    for name in fields:
+        value = getattr(obj, name)
+        if name == 'img':
+            value = value.name or None
+        values[name] = value
+    return values
+
+
+def _topic_tree(topic):
+    values = _values(topic, TOPIC_FIELDS)
+    try:
+        test = topic.test
+    except Test.DoesNotExist:
+        test = None
+    if test is None:
+        values['test'] = None
+        return values
+    values['test'] = _values(test, TEST_FIELDS)
+    values['test']['questions'] = [
+        dict(_values(question, QUESTION_FIELDS), answers=[
+            _values(answer, ANSWER_FIELDS) for answer in question.answers.all()
+        ])
+        for question in test.questions.all()
+    ]
+    return values
+
+
+def iter_topics(course, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Темы курса деревьями по порядку. Читаются порциями по chunk_size:
+    на порцию — запрос тем с тестами и по запросу на вопросы и ответы.
+    """
+    topics = Topic.objects.filter(course=course).order_by('order').select_related('test').prefetch_related(
+        Prefetch('test__questions', queryset=Question.objects.order_by('id').prefetch_related(
+            Prefetch('answers', queryset=Answer.objects.order_by('id'))
+        ))
+    )
+    for topic in topics.iterator(chunk_size=chunk_size):
+        yield _topic_tree(topic)
+
+
+def _header(course):
+    return {"format": BUNDLE_FORMAT, "version": BUNDLE_VERSION, "course": _values(course, COURSE_FIELDS)}
+
+
+def export_bundle(course):
+    """Пакет курса одним словарём."""
+    return dict(_header(course), topics=list(iter_topics(course)))
+
+
+def stream_bundle(course, fmt='json'):
+    """Пакет курса частями текста — по теме за раз, без сборки документа в памяти."""
+    if fmt == 'yaml':
+        import yaml
+
+        def dump(value):
+            return yaml.safe_dump(value, allow_unicode=True, sort_keys=False)
+
+        yield dump(_header(course))
+        empty = True
+        for topic in iter_topics(course):
+            # Элементы списка на уровне ключа topics — допустимый блочный YAML
+            yield ("topics:\n" if empty else "") + dump([topic])
+            empty = False
+        if empty:
+            yield "topics: []\n"
+        return
+
+    header = json.dumps(_header(course), ensure_ascii=False)
+    yield header[:-1] + ', "topics": ['
+    for i, topic in enumerate(iter_topics(course)):
+        yield (', ' if i else '') + json.dumps(topic, ensure_ascii=False)
+    yield ']}\n'
@@ -0,0 +1,144 @@
+# courses/catalogue.py
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.db.models import F
+
+from .models import Course, CacheVersion
+from .serializers import CourseSerializer
+
+# --------------------------------------
+# Каталог курсов для публичного поиска.
+#
+# Индекс целиком живёт в памяти процесса: сериализованные курсы,
+# инвертированный индекс по триграммам названия и описания, множества id
+# по значениям course_type / sub_type и готовые порядки сортировки.
+# Запрос — пересечение множеств и подсчёт фасетов по результату, без
+# запросов к базе. Изменение курса увеличивает версию в базе (CacheVersion,
+# см. receivers); процесс сверяется с ней не чаще раза в
+# VERSION_CHECK_SECONDS и перестраивает свой индекс, если она сменилась.
+
+VERSION_NAME = 'catalogue'
+# Сколько секунд другие процессы могут отдавать каталог до изменения;
+# процесс, который изменил курс, видит новую версию сразу
+VERSION_CHECK_SECONDS = 5
+FACETS = ('course_type', 'sub_type')
+ORDERINGS = {
+    'title': ('title', False),
+    '-title': ('title', True),
+    'id': ('id', False),
+    '-id': ('id', True),
+}
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class CatalogueIndex:
+    def __init__(self, version, courses):
+        self.version = version
+        self.docs = {}
+        self.texts = {}
+        self.postings = defaultdict(set)
+        self.facets = {facet: defaultdict(set) for facet in FACETS}
+        for course in courses:
+            self.docs[course['id']] = course
+            text = f"{course['title']}\n{course['description']}".casefold()
+            self.texts[course['id']] = text
+            for trigram in _trigrams(text):
+                self.postings[trigram].add(course['id'])
+            for facet in FACETS:
+                if course[facet] is not None:
+                    self.facets[facet][course[facet]].add(course['id'])
+        self.orders = {
+            'title': sorted(self.docs, key=lambda pk: (self.docs[pk]['title'].casefold(), pk)),
+            'id': sorted(self.docs),
+        }
+
+    def _match(self, word):
+        trigrams = _trigrams(word)
+        if trigrams:
+            candidates = set.intersection(*(self.postings.get(t, set()) for t in trigrams))
+        else:
+            candidates = self.docs.keys()
+        # Триграммы дают кандидатов, подстрока проверяется по тексту
+        return {pk for pk in candidates if word in self.texts[pk]}
+
+    def search(self, query='', filters=None, ordering='title'):
+        """
+        query — слова через пробел, каждое должно встречаться в названии или
+        описании; filters — {facet: значение}. Счётчики фасета считаются с
+        учётом текста и остальных фильтров, но без его собственного, чтобы
+        было видно, сколько курсов даст другое значение.
+        """
+        filters = {facet: value for facet, value in (filters or {}).items() if value}
+        matched = set(self.docs)
+        for word in query.casefold().split():
+            matched &= self._match(word)
+
+        by_facet = {facet: self.facets[facet].get(value, set()) for facet, value in filters.items()}
+        facets = {}
+        for facet in FACETS:
+            base = matched
+            for other, ids in by_facet.items():
+                if other != facet:
+                    base = base & ids
+            facets[facet] = dict(Counter(
+                self.docs[pk][facet] for pk in base if self.docs[pk][facet] is not None
+            ))
+        result_ids = matched
+        for ids in by_facet.values():
+            result_ids = result_ids & ids
+
+        key, reverse = ORDERINGS[ordering]
+        order = reversed(self.orders[key]) if reverse else self.orders[key]
+        return {
+            "count": len(result_ids),
+            "results": [self.docs[pk] for pk in order if pk in result_ids],
+            "facets": facets,
+        }
+
+
+_index = None
+_lock = threading.Lock()
+# (версия, когда прочитана из базы)
+_seen = None
+
+
+def current_version():
+    global _seen
+    seen = _seen
+    if seen is not None and time.monotonic() - seen[1] < VERSION_CHECK_SECONDS:
+        return seen[0]
+    version = CacheVersion.objects.filter(name=VERSION_NAME).values_list('value', flat=True).first() or 0
+    _seen = (version, time.monotonic())
+    return version
+
+
+def get_index():
+    global _index
+    version = current_version()
+    index = _index
+    if index is None or index.version != version:
+        with _lock:
+            if _index is None or _index.version != version:
+                courses = CourseSerializer(Course.objects.order_by('id'), many=True).data
+                _index = CatalogueIndex(version, [dict(course) for course in courses])
+            index = _index
+    return index
+
+
+def invalidate():
+    """Курс изменился — индексы всех процессов устарели."""
+    global _seen
+    if not CacheVersion.objects.filter(name=VERSION_NAME).update(value=F('value') + 1):
+        CacheVersion.objects.bulk_create([CacheVersion(name=VERSION_NAME, value=1)], ignore_conflicts=True)
+    _seen = None
+
+
+def clear():
+    """Забывает индекс и прочитанную версию процесса."""
+    global _index, _seen
+    _index = _seen = None
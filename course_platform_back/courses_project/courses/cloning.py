@@ -0,0 +1,94 @@
+# courses/cloning.py
+import os
+
+from django.db import transaction
+
+from .bundles import BULK_BATCH_SIZE, COURSE_FIELDS, TOPIC_FIELDS, TEST_FIELDS, QUESTION_FIELDS, ANSWER_FIELDS
+from .media import HashedMediaStorage
+from .models import Course, Topic, Test, Question, Answer
+
+# --------------------------------------
+# Копия курса со всем деревом (варианты под course_type / sub_type).
+#
+# Каждый уровень читается одним values_list и вставляется одним
+# bulk_create; старые pk переводятся в новые через словари, которые
+# заполняет RETURNING. Обложка по умолчанию не копируется: новый курс
+# ссылается на тот же файл (файлы при удалении курса не стираются). С
+# link_files на файловом хранилище делается жёсткая ссылка под новым
+# именем — копия независима, но место на диске не расходуется. В
+# HashedMediaStorage имя задаёт содержимое: файл с хэшем в имени не
+# меняется, и копия делит его; старый файл без хэша получает ссылку под
+# хэшированным именем.
+
+CLONE_SUFFIX = " (копия)"
+
+
+def link_file(field_file):
+    """Имя жёсткой ссылки на файл; если ссылку сделать нельзя — имя исходного файла."""
+    if not field_file:
+        return None
+    storage = field_file.storage
+    try:
+        source = storage.path(field_file.name)
+    except NotImplementedError:
+        return field_file.name
+    if isinstance(storage, HashedMediaStorage):
+        try:
+            with field_file.open('rb'):
+                name = storage.hashed_name(field_file.name, field_file)
+        except OSError:
+            return field_file.name
+        if storage.exists(name):
+            return name
+    else:
+        name = storage.get_available_name(field_file.name)
+    try:
+        os.link(source, storage.path(name))
+    except OSError:
+        # Другая файловая система, нет исходника или имя успели занять
+        return field_file.name
+    return name
+
+
+def _copy_level(model, queryset, parent, parent_map, fields, batch_size):
+    """Копирует строки уровня под новых родителей; возвращает {старый pk: новый pk}."""
+    rows = list(queryset.order_by('pk').values_list('pk', parent, *fields))
+    objects = [
+        model(**{parent: parent_map[row[1]]}, **dict(zip(fields, row[2:])))
+        for row in rows
+    ]
+    model.objects.bulk_create(objects, batch_size=batch_size)
+    return {row[0]: obj.pk for row, obj in zip(rows, objects)}
+
+
+def clone_course(course, link_files=False, batch_size=BULK_BATCH_SIZE, **overrides):
+    """
+    Создаёт копию курса с темами, тестами, вопросами и ответами: запросов —
+    по два на уровень, независимо от размера курса. overrides — поля нового
+    курса (title, course_type, sub_type, ...). Возвращает новый Course.
+    """
+    values = {name: getattr(course, name) for name in COURSE_FIELDS}
+    values['title'] = f"{course.title}{CLONE_SUFFIX}"
+    values['img'] = link_file(course.img) if link_files else (course.img.name or None)
+    # Итоги совпадают с исходным курсом — пересчитывать их не нужно
+    values.update(topic_count=course.topic_count, total_minutes=course.total_minutes)
+    values.update(overrides)
+    with transaction.atomic():
+        # Курс сохраняется обычным save — его receivers обновляют поиск и каталог
+        copy = Course.objects.create(**values)
+        topics = _copy_level(
+            Topic, Topic.objects.filter(course=course), 'course_id', {course.pk: copy.pk},
+            TOPIC_FIELDS + ('order', 'ordinal'), batch_size,
+        )
+        tests = _copy_level(
+            Test, Test.objects.filter(topic__course=course), 'topic_id', topics, TEST_FIELDS, batch_size,
+        )
+        questions = _copy_level(
+            Question, Question.objects.filter(test__topic__course=course), 'test_id', tests,
+            QUESTION_FIELDS + ('text_html',), batch_size,
+        )
+        _copy_level(
+            Answer, Answer.objects.filter(question__test__topic__course=course), 'question_id', questions,
+            ANSWER_FIELDS + ('text_html',), batch_size,
+        )
+    return copy
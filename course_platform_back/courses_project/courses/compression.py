@@ -0,0 +1,171 @@
+# courses/compression.py
+import gzip
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# --------------------------------------
+# Сжатие ответов.
+#
+# CompressionMiddleware выбирает по Accept-Encoding brotli (если пакет
+# установлен) или gzip и сжимает тело на лету. Тела, которые и так живут в
+# кэше (список курсов, темы с тестом), хранятся там сразу вместе со
+# сжатыми вариантами (cached_body): сжатие выполняется один раз на версию
+# содержимого, а middleware только подставляет готовые байты.
+#
+# Сжимаются только ответы API в JSON. HTML (админка) несёт CSRF-токен
+# рядом с данными из запроса, и сжатие открыло бы его для BREACH.
+
+COMPRESSIBLE_TYPES = ('application/json',)
+# Меньше примерно одного TCP-пакета сжимать нет смысла
+MIN_SIZE = 860
+# На лету — быстрые уровни, заранее — максимальные
+FAST_LEVELS = {'gzip': 6, 'br': 5}
+BEST_LEVELS = {'gzip': 9, 'br': 11}
+BODY_TIMEOUT = 60 * 60 * 24
+
+
+def available_encodings():
+    """Кодировки в порядке предпочтения сервера."""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress(data, encoding, best=False):
+    level = (BEST_LEVELS if best else FAST_LEVELS)[encoding]
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def compress_variants(data):
+    """{кодировка: байты} для вариантов, которые заметно меньше исходника."""
+    variants = {encoding: compress(data, encoding, best=True) for encoding in available_encodings()}
+    return {encoding: body for encoding, body in variants.items() if len(body) < len(data) * 0.95}
+
+
+def choose_encoding(accept_encoding, offered):
+    """
+    Лучшая из offered кодировок, которую принимает клиент (с учётом q),
+    или None. При равном q — порядок offered.
+    """
+    accepted = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name] = q
+    best, best_q = None, 0.0
+    for encoding in offered:
+        q = accepted.get(encoding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _compressible(response):
+    content_type = response.get('Content-Type', '').split(';')[0].strip()
+    return content_type in COMPRESSIBLE_TYPES
+
+
+class CompressionMiddleware:
+    """Синхронная и асинхронная: под ASGI запросы не гоняются через sync_to_async."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        # Потоки (server-sent events, файлы) идут как есть: тело ещё не готово
+        if response.streaming or response.has_header('Content-Encoding') or not _compressible(response):
+            return response
+        precompressed = getattr(response, 'precompressed', None)
+        if precompressed is None and len(response.content) < MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        offered = [e for e in available_encodings() if precompressed is None or e in precompressed]
+        encoding = choose_encoding(request.headers.get('Accept-Encoding', ''), offered)
+        if encoding is None:
+            return response
+        if precompressed is not None:
+            content = precompressed[encoding]
+        else:
+            content = compress(response.content, encoding)
+            if len(content) >= len(response.content):
+                return response
+
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            # Сжатое представление байт в байт не совпадает с исходным
+            response['ETag'] = 'W/' + etag
+        return response
+
+
+# --------------------------------------
+# Готовые тела ответов в кэше
+
+
+def cached_body(key, build, timeout=BODY_TIMEOUT, version=None):
+    """
+    JSON-тело ответа из кэша вместе со сжатыми вариантами:
+    {'identity': байты, 'gzip': ..., 'br': ...}. build() строит данные при
+    промахе; None от build не кэшируется и возвращается как есть. Тело,
+    собранное для другой version (данные изменил другой процесс), строится
+    заново.
+    """
+    body = cache.get(key)
+    if body is None or body.get('version') != version:
+        data = build()
+        if data is None:
+            return None
+        raw = JSONRenderer().render(data)
+        body = {'identity': raw, 'version': version, **compress_variants(raw)}
+        cache.set(key, body, timeout)
+    return body
+
+
+def body_response(body, status=200):
+    """Ответ с готовым телом; сжатый вариант подставит CompressionMiddleware."""
+    response = HttpResponse(body['identity'], status=status, content_type='application/json')
+    response.precompressed = body
+    return response
+
+
+def topic_body_key(topic_id):
+    return f'topic-body:{topic_id}'
+
+
+def invalidate_topic_body(topic_id):
+    """Сбрасывает тело в кэше процесса; другие процессы узнают о правке по Topic.content_version."""
+    cache.delete(topic_body_key(topic_id))
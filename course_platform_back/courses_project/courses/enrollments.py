@@ -0,0 +1,200 @@
+# courses/enrollments.py
+import csv
+import io
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from .models import User, Enrollment
+from .signals import enrollments_changed
+
+BULK_BATCH_SIZE = 500
+
+# Статусы строк в отчёте массовой записи
+ENROLLED = 'enrolled'
+ALREADY_ENROLLED = 'already_enrolled'
+NOT_FOUND = 'not_found'
+NOT_STUDENT = 'not_student'
+DUPLICATE = 'duplicate'
+
+# Состояние доступа пользователя к курсу
+ACCESS_ACTIVE = 'active'
+ACCESS_EXPIRED = 'expired'
+ACCESS_NONE = 'none'
+
+
+def parse_usernames(text):
+    """
+    Достаёт юзернеймы из CSV или простого списка (по одному в строке).
+    Берётся первая непустая колонка, строка-заголовок "username" пропускается.
+    """
+    usernames = []
+    for row in csv.reader(io.StringIO(text)):
+        cells = [cell.strip() for cell in row if cell.strip()]
+        if not cells:
+            continue
+        if not usernames and cells[0].lower() == 'username':
+            continue
+        usernames.append(cells[0])
+    return usernames
+
+
+def bulk_enroll(course, usernames, batch_size=BULK_BATCH_SIZE):
+    """
+    Записывает студентов на курс одним проходом.
+
+    Пользователи и существующие записи читаются одним запросом каждый,
+    новые Enrollment создаются через bulk_create(ignore_conflicts=True)
+    пачками по batch_size, каждая пачка — в своей транзакции.
+    Возвращает список {"username", "status"} в порядке входных данных.
+    """
+    usernames = [u.strip() for u in usernames if u and u.strip()]
+    users = {
+        u['username']: u
+        for u in User.objects.filter(username__in=set(usernames)).values('id', 'username', 'role')
+    }
+    student_ids = [u['id'] for u in users.values() if u['role'] == 'student']
+    already = set(
+        Enrollment.objects.filter(course=course, user_id__in=student_ids).values_list('user_id', flat=True)
+    )
+
+    results = []
+    to_create = []
+    seen = set()
+    expires_at = course.expiry_for(now())
+    for username in usernames:
+        if username in seen:
+            status = DUPLICATE
+        elif username not in users:
+            status = NOT_FOUND
+        elif users[username]['role'] != 'student':
+            status = NOT_STUDENT
+        elif users[username]['id'] in already:
+            status = ALREADY_ENROLLED
+        else:
+            status = ENROLLED
+            to_create.append(Enrollment(user_id=users[username]['id'], course=course, expires_at=expires_at))
+        seen.add(username)
+        results.append({"username": username, "status": status})
+
+    for start in range(0, len(to_create), batch_size):
+        with transaction.atomic():
+            Enrollment.objects.bulk_create(to_create[start:start + batch_size], ignore_conflicts=True)
+    if to_create:
+        enrollments_changed.send(
+            sender=Enrollment, pairs=[(e.user_id, course.id) for e in to_create], membership=True
+        )
+
+    return results
+
+
+def refresh_enrollments(queryset):
+    """
+    Переставляет enrolled_at на текущее время и пересчитывает expires_at.
+    Один UPDATE на каждый встречающийся в наборе срок доступа курса
+    (обычно один). Возвращает число обновлённых записей.
+    """
+    rows = list(queryset.values_list('user_id', 'course_id', 'course__access_days'))
+    if not rows:
+        return 0
+    refreshed_at = now()
+    updated = 0
+    for access_days in {days for _, _, days in rows}:
+        if access_days is None:
+            subset, expires_at = queryset.filter(course__access_days__isnull=True), None
+        else:
+            subset = queryset.filter(course__access_days=access_days)
+            expires_at = refreshed_at + timedelta(days=access_days)
+        updated += subset.update(enrolled_at=refreshed_at, expires_at=expires_at)
+    enrollments_changed.send(
+        sender=Enrollment, pairs=[(user_id, course_id) for user_id, course_id, _ in rows], membership=False
+    )
+    return updated
+
+
+def sync_course_expiry(course):
+    """
+    Пересчитывает expires_at всех записей курса после смены access_days
+    одним UPDATE.
+    """
+    queryset = Enrollment.objects.filter(course=course)
+    pairs = list(queryset.values_list('user_id', 'course_id'))
+    if not pairs:
+        return 0
+    if course.access_days is None:
+        updated = queryset.update(expires_at=None)
+    else:
+        updated = queryset.update(expires_at=F('enrolled_at') + timedelta(days=course.access_days))
+    enrollments_changed.send(sender=Enrollment, pairs=pairs, membership=False)
+    return updated
+
+
+def delete_enrollments(queryset):
+    """
+    Удаляет набор записей одним DELETE (у Enrollment нет зависимых таблиц
+    и обработчиков delete-сигналов, поэтому Django не грузит объекты).
+    Возвращает число удалённых записей.
+    """
+    pairs = list(queryset.values_list('user_id', 'course_id'))
+    if not pairs:
+        return 0
+    deleted, _ = queryset.delete()
+    enrollments_changed.send(sender=Enrollment, pairs=pairs, membership=True)
+    return deleted
+
+
+def sweep_expired(batch_size=BULK_BATCH_SIZE, at=None):
+    """
+    Удаляет истёкшие записи пачками по batch_size (выборка идёт по индексу
+    expires_at). Возвращает общее число удалённых записей.
+    """
+    at = at or now()
+    total = 0
+    while True:
+        ids = list(Enrollment.objects.expired(at).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return total
+        total += delete_enrollments(Enrollment.objects.filter(pk__in=ids))
+
+
+def _access_key(user_id, course_id):
+    return f'enrollment-access:{user_id}:{course_id}'
+
+
+def get_access(user_id, course_id):
+    """
+    Состояние доступа пользователя к курсу: ACCESS_ACTIVE, ACCESS_EXPIRED
+    или ACCESS_NONE. Срок записи кэшируется, так что повторные проверки
+    обходятся без запроса к базе; кэш сбрасывается по enrollments_changed.
+    """
+    key = _access_key(user_id, course_id)
+    entry = cache.get(key)
+    if entry is None:
+        enrollment = Enrollment.objects.filter(user_id=user_id, course_id=course_id).values('expires_at').first()
+        if enrollment is None:
+            entry = (False, None)
+        else:
+            entry = (True, enrollment['expires_at'])
+        cache.set(key, entry, settings.ENROLLMENT_ACCESS_CACHE_TIMEOUT)
+
+    enrolled, expires_at = entry
+    if not enrolled:
+        return ACCESS_NONE
+    if expires_at is not None and expires_at <= now():
+        return ACCESS_EXPIRED
+    return ACCESS_ACTIVE
+
+
+def invalidate_access(pairs):
+    """Сбрасывает закэшированный доступ для списка (user_id, course_id)."""
+    cache.delete_many([_access_key(user_id, course_id) for user_id, course_id in pairs])
+
+
+def summarize(results):
+    """Количество строк по каждому статусу."""
+    return dict(Counter(r['status'] for r in results))
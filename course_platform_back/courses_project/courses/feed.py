@@ -0,0 +1,229 @@
+# courses/feed.py
+import asyncio
+import json
+import secrets
+import threading
+import time
+from collections import defaultdict, deque, namedtuple
+
+from asgiref.sync import sync_to_async
+from django.core import signing
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from .models import User
+
+# --------------------------------------
+# Живая лента прогресса для куратора (server-sent events).
+#
+# Куратор один раз читает curator/progress/ и подписывается на
+# curator/progress/stream/: при каждой пройденной попытке его студента
+# receiver test_passed публикует событие topic_passed в брокер процесса,
+# а брокер раздаёт его открытым потокам этого куратора. Брокер живёт в
+# памяти, поэтому поток и отправка теста должны обслуживаться одним
+# процессом ASGI (courses_project.asgi). Последние события куратора
+# хранятся, и переподключение с Last-Event-ID дочитывает пропущенное;
+# если пропуск восстановить нельзя, приходит resync — клиент заново
+# читает curator/progress/.
+#
+# EventSource в браузере не умеет передавать заголовок Authorization, а JWT
+# в адресе осел бы в логах сервера и прокси. Поэтому клиент сначала берёт
+# билет POST curator/progress/stream/ticket/ и открывает поток с ?ticket=.
+# Билет подписан отдельной солью, годится только для потока и только
+# TICKET_MAX_AGE секунд — запись в логе после этого бесполезна. Если поток
+# оборвался позже, переподключение получит 401: клиент берёт новый билет и
+# передаёт последний id события в ?last_event_id=.
+
+# number — порядковый номер у куратора, для сравнения с Last-Event-ID
+Event = namedtuple('Event', ['id', 'type', 'data', 'number'])
+
+RESYNC = Event(None, 'resync', {}, None)
+HISTORY_SIZE = 100
+QUEUE_SIZE = 100
+KEEPALIVE_SECONDS = 15
+RETRY_MS = 3000
+# Столько после ухода последнего подписчика события ещё записываются:
+# хватает на переподключение EventSource
+RECONNECT_GRACE_SECONDS = 60
+TICKET_SALT = 'courses.feed.stream-ticket'
+TICKET_MAX_AGE = 30
+
+
+class Subscription:
+    def __init__(self, curator_id, loop):
+        self.curator_id = curator_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def deliver(self, event):
+        """Выполняется в цикле событий подписчика."""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Клиент не успевает читать: очередь сбрасывается, он перечитает отчёт
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+
+class Broker:
+    """
+    Публикация из любого потока (receiver работает в потоке синхронного
+    view), доставка — в цикл событий подписчика через call_soon_threadsafe.
+    id события — <эпоха>-<номер у куратора>; эпоха меняется, когда события
+    переставали записываться, и старые Last-Event-ID становятся недействительны.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._subscribers = defaultdict(set)
+            self._history = defaultdict(lambda: deque(maxlen=HISTORY_SIZE))
+            self._counters = defaultdict(int)
+            self._epoch = secrets.token_hex(4)
+            self._idle_deadline = 0
+
+    def watching(self):
+        """Есть ли кому доставлять события (или подписчик вот-вот переподключится)."""
+        with self._lock:
+            if self._subscribers or time.monotonic() < self._idle_deadline:
+                return True
+            if self._counters:
+                self._history.clear()
+                self._counters.clear()
+                self._epoch = secrets.token_hex(4)
+            return False
+
+    def subscribe(self, curator_id, last_event_id=None):
+        """
+        Подписывает текущий цикл событий на события куратора. Возвращает
+        (подписку, пропущенные события после last_event_id); вместо
+        пропущенных — [RESYNC], если их уже не восстановить.
+        """
+        subscription = Subscription(curator_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers[curator_id].add(subscription)
+            backlog = [] if last_event_id is None else self._replay(curator_id, last_event_id)
+        return subscription, backlog
+
+    def _replay(self, curator_id, last_event_id):
+        epoch, _, number = last_event_id.partition('-')
+        if epoch != self._epoch or not number.isdigit() or int(number) > self._counters[curator_id]:
+            return [RESYNC]
+        number = int(number)
+        history = self._history[curator_id]
+        if history and history[0].number > number + 1:
+            return [RESYNC]
+        return [event for event in history if event.number > number]
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.curator_id)
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.curator_id]
+            if not self._subscribers:
+                self._idle_deadline = time.monotonic() + RECONNECT_GRACE_SECONDS
+
+    def publish(self, curator_id, event_type, data):
+        with self._lock:
+            self._counters[curator_id] += 1
+            number = self._counters[curator_id]
+            event = Event(f"{self._epoch}-{number}", event_type, data, number)
+            self._history[curator_id].append(event)
+            subscribers = list(self._subscribers.get(curator_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # Цикл уже закрыт, подписка уйдёт в finally потока
+                pass
+
+
+broker = Broker()
+
+
+def format_event(event):
+    lines = [] if event.id is None else [f"id: {event.id}"]
+    lines += [f"event: {event.type}", f"data: {json.dumps(event.data, ensure_ascii=False)}"]
+    return "\n".join(lines) + "\n\n"
+
+
+async def event_stream(subscription, backlog, keepalive=KEEPALIVE_SECONDS):
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        for event in backlog:
+            yield format_event(event)
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                # Комментарий держит соединение через прокси с таймаутом простоя
+                yield ": keepalive\n\n"
+                continue
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+# --------------------------------------
+
+
+def issue_ticket(user):
+    """Билет на поток для user; время выдачи входит в подпись."""
+    return signing.dumps(user.pk, salt=TICKET_SALT)
+
+
+def _ticket_user(ticket):
+    try:
+        user_id = signing.loads(ticket, salt=TICKET_SALT, max_age=TICKET_MAX_AGE)
+    except signing.BadSignature:
+        # В том числе просроченный билет (SignatureExpired)
+        return None
+    return User.objects.filter(pk=user_id, is_active=True).first()
+
+
+def _stream_user(request):
+    """Пользователь по JWT из заголовка Authorization или по билету из параметра ticket."""
+    auth = JWTAuthentication()
+    header = auth.get_header(request)
+    if header is None:
+        ticket = request.GET.get('ticket')
+        return _ticket_user(ticket) if ticket else None
+    raw = auth.get_raw_token(header)
+    if not raw:
+        return None
+    try:
+        return auth.get_user(auth.get_validated_token(raw))
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return None
+
+
+async def progress_stream(request):
+    user = await request.auser()
+    if not user.is_authenticated:
+        user = await sync_to_async(_stream_user)(request)
+    if user is None:
+        return JsonResponse({"detail": "Учетные данные не были предоставлены."}, status=401)
+    if user.role != 'curator':
+        return JsonResponse({"detail": "Доступно только кураторам."}, status=403)
+    if not isinstance(request, ASGIRequest):
+        # Под WSGI бесконечный поток занял бы рабочий процесс целиком
+        return JsonResponse({"detail": "Поток доступен только через ASGI."}, status=501)
+
+    subscription, backlog = broker.subscribe(
+        user.pk, request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    )
+    response = StreamingHttpResponse(event_stream(subscription, backlog), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx не должен копить события в буфере
+    response['X-Accel-Buffering'] = 'no'
+    return response
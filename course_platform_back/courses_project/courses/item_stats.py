@@ -0,0 +1,127 @@
+# courses/item_stats.py
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import Question, Answer, QuestionStats, AnswerStats
+
+logger = logging.getLogger(__name__)
+
+
+class ItemStatsBuffer:
+    """
+    Копит приросты счётчиков вопросов и ответов в памяти процесса и
+    сбрасывает их в базу не чаще раза в ITEM_STATS_FLUSH_SECONDS.
+
+    При сбросе одинаковые приросты группируются, поэтому на поле уходит
+    один UPDATE ... SET x = x + n на каждое различное n, а не на каждую
+    попытку. При остановке процесса остаток сбрасывается через atexit.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+        self._last_flush = time.monotonic()
+
+    def _reset(self):
+        self.shown = Counter()
+        self.correct = Counter()
+        self.chosen = Counter()
+
+    def record(self, shown_question_ids, correct_question_ids, chosen_answer_ids):
+        with self._lock:
+            self.shown.update(shown_question_ids)
+            self.correct.update(correct_question_ids)
+            self.chosen.update(chosen_answer_ids)
+            due = time.monotonic() - self._last_flush >= settings.ITEM_STATS_FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def clear(self):
+        """Отбрасывает накопленные приросты без записи."""
+        with self._lock:
+            self._reset()
+
+    def flush(self):
+        with self._lock:
+            shown, correct, chosen = self.shown, self.correct, self.chosen
+            self._reset()
+            self._last_flush = time.monotonic()
+        if not (shown or correct or chosen):
+            return
+        try:
+            with transaction.atomic():
+                # Вопросы и ответы могли удалить, пока приросты копились
+                question_ids = set(
+                    Question.objects.filter(pk__in=set(shown) | set(correct)).values_list('pk', flat=True)
+                )
+                answer_ids = set(Answer.objects.filter(pk__in=set(chosen)).values_list('pk', flat=True))
+                shown = {pk: n for pk, n in shown.items() if pk in question_ids}
+                correct = {pk: n for pk, n in correct.items() if pk in question_ids}
+                chosen = {pk: n for pk, n in chosen.items() if pk in answer_ids}
+                QuestionStats.objects.bulk_create(
+                    [QuestionStats(question_id=q_id) for q_id in question_ids], ignore_conflicts=True
+                )
+                AnswerStats.objects.bulk_create(
+                    [AnswerStats(answer_id=a_id) for a_id in answer_ids], ignore_conflicts=True
+                )
+                _apply(QuestionStats, 'times_shown', shown)
+                _apply(QuestionStats, 'times_correct', correct)
+                _apply(AnswerStats, 'times_chosen', chosen)
+        except Exception:
+            # Не теряем приросты: вернём их в буфер до следующего сброса
+            logger.exception("Item stats flush failed")
+            with self._lock:
+                self.shown.update(shown)
+                self.correct.update(correct)
+                self.chosen.update(chosen)
+
+
+def _apply(model, field, counter):
+    by_delta = defaultdict(list)
+    for pk, delta in counter.items():
+        by_delta[delta].append(pk)
+    for delta, pks in by_delta.items():
+        model.objects.filter(pk__in=pks).update(**{field: F(field) + delta})
+
+
+buffer = ItemStatsBuffer()
+atexit.register(buffer.flush)
+
+
+def item_analytics(test_id):
+    """
+    Статистика по вопросам и ответам теста: два запроса, O(вопросов).
+    Несброшенные приросты текущего процесса сначала записываются в базу.
+    """
+    buffer.flush()
+    answers = defaultdict(list)
+    for answer in Answer.objects.filter(question__test_id=test_id).values(
+        'id', 'question_id', 'is_correct', 'stats__times_chosen'
+    ):
+        answers[answer['question_id']].append({
+            "answer_id": answer['id'],
+            "is_correct": answer['is_correct'],
+            "times_chosen": answer['stats__times_chosen'] or 0,
+        })
+
+    data = []
+    for question in Question.objects.filter(test_id=test_id).values(
+        'id', 'stats__times_shown', 'stats__times_correct'
+    ).order_by('id'):
+        shown = question['stats__times_shown'] or 0
+        correct = question['stats__times_correct'] or 0
+        data.append({
+            "question_id": question['id'],
+            "times_shown": shown,
+            "times_correct": correct,
+            "correct_rate": round(correct / shown, 3) if shown else None,
+            "answers": answers.get(question['id'], []),
+        })
+    return data
@@ -0,0 +1,104 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from courses import bundles, provisioning
+from courses.throttling import TokenBucketStore
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Замер пропускной способности массовых операций (все изменения откатываются)"
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='target', required=True)
+        users = subparsers.add_parser('users', help="Импорт пользователей с хэшированием паролей")
+        users.add_argument('--count', type=int, default=500)
+        users.add_argument('--workers', type=int, default=None)
+        throttle = subparsers.add_parser('throttle', help="Проверка лимита token bucket")
+        throttle.add_argument('--count', type=int, default=100_000)
+        throttle.add_argument('--keys', type=int, default=1_000)
+        course = subparsers.add_parser('course-import', help="Импорт и экспорт пакета курса")
+        course.add_argument('--topics', type=int, default=33)
+        course.add_argument('--questions', type=int, default=40)
+        course.add_argument('--answers', type=int, default=6)
+
+    def handle(self, *args, target, **options):
+        getattr(self, f'bench_{target.replace("-", "_")}')(**options)
+
+    def report(self, label, count, elapsed):
+        self.stdout.write(f"{label:<24} {count:>6} за {elapsed:7.3f} с  {count / elapsed if elapsed else 0:10.0f} /с")
+
+    def bench_users(self, count, workers, **options):
+        rows = [
+            {'username': f'bench-curator-{i}', 'name': f'Curator {i}', 'role': 'curator', 'password': 'bench-pass', 'curator': ''}
+            for i in range(max(1, count // 50))
+        ]
+        rows += [
+            {'username': f'bench-student-{i}', 'name': f'Student {i}', 'role': 'student', 'password': f'bench-pass-{i}',
+             'curator': rows[i % len(rows)]['username']}
+            for i in range(count - len(rows))
+        ]
+
+        started = time.perf_counter()
+        provisioning.hash_passwords([row['password'] for row in rows], workers=1)
+        self.report("хэширование, 1 процесс", len(rows), time.perf_counter() - started)
+
+        started = time.perf_counter()
+        try:
+            with transaction.atomic():
+                provisioning.import_users(rows, workers=workers)
+                self.report("полный импорт", len(rows), time.perf_counter() - started)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def bench_throttle(self, count, keys, **options):
+        store = TokenBucketStore()
+        started = time.perf_counter()
+        for i in range(count):
+            store.take(f'user:{i % keys}', 10, 60)
+        elapsed = time.perf_counter() - started
+        self.report("проверка лимита", count, elapsed)
+        self.stdout.write(f"в среднем {elapsed / count * 1e6:.2f} мкс на проверку")
+
+    def bench_course_import(self, topics, questions, answers, **options):
+        bundle = {
+            "format": bundles.BUNDLE_FORMAT,
+            "version": bundles.BUNDLE_VERSION,
+            "course": {"title": "Bench course", "description": "Bench"},
+            "topics": [
+                {
+                    "title": f"Topic {t}", "video_title": f"Video {t}",
+                    "test": {"questions": [
+                        {"text": f"Question {t}.{q}", "answers": [
+                            {"text": f"Answer {a}", "is_correct": a == 0} for a in range(answers)
+                        ]}
+                        for q in range(questions)
+                    ]},
+                }
+                for t in range(topics)
+            ],
+        }
+        objects = topics * (2 + questions * (1 + answers)) + 1
+
+        started = time.perf_counter()
+        bundles.validate_bundle(bundle)
+        self.report("проверка пакета", objects, time.perf_counter() - started)
+
+        try:
+            with transaction.atomic():
+                started = time.perf_counter()
+                course = bundles.import_bundle(bundle)
+                self.report("импорт курса", objects, time.perf_counter() - started)
+                started = time.perf_counter()
+                size = sum(len(chunk) for chunk in bundles.stream_bundle(course))
+                self.report("экспорт курса", objects, time.perf_counter() - started)
+                self.stdout.write(f"размер пакета {size / 1024:.0f} КБ")
+                raise Rollback
+        except Rollback:
+            pass
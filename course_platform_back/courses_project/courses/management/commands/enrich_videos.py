@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from courses import videos
+from courses.models import Topic
+
+
+class Command(BaseCommand):
+    help = "Заполняет названия и длительность видео тем у провайдера метаданных (запускать по расписанию)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', help="Только темы этих курсов")
+        parser.add_argument('--overwrite', action='store_true', help="Перезаписать уже заполненные поля")
+        parser.add_argument('--batch-size', type=int, default=videos.BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=videos.WORKERS,
+                            help="Сколько запросов к провайдеру выполнять одновременно")
+
+    def handle(self, *args, course, overwrite, batch_size, workers, **options):
+        topics = Topic.objects.filter(course_id__in=course) if course else None
+        stats = videos.enrich_topics(topics, overwrite=overwrite, batch_size=batch_size, workers=workers)
+        self.stdout.write(self.style.SUCCESS(
+            f"Проверено тем: {stats['checked']}, обновлено: {stats['updated']}, без данных: {stats['failed']}"
+        ))
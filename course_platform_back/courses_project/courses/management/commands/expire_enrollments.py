@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from courses.enrollments import BULK_BATCH_SIZE, sweep_expired
+from courses.models import Enrollment
+
+
+class Command(BaseCommand):
+    help = "Удаляет записи на курсы, у которых истёк срок доступа (запускать по расписанию)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BULK_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Только посчитать истёкшие записи")
+
+    def handle(self, *args, batch_size, dry_run, **options):
+        if dry_run:
+            self.stdout.write(f"Истёкших записей: {Enrollment.objects.expired().count()}")
+            return
+        deleted = sweep_expired(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Удалено истёкших записей: {deleted}"))
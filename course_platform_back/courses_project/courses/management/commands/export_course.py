@@ -0,0 +1,27 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses import bundles
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = "Экспорт курса со всеми темами, тестами, вопросами и ответами в пакет JSON или YAML"
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_id', type=int)
+        parser.add_argument('--as', dest='fmt', choices=('json', 'yaml'), default='json')
+        parser.add_argument('--output', help="Файл для записи (по умолчанию — stdout)")
+
+    def handle(self, *args, course_id, fmt, output, **options):
+        course = Course.objects.filter(pk=course_id).first()
+        if course is None:
+            raise CommandError(f"Курс {course_id} не найден")
+        out = open(output, 'w', encoding='utf-8') if output else sys.stdout
+        try:
+            for chunk in bundles.stream_bundle(course, fmt):
+                out.write(chunk)
+        finally:
+            if output:
+                out.close()
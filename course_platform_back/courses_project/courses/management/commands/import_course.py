@@ -0,0 +1,31 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses import bundles
+
+
+class Command(BaseCommand):
+    help = "Импорт курса со всеми темами, тестами, вопросами и ответами из пакета JSON или YAML"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Файл .json или .yaml")
+
+    def handle(self, *args, path, **options):
+        path = Path(path)
+        fmt = 'yaml' if path.suffix.lower() in ('.yaml', '.yml') else 'json'
+        try:
+            data = bundles.parse_bundle(path.read_text(encoding='utf-8-sig'), fmt=fmt)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Не удалось прочитать {path}: {exc}")
+
+        started = time.perf_counter()
+        try:
+            course = bundles.import_bundle(data)
+        except bundles.BundleError as exc:
+            for error in exc.errors:
+                self.stderr.write(error)
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Создан курс {course.id} «{course.title}» за {elapsed:.2f} с"))
@@ -0,0 +1,36 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses import provisioning
+
+
+class Command(BaseCommand):
+    help = "Массовый импорт пользователей из CSV или JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Файл .csv (с заголовком) или .json")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Число процессов для хэширования паролей (по умолчанию — число CPU)")
+
+    def handle(self, *args, path, workers, **options):
+        path = Path(path)
+        fmt = 'json' if path.suffix.lower() == '.json' else 'csv'
+        try:
+            rows = provisioning.parse_user_rows(path.read_text(encoding='utf-8-sig'), fmt=fmt)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Не удалось прочитать {path}: {exc}")
+
+        started = time.perf_counter()
+        results = provisioning.import_users(rows, workers=workers)
+        elapsed = time.perf_counter() - started
+
+        for row in results:
+            if row['status'] != provisioning.CREATED:
+                self.stdout.write(f"{row['username']}: {row['status']}")
+        summary = provisioning.summarize(results)
+        created = summary.get(provisioning.CREATED, 0)
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано {created} из {len(rows)} за {elapsed:.2f} с ({created / elapsed if elapsed else 0:.0f} польз./с)"
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from courses.progress import rebuild_progress
+
+
+class Command(BaseCommand):
+    help = "Пересобирает прогресс студентов и сводки кураторов с нуля (сверка, запускать по расписанию)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        total = rebuild_progress(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано записей прогресса: {total}"))
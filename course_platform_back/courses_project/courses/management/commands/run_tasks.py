@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from courses.tasks import POLL_SECONDS, WORKERS, run_worker
+
+
+class Command(BaseCommand):
+    help = "Воркер фоновых задач: разбирает очередь и запускает периодические задачи"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=WORKERS, help="Размер пула потоков")
+        parser.add_argument('--poll', type=float, default=POLL_SECONDS, help="Пауза между опросами пустой очереди, с")
+        parser.add_argument('--once', action='store_true', help="Выполнить созревшие задачи и выйти")
+
+    def handle(self, *args, workers, poll, once, **options):
+        run_worker(workers=workers, poll=poll, once=once)
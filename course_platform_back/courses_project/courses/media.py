@@ -0,0 +1,231 @@
+# courses/media.py
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseForbidden, HttpResponseNotModified, StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .compression import choose_encoding
+
+# --------------------------------------
+# Отдача файлов из MEDIA_ROOT (и STATIC_ROOT, см. courses.staticfiles).
+#
+# Имена загружаемых файлов содержат хэш содержимого (HashedMediaStorage),
+# поэтому такие файлы кэшируются навсегда: новое содержимое — новое имя.
+# serve_media проверяет доступ и отдаёт файл одним из способов
+# MEDIA_SERVE_MODE:
+#   'x-accel'    — заголовок X-Accel-Redirect, байты отдаёт nginx
+#                  (internal location MEDIA_ACCEL_PREFIX -> MEDIA_ROOT);
+#   'x-sendfile' — заголовок X-Sendfile (Apache mod_xsendfile, lighttpd);
+#   'django'     — сам Django: Range, ETag и If-Modified-Since, полный файл
+#                  через FileResponse (wsgi.file_wrapper / sendfile).
+# Файлы под MEDIA_PROTECTED_PREFIXES отдаются только вошедшим
+# пользователям (сессия админки или JWT).
+
+HASH_LENGTH = 12
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+CHUNK_SIZE = 64 * 1024
+
+_HASHED_NAME = re.compile(r'\.[0-9a-f]{%d}\.[^./]+$' % HASH_LENGTH)
+_HASH_SUFFIX = re.compile(r'\.[0-9a-f]{%d}$' % HASH_LENGTH)
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class HashedMediaStorage(FileSystemStorage):
+    """
+    Сохраняет файл под именем <имя>.<sha256[:12]><расширение>. Одинаковое
+    содержимое получает то же имя и на диск повторно не пишется.
+    """
+
+    def hashed_name(self, name, content):
+        """Имя name с хэшем содержимого content."""
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory, filename = posixpath.split(name.replace('\\', '/'))
+        stem, ext = posixpath.splitext(filename)
+        # Уже хэшированное имя (копия файла) не обрастает вторым хэшем
+        stem = _HASH_SUFFIX.sub('', stem)
+        return posixpath.join(directory, f"{stem}.{digest.hexdigest()[:HASH_LENGTH]}{ext}")
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        hashed = self.hashed_name(name, content)
+        if self.exists(hashed):
+            return hashed
+        return super().save(hashed, content, max_length=max_length)
+
+
+def is_hashed(name):
+    return bool(_HASHED_NAME.search(name))
+
+
+def parse_range(header, size):
+    """
+    Диапазон из заголовка Range как (начало, конец) включительно.
+    None — отдать файл целиком (нет заголовка, несколько диапазонов или
+    непонятный формат), ValueError — диапазон за пределами файла (416).
+    """
+    match = _RANGE.match((header or '').strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if not length or not size:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if last and end < start:
+        return None
+    if start >= size:
+        raise ValueError(header)
+    return start, min(end, size - 1)
+
+
+def _authenticated(request):
+    if request.user.is_authenticated:
+        return True
+    try:
+        return JWTAuthentication().authenticate(request) is not None
+    except AuthenticationFailed:
+        return False
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _cache_headers(response, name, protected):
+    # Закрытые файлы не должны оседать в общих кэшах прокси
+    scope = 'private' if protected else 'public'
+    if is_hashed(name):
+        response['Cache-Control'] = f'{scope}, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response['Cache-Control'] = f'{scope}, max-age={settings.MEDIA_CACHE_SECONDS}'
+    return response
+
+
+def _encoded_variant(request, full_path, encodings):
+    """Заранее сжатый вариант файла (.br/.gz рядом с ним), который принимает клиент."""
+    available = {encoding: suffix for encoding, suffix in encodings if os.path.isfile(full_path + suffix)}
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''), tuple(available))
+    if encoding is None:
+        return full_path, None
+    return full_path + available[encoding], encoding
+
+
+def clean_path(path):
+    """
+    Путь без сегментов '.', '..' и пустых, иначе 404: проверка префиксов
+    (MEDIA_PROTECTED_PREFIXES) должна видеть тот же путь, что и файловая система.
+    """
+    if any(segment in ('', '.', '..') for segment in path.replace('\\', '/').split('/')):
+        raise Http404
+    return path
+
+
+def serve_file(request, root, path, accel_prefix, protected=False, encodings=()):
+    """
+    Отдаёт root/path способом MEDIA_SERVE_MODE. encodings — пары
+    (кодировка, суффикс) заранее сжатых вариантов, в порядке предпочтения.
+    """
+    path = clean_path(path)
+    try:
+        full_path = safe_join(root, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    mode = settings.MEDIA_SERVE_MODE
+    if mode == 'x-accel':
+        # Сжатые варианты nginx выбирает сам (gzip_static / brotli_static)
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = accel_prefix + quote(path)
+        return _cache_headers(response, path, protected)
+
+    full_path, encoding = _encoded_variant(request, full_path, encodings)
+    if mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+        return _encoding_headers(_cache_headers(response, path, protected), encoding, encodings)
+
+    stat = os.stat(full_path)
+    etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+    last_modified = http_date(stat.st_mtime)
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    if request.headers.get('If-None-Match') == etag or (
+        'If-None-Match' not in request.headers and since is not None and int(stat.st_mtime) <= since
+    ):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return _encoding_headers(_cache_headers(response, path, protected), None, encodings)
+
+    # Range учитывается, только если If-Range (если есть) совпадает с текущей версией
+    if_range = request.headers.get('If-Range')
+    try:
+        byte_range = None if if_range not in (None, etag, last_modified) else parse_range(
+            request.headers.get('Range'), stat.st_size
+        )
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return response
+
+    if byte_range is None:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _read_range(full_path, start, end - start + 1), status=206, content_type=content_type
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    return _encoding_headers(_cache_headers(response, path, protected), encoding, encodings)
+
+
+def _encoding_headers(response, encoding, encodings):
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if encodings:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def serve_media(request, path):
+    path = clean_path(path)
+    protected = path.startswith(tuple(settings.MEDIA_PROTECTED_PREFIXES))
+    if protected and not _authenticated(request):
+        return HttpResponseForbidden()
+    return serve_file(request, settings.MEDIA_ROOT, path, settings.MEDIA_ACCEL_PREFIX, protected)
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Индексы и опции User, которые уже были в models.py, но не в миграциях."""
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('courses', '0006_alter_user_role'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='user',
+            options={},
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['username'], name='courses_use_usernam_c70c8c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['name'], name='courses_use_name_346b44_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_user_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='access_days',
+            field=models.PositiveIntegerField(blank=True, help_text='Срок доступа после записи (в днях). Пусто — без ограничения', null=True),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0010_item_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='multiple_choice',
+            field=models.BooleanField(default=False, help_text='Несколько верных ответов: засчитывается только точное совпадение выбора'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='weight',
+            field=models.PositiveIntegerField(default=1, help_text='Сколько баллов даёт верный ответ'),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='content_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='pass_mode',
+            field=models.CharField(choices=[('absolute', 'Минимум баллов'), ('percent', 'Процент от максимума')], default='absolute', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='pass_threshold',
+            field=models.PositiveIntegerField(default=9, help_text='Проходной балл (сумма весов вопросов) или процент — в зависимости от режима'),
+        ),
+    ]
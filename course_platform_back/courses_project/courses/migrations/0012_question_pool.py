@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0011_scoring_policy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='pool_size',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Сколько вопросов выдавать из пула за попытку (0 — все вопросы)'),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='shuffle_answers',
+            field=models.BooleanField(default=False, help_text='Перемешивать порядок ответов'),
+        ),
+    ]
@@ -0,0 +1,125 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:06
+
+from collections import Counter, defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_progress(apps, schema_editor):
+    """То же, что courses.progress.rebuild_progress, на исторических моделях."""
+    User = apps.get_model('courses', 'User')
+    Topic = apps.get_model('courses', 'Topic')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    UserTestResult = apps.get_model('courses', 'UserTestResult')
+    StudentCourseProgress = apps.get_model('courses', 'StudentCourseProgress')
+    CuratorRollup = apps.get_model('courses', 'CuratorRollup')
+    CuratorCourseRollup = apps.get_model('courses', 'CuratorCourseRollup')
+    CuratorTopicRollup = apps.get_model('courses', 'CuratorTopicRollup')
+
+    plans = defaultdict(list)
+    for topic_id, course_id, test_id in Topic.objects.order_by('course_id', 'order', 'id').values_list(
+        'id', 'course_id', 'test__id'
+    ):
+        plans[course_id].append((topic_id, test_id))
+    passed_tests = defaultdict(set)
+    for user_id, test_id in UserTestResult.objects.filter(passed=True).values_list('user_id', 'test_id'):
+        passed_tests[user_id].add(test_id)
+    curators = dict(User.objects.filter(curator__isnull=False).values_list('id', 'curator_id'))
+
+    rows = []
+    course_students, course_passed, stuck = Counter(), Counter(), Counter()
+    for user_id, course_id in Enrollment.objects.values_list('user_id', 'course_id').iterator(chunk_size=1000):
+        plan = plans[course_id]
+        # Темы засчитываются подряд до первой с непройденным тестом
+        passed, stuck_topic_id = len(plan), None
+        for i, (topic_id, test_id) in enumerate(plan):
+            if test_id is not None and test_id not in passed_tests[user_id]:
+                passed, stuck_topic_id = i, topic_id
+                break
+        rows.append(StudentCourseProgress(
+            user_id=user_id, course_id=course_id, passed_topics=passed,
+            total_topics=len(plan), stuck_topic_id=stuck_topic_id,
+        ))
+        curator_id = curators.get(user_id)
+        if curator_id is not None:
+            course_students[curator_id, course_id] += 1
+            course_passed[curator_id, course_id] += passed
+            if stuck_topic_id is not None:
+                stuck[curator_id, stuck_topic_id] += 1
+    StudentCourseProgress.objects.bulk_create(rows, batch_size=500)
+
+    CuratorRollup.objects.bulk_create(
+        [CuratorRollup(curator_id=c_id, students=n) for c_id, n in Counter(curators.values()).items()],
+        batch_size=500,
+    )
+    CuratorCourseRollup.objects.bulk_create([
+        CuratorCourseRollup(
+            curator_id=c_id, course_id=course_id, students=n,
+            passed_topics=course_passed[c_id, course_id], total_topics=len(plans[course_id]),
+        )
+        for (c_id, course_id), n in course_students.items()
+    ], batch_size=500)
+    CuratorTopicRollup.objects.bulk_create(
+        [CuratorTopicRollup(curator_id=c_id, topic_id=topic_id, stuck=n) for (c_id, topic_id), n in stuck.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0012_question_pool'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CuratorRollup',
+            fields=[
+                ('curator', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rollup', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('students', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CuratorCourseRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('students', models.IntegerField(default=0)),
+                ('passed_topics', models.IntegerField(default=0)),
+                ('total_topics', models.IntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.course')),
+                ('curator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('curator', 'course')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CuratorTopicRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stuck', models.IntegerField(default=0)),
+                ('curator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='topic_rollups', to=settings.AUTH_USER_MODEL)),
+                ('topic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.topic')),
+            ],
+            options={
+                'unique_together': {('curator', 'topic')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentCourseProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('passed_topics', models.IntegerField(default=0)),
+                ('total_topics', models.IntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.course')),
+                ('stuck_topic', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='courses.topic')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_progress', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'course')},
+            },
+        ),
+        migrations.RunPython(fill_progress, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+from django.db import migrations, models, transaction, OperationalError
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        try:
+            # SQLite без FTS5 или старше 3.34 (нет trigram) — остаётся icontains
+            with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                cursor.execute(
+                    "CREATE VIRTUAL TABLE courses_user_search USING fts5(username, name, tokenize='trigram')"
+                )
+                cursor.execute(
+                    "CREATE VIRTUAL TABLE courses_course_search USING fts5(title, tokenize='trigram')"
+                )
+        except OperationalError:
+            return
+        schema_editor.execute(
+            "INSERT INTO courses_user_search (rowid, username, name) SELECT id, username, name FROM courses_user"
+        )
+        schema_editor.execute(
+            "INSERT INTO courses_course_search (rowid, title) SELECT id, title FROM courses_course"
+        )
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for name, table, column in (
+            ('courses_user_username_trgm', 'courses_user', 'username'),
+            ('courses_user_name_trgm', 'courses_user', 'name'),
+            ('courses_course_title_trgm', 'courses_course', 'title'),
+        ):
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS courses_user_search")
+        schema_editor.execute("DROP TABLE IF EXISTS courses_course_search")
+    elif connection.vendor == 'postgresql':
+        for name in ('courses_user_username_trgm', 'courses_user_name_trgm', 'courses_course_title_trgm'):
+            schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def create_versions(apps, schema_editor):
+    # Версия каталога (courses.catalogue): строка есть заранее — invalidate() обходится одним UPDATE
+    CacheVersion = apps.get_model('courses', 'CacheVersion')
+    CacheVersion.objects.get_or_create(name='catalogue')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0013_curator_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.CreateModel(
+            name='CacheVersion',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('courses', '0014_search_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='user',
+            name='courses_use_usernam_c70c8c_idx',
+        ),
+        migrations.AlterField(
+            model_name='registration',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Тіркелу күні'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='curator',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='students', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['-enrolled_at'], name='courses_enr_enrolle_fe4f7d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['curator', 'role'], name='courses_use_curator_22d9d8_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+ORDER_GAP = 10
+
+
+def renumber_topics(apps, schema_editor):
+    """
+    Перенумеровывает темы каждого курса с шагом ORDER_GAP в текущем порядке
+    (дубли order разводятся по id) и проставляет ordinal.
+    """
+    Topic = apps.get_model('courses', 'Topic')
+    topics = list(Topic.objects.order_by('course_id', 'order', 'id'))
+    course_id = None
+    for topic in topics:
+        if topic.course_id != course_id:
+            course_id, ordinal = topic.course_id, 0
+        topic.order = (ordinal + 1) * ORDER_GAP
+        topic.ordinal = ordinal
+        ordinal += 1
+    Topic.objects.bulk_update(topics, ['order', 'ordinal'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0015_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='topic',
+            name='ordinal',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(renumber_topics, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='topic',
+            name='order',
+            field=models.PositiveIntegerField(blank=True, help_text='Пусто — в конец курса'),
+        ),
+        migrations.AddConstraint(
+            model_name='topic',
+            constraint=models.UniqueConstraint(fields=('course', 'order'), name='unique_topic_order_per_course'),
+        ),
+        # Индекс по course покрывается уникальным индексом (course, order)
+        migrations.AlterField(
+            model_name='topic',
+            name='course',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='topics', to='courses.course'),
+        ),
+    ]
@@ -0,0 +1,143 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:22
+
+import re
+from urllib.parse import urlsplit
+
+import bleach
+from bleach.html5lib_shim import Filter
+from django.conf import settings
+from django.db import migrations, models
+from django.http.request import validate_host
+
+# Копия courses.richtext на момент миграции: повторный прогон миграций даёт
+# тот же text_html, даже когда правила санитайзера в richtext поменяются.
+
+ALLOWED_TAGS = {
+    'p', 'br', 'b', 'strong', 'i', 'em', 'u', 's', 'sub', 'sup', 'span',
+    'ul', 'ol', 'li', 'blockquote', 'a', 'img',
+}
+ALLOWED_ATTRIBUTES = {
+    'a': ('href', 'title'),
+    'img': ('src', 'alt', 'width', 'height'),
+    'span': ('style',),
+    'p': ('style',),
+}
+ALLOWED_PROTOCOLS = ('http', 'https', 'mailto', 'data')
+ALLOWED_STYLES = {
+    'font-size': re.compile(r'^\d+(\.\d+)?(px|pt|em|rem|%)$'),
+}
+BLOCK_TAGS = ('p', 'ul', 'ol', 'li', 'blockquote', 'br')
+
+_WHITESPACE = re.compile(r'\s+')
+_EMPTY_PARAGRAPH = re.compile(r'<p>(?:\s|\xa0|&nbsp;|<br>)*</p>')
+_AROUND_BLOCKS = re.compile(r'\s*(</?(?:%s)\b[^>]*>)\s*' % '|'.join(BLOCK_TAGS))
+
+
+def _allow_attribute(tag, name, value):
+    if name not in ALLOWED_ATTRIBUTES.get(tag, ()):
+        return False
+    if name in ('href', 'src') and value.strip().lower().startswith('data:'):
+        return tag == 'img' and value.strip().lower().startswith('data:image/')
+    return True
+
+
+class StyleSanitizer:
+    def sanitize_css(self, style):
+        declarations = []
+        for declaration in style.split(';'):
+            name, _, value = declaration.partition(':')
+            name, value = name.strip().lower(), value.strip()
+            pattern = ALLOWED_STYLES.get(name)
+            if pattern is not None and pattern.match(value):
+                declarations.append(f"{name}: {value}")
+        return '; '.join(declarations)
+
+
+def media_url(src):
+    parts = urlsplit(src)
+    if parts.netloc and not validate_host(parts.hostname or '', settings.ALLOWED_HOSTS):
+        return src
+    if not parts.path.startswith(settings.MEDIA_URL):
+        return src
+    target = getattr(settings, 'RICHTEXT_MEDIA_URL', settings.MEDIA_URL)
+    url = target + parts.path[len(settings.MEDIA_URL):]
+    return f"{url}?{parts.query}" if parts.query else url
+
+
+class CruftFilter(Filter):
+    UNWRAP = ('span', 'a')
+
+    def __iter__(self):
+        kept = {name: [] for name in self.UNWRAP}
+        for token in super().__iter__():
+            kind = token['type']
+            if kind in ('StartTag', 'EmptyTag'):
+                token['data'] = {name: value for name, value in token['data'].items() if value}
+            if kind == 'StartTag' and token['name'] in self.UNWRAP:
+                kept[token['name']].append(bool(token['data']))
+                if not token['data']:
+                    continue
+            elif kind == 'EndTag' and token['name'] in self.UNWRAP:
+                stack = kept[token['name']]
+                if stack and not stack.pop():
+                    continue
+            elif kind == 'EmptyTag' and token['name'] == 'img':
+                src = (None, 'src')
+                if src in token['data']:
+                    token['data'][src] = media_url(token['data'][src])
+            elif kind in ('Characters', 'SpaceCharacters'):
+                token['data'] = _WHITESPACE.sub(' ', token['data'])
+            yield token
+
+
+def render_html(source):
+    if not source:
+        return ''
+    cleaner = bleach.Cleaner(
+        tags=ALLOWED_TAGS,
+        attributes=_allow_attribute,
+        protocols=ALLOWED_PROTOCOLS,
+        strip=True,
+        strip_comments=True,
+        css_sanitizer=StyleSanitizer(),
+        filters=[CruftFilter],
+    )
+    html = cleaner.clean(source)
+    html = _EMPTY_PARAGRAPH.sub('', html)
+    html = _AROUND_BLOCKS.sub(r'\1', html)
+    return html.strip()
+
+
+def render_texts(apps, schema_editor):
+    """Заполняет text_html у существующих вопросов и ответов."""
+    for name in ('Question', 'Answer'):
+        model = apps.get_model('courses', name)
+        batch = []
+        for obj in model.objects.only('id', 'text').iterator(chunk_size=500):
+            obj.text_html = render_html(obj.text)
+            batch.append(obj)
+            if len(batch) >= 500:
+                model.objects.bulk_update(batch, ['text_html'])
+                batch = []
+        model.objects.bulk_update(batch, ['text_html'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0016_topic_ordering'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='text_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='text_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(render_texts, migrations.RunPython.noop),
+    ]
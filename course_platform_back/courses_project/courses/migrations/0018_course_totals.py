@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:29
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_course_totals(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    courses = list(Course.objects.annotate(n=Count('topics'), m=Sum('topics__duration_in_minutes')))
+    for course in courses:
+        course.topic_count, course.total_minutes = course.n, course.m or 0
+    Course.objects.bulk_update(courses, ['topic_count', 'total_minutes'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0017_rendered_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='topic_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='total_minutes',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='content_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_course_totals, migrations.RunPython.noop),
+    ]
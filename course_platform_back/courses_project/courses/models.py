@@ -1,5 +1,11 @@
+from datetime import timedelta
+
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import AbstractUser
+from django.utils.timezone import now
+
+from .richtext import render_html
 
 # --------------------------------------
 
@@ -15,13 +21,15 @@ class User(AbstractUser):
         'self',
         null=True, blank=True,
         on_delete=models.SET_NULL,
-        related_name='students'
+        related_name='students',
+        db_index=False,  # покрывается индексом (curator, role)
     )
 
     class Meta:
+        # username уже уникален — отдельный индекс по нему не нужен
         indexes = [
-            models.Index(fields=['username']),
             models.Index(fields=['name']),
+            models.Index(fields=['curator', 'role']),
         ]
 
     def __str__(self):
@@ -63,28 +71,75 @@ class Course(models.Model):
         help_text='Обложка курса или иконка'
     )
 
+    access_days = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text='Срок доступа после записи (в днях). Пусто — без ограничения'
+    )
+
+    # Итоги по темам для каталога, пересчитываются в courses.topics.refresh_course_totals
+    topic_count = models.PositiveIntegerField(default=0, editable=False)
+    total_minutes = models.PositiveIntegerField(default=0, editable=False)
+
     def __str__(self):
         return self.title
 
+    def expiry_for(self, enrolled_at):
+        """Дата окончания доступа для записи, сделанной в enrolled_at."""
+        if self.access_days is None:
+            return None
+        return enrolled_at + timedelta(days=self.access_days)
+
 # --------------------------------------
 
+class EnrollmentQuerySet(models.QuerySet):
+    def active(self, at=None):
+        at = at or now()
+        return self.filter(Q(expires_at__isnull=True) | Q(expires_at__gt=at))
+
+    def expired(self, at=None):
+        return self.filter(expires_at__lte=at or now())
+
+
 class Enrollment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     enrolled_at = models.DateTimeField(auto_now_add=True)
+    # Денормализовано из enrolled_at + course.access_days, чтобы проверка
+    # и зачистка истёкших записей шли по индексу, а не по вычислению дат
+    expires_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
+
+    objects = EnrollmentQuerySet.as_manager()
 
     class Meta:
         unique_together = ('user', 'course')
+        indexes = [
+            # Сортировка и date_hierarchy в админке
+            models.Index(fields=['-enrolled_at']),
+        ]
 
     def __str__(self):
         return f"{self.user.username} -> {self.course.title}"
 
+    def save(self, *args, **kwargs):
+        if self.enrolled_at is None:
+            self.enrolled_at = now()
+        self.expires_at = self.course.expiry_for(self.enrolled_at)
+        super().save(*args, **kwargs)
+
 # --------------------------------------
 
 class Topic(models.Model):
-    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='topics')
+    # Порядковые номера идут с шагом ORDER_GAP, чтобы тему можно было вставить
+    # между соседними без перенумерации; пересчёт — в courses.topics
+    ORDER_GAP = 10
+
+    # Индекс по course покрывается уникальным индексом (course, order)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='topics', db_index=False)
     title = models.CharField(max_length=255)
-    order = models.PositiveIntegerField()
+    order = models.PositiveIntegerField(blank=True, help_text='Пусто — в конец курса')
+    # Позиция темы в курсе с нуля, денормализована из order (см. courses.topics)
+    ordinal = models.PositiveIntegerField(default=0, editable=False)
     video_url = models.URLField(blank=True, null=True)  # ссылка на видео
     video_title = models.CharField(max_length=255)
 
@@ -93,40 +148,116 @@ class Topic(models.Model):
         null=True,
         help_text='Продолжительность видео (в минутах)'
     )
+    # Растёт при изменении темы и её теста: по нему кэши всех процессов
+    # узнают, что готовое тело темы (courses.compression) устарело
+    content_version = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['order']
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'order'], name='unique_topic_order_per_course'),
+        ]
 
     def __str__(self):
-        return f"{self.order}. {self.title} ({self.course.title})"
+        return f"{self.position}. {self.title} ({self.course.title})"
+
+    @property
+    def position(self):
+        """Номер темы в курсе с единицы."""
+        return self.ordinal + 1
+
+    def save(self, *args, **kwargs):
+        if self.order is None:
+            last = Topic.objects.filter(course_id=self.course_id).aggregate(last=models.Max('order'))['last']
+            self.order = (last or 0) + self.ORDER_GAP
+        bump_version(self, kwargs)
+        super().save(*args, **kwargs)
 
 # --------------------------------------
 
 class Test(models.Model):
+    PASS_MODE_CHOICES = (
+        ('absolute', 'Минимум баллов'),
+        ('percent', 'Процент от максимума'),
+    )
+
     topic = models.OneToOneField(Topic, on_delete=models.CASCADE, related_name='test')
+    pass_mode = models.CharField(max_length=20, choices=PASS_MODE_CHOICES, default='absolute')
+    pass_threshold = models.PositiveIntegerField(
+        default=9,
+        help_text='Проходной балл (сумма весов вопросов) или процент — в зависимости от режима'
+    )
+    pool_size = models.PositiveSmallIntegerField(
+        default=0,
+        help_text='Сколько вопросов выдавать из пула за попытку (0 — все вопросы)'
+    )
+    shuffle_answers = models.BooleanField(default=False, help_text='Перемешивать порядок ответов')
+    # Растёт при каждом изменении теста, его вопросов и ответов: по нему
+    # кэши всех процессов узнают, что ключ теста устарел
+    content_version = models.PositiveIntegerField(default=0, editable=False)
+
+    @property
+    def is_randomized(self):
+        return bool(self.pool_size) or self.shuffle_answers
 
     def __str__(self):
         return f"Test for topic: {self.topic.title}"
 
+    def save(self, *args, **kwargs):
+        bump_version(self, kwargs)
+        super().save(*args, **kwargs)
+
 # --------------------------------------
 
+def bump_version(obj, save_kwargs):
+    """Увеличивает content_version перед save(); при update_fields сохраняет и его."""
+    obj.content_version += 1
+    update_fields = save_kwargs.get('update_fields')
+    if update_fields is not None:
+        save_kwargs['update_fields'] = {*update_fields, 'content_version'}
+
+
+def render_text(obj, save_kwargs):
+    """Обновляет text_html перед save(); при update_fields с text сохраняет и его."""
+    obj.text_html = render_html(obj.text)
+    update_fields = save_kwargs.get('update_fields')
+    if update_fields is not None and 'text' in update_fields:
+        save_kwargs['update_fields'] = {*update_fields, 'text_html'}
+
+
 class Question(models.Model):
     test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='questions')
     text = models.TextField()
+    # Очищенный и сжатый text для выдачи студентам, считается при save()
+    text_html = models.TextField(blank=True, default='', editable=False)
+    weight = models.PositiveIntegerField(default=1, help_text='Сколько баллов даёт верный ответ')
+    multiple_choice = models.BooleanField(
+        default=False,
+        help_text='Несколько верных ответов: засчитывается только точное совпадение выбора'
+    )
 
     def __str__(self):
         return f"Question: {self.text[:50]}..."
 
+    def save(self, *args, **kwargs):
+        render_text(self, kwargs)
+        super().save(*args, **kwargs)
+
 # --------------------------------------
 
 class Answer(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='answers')
     text = models.CharField(max_length=255)
+    text_html = models.TextField(blank=True, default='', editable=False)
     is_correct = models.BooleanField(default=False)
 
     def __str__(self):
         return f"Answer: {self.text[:50]}..."
 
+    def save(self, *args, **kwargs):
+        render_text(self, kwargs)
+        super().save(*args, **kwargs)
+
 # --------------------------------------
 
 class UserTestResult(models.Model):
@@ -144,11 +275,164 @@ class UserTestResult(models.Model):
 
 # --------------------------------------
 
+class QuestionStats(models.Model):
+    """Счётчики по вопросу, копятся в courses.item_stats."""
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    times_shown = models.PositiveIntegerField(default=0)
+    times_correct = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.question_id}: {self.times_correct}/{self.times_shown}"
+
+
+class AnswerStats(models.Model):
+    answer = models.OneToOneField(Answer, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    times_chosen = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.answer_id}: {self.times_chosen}"
+
+# --------------------------------------
+
+class TestAttempt(models.Model):
+    """
+    Журнал попыток, только добавление. Выбранные ответы хранятся одной
+    упакованной строкой байтов (см. courses.attempts), а не строкой на
+    ответ, чтобы история не раздувала таблицу.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='test_attempts')
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='attempts')
+    score = models.PositiveIntegerField(default=0)
+    passed = models.BooleanField(default=False)
+    answers = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['test', 'created_at']),
+            models.Index(fields=['user', 'test', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.test.topic.title} - {self.score} points ({self.created_at:%Y-%m-%d %H:%M})"
+
+# --------------------------------------
+# Сводки для кураторов, обновляются в courses.progress по сигналам.
+# Счётчики — IntegerField: при расхождении уходят в минус, а не роняют
+# запись; сверяет всё команда rebuild_progress.
+
+class StudentCourseProgress(models.Model):
+    """Прогресс студента по курсу: сколько тем подряд пройдено и на какой он остановился."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='course_progress')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    passed_topics = models.IntegerField(default=0)
+    total_topics = models.IntegerField(default=0)
+    stuck_topic = models.ForeignKey(Topic, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+
+    class Meta:
+        unique_together = ('user', 'course')
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.course_id}: {self.passed_topics}/{self.total_topics}"
+
+
+class CuratorRollup(models.Model):
+    curator = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='rollup')
+    students = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.curator_id}: {self.students}"
+
+
+class CuratorCourseRollup(models.Model):
+    """Сумма пройденных тем студентов куратора по курсу — средний прогресс без обхода студентов."""
+    curator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='course_rollups')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    students = models.IntegerField(default=0)
+    passed_topics = models.IntegerField(default=0)
+    total_topics = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('curator', 'course')
+
+    def __str__(self):
+        return f"{self.curator_id} / {self.course_id}: {self.students}"
+
+
+class CuratorTopicRollup(models.Model):
+    """Сколько студентов куратора остановились на теме (её тест не пройден)."""
+    curator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='topic_rollups')
+    topic = models.ForeignKey(Topic, on_delete=models.CASCADE, related_name='+')
+    stuck = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('curator', 'topic')
+
+    def __str__(self):
+        return f"{self.curator_id} / {self.topic_id}: {self.stuck}"
+
+# --------------------------------------
+
 class Registration(models.Model):
     name = models.CharField(max_length=255, verbose_name="Есім")
     phone = models.CharField(max_length=11, verbose_name="Телефон номері")
     selected_pair = models.CharField(max_length=255, verbose_name="Пәндер жұбы")
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Тіркелу күні")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Тіркелу күні", db_index=True)
 
     def __str__(self):
         return f"{self.name} ({self.phone})"
+
+# --------------------------------------
+# Очередь фоновых задач (courses.tasks), разбирает команда run_tasks.
+
+class Task(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    run_at = models.DateTimeField(default=now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    # Пока задача с ключом ждёт в очереди, такая же вторая не добавляется
+    dedup_key = models.CharField(max_length=255, null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedup_key'], condition=Q(status='queued'), name='unique_queued_task',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} [{self.status}]"
+
+# --------------------------------------
+
+class CacheVersion(models.Model):
+    """
+    Версия данных, закэшированных в памяти процессов (например, каталога):
+    кэш у каждого процесса свой, а строка в базе видна всем.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
@@ -0,0 +1,86 @@
+# courses/pools.py
+import random
+
+from django.core.cache import cache
+
+from .models import Test, TestAttempt
+from .serializers import TestSerializer
+
+QUESTION_POOL_TIMEOUT = 60 * 60 * 24
+
+# --------------------------------------
+# Пул вопросов теста.
+#
+# Сериализованные вопросы с ответами собираются один раз и лежат в кэше
+# до изменения теста, вопроса или ответа (см. receivers и
+# Test.content_version). Выдача попытки —
+# выборка k индексов из пула генератором, засеянным (тест, пользователь,
+# номер попытки): один и тот же набор можно восстановить при проверке,
+# ничего не сохраняя и без ORDER BY RANDOM().
+
+
+def _cache_key(test_id):
+    return f'question-pool:{test_id}'
+
+
+def compile_question_pool(test):
+    """Вопросы теста в порядке id, в форме TestSerializer."""
+    test = Test.objects.prefetch_related('questions__answers').get(pk=test.pk)
+    return [
+        dict(question, answers=sorted((dict(a) for a in question['answers']), key=lambda a: a['id']))
+        for question in sorted(TestSerializer(test).data['questions'], key=lambda q: q['id'])
+    ]
+
+
+def get_question_pool(test):
+    # В кэше — (версия теста, пул): пул, собранный до правки в другом
+    # процессе, узнаётся по Test.content_version
+    cached = cache.get(_cache_key(test.id))
+    if cached is not None and cached[0] == test.content_version:
+        return cached[1]
+    pool = compile_question_pool(test)
+    cache.set(_cache_key(test.id), (test.content_version, pool), QUESTION_POOL_TIMEOUT)
+    return pool
+
+
+def invalidate_question_pool(test_id):
+    cache.delete(_cache_key(test_id))
+
+
+def attempt_number(user_id, test_id):
+    """Номер следующей попытки — по журналу попыток, индекс (user, test, created_at)."""
+    return TestAttempt.objects.filter(user_id=user_id, test_id=test_id).count() + 1
+
+
+def _rng(test_id, user_id, attempt):
+    return random.Random(f'{test_id}:{user_id}:{attempt}')
+
+
+def _draw_indices(rng, size, pool_size):
+    if pool_size and pool_size < size:
+        return rng.sample(range(size), pool_size)
+    return list(range(size))
+
+
+def draw_question_ids(test, user_id, attempt, question_ids):
+    """
+    Id вопросов попытки. question_ids — все id теста по возрастанию
+    (AnswerKey.question_ids), то есть в том же порядке, что и пул.
+    """
+    indices = _draw_indices(_rng(test.id, user_id, attempt), len(question_ids), test.pool_size)
+    return [question_ids[i] for i in indices]
+
+
+def draw_test(test, user_id, attempt):
+    """Данные теста для попытки: подмножество вопросов и, если нужно, перемешанные ответы."""
+    pool = get_question_pool(test)
+    rng = _rng(test.id, user_id, attempt)
+    questions = []
+    for i in _draw_indices(rng, len(pool), test.pool_size):
+        question = pool[i]
+        if test.shuffle_answers:
+            answers = list(question['answers'])
+            rng.shuffle(answers)
+            question = {**question, 'answers': answers}
+        questions.append(question)
+    return {"id": test.id, "attempt": attempt, "questions": questions}
@@ -0,0 +1,247 @@
+# courses/progress.py
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import (
+    User, Topic, Enrollment, UserTestResult,
+    StudentCourseProgress, CuratorRollup, CuratorCourseRollup, CuratorTopicRollup,
+)
+
+# --------------------------------------
+# Сводки для кураторов.
+#
+# На каждую запись на курс хранится строка StudentCourseProgress. При
+# событии (попытка пройдена, запись создана или удалена, сменился куратор,
+# изменился состав тем) пересчитываются только затронутые строки, а в
+# сводки куратора уходит разница старого и нового значения:
+# UPDATE ... SET x = x + n. Экран куратора читает готовые сводки.
+
+
+def _course_plans(course_ids):
+    """course_id -> [(topic_id, test_id или None), ...] в порядке тем."""
+    plans = {course_id: [] for course_id in course_ids}
+    topics = Topic.objects.filter(course_id__in=course_ids).order_by('course_id', 'order', 'id')
+    for topic_id, course_id, test_id in topics.values_list('id', 'course_id', 'test__id'):
+        plans[course_id].append((topic_id, test_id))
+    return plans
+
+
+def _progress(plan, passed_tests):
+    """
+    (пройдено тем, тема остановки). Темы считаются подряд до первой с
+    непройденным тестом — так же, как они разблокируются студенту.
+    """
+    passed = 0
+    for topic_id, test_id in plan:
+        if test_id is not None and test_id not in passed_tests:
+            return passed, topic_id
+        passed += 1
+    return passed, None
+
+
+class RollupDelta:
+    """Накопленные изменения сводок; apply() — по UPDATE на каждое различное приращение."""
+
+    def __init__(self):
+        self.students = Counter()
+        self.course_students = Counter()
+        self.course_passed = Counter()
+        self.stuck = Counter()
+
+    def add(self, curator_id, row, sign=1):
+        if curator_id is None:
+            return
+        key = (curator_id, row.course_id)
+        self.course_students[key] += sign
+        self.course_passed[key] += sign * row.passed_topics
+        if row.stuck_topic_id is not None:
+            self.stuck[(curator_id, row.stuck_topic_id)] += sign
+
+    def remove(self, curator_id, row):
+        self.add(curator_id, row, -1)
+
+    def apply(self):
+        CuratorRollup.objects.bulk_create(
+            [CuratorRollup(curator_id=c_id) for c_id, n in self.students.items() if n], ignore_conflicts=True
+        )
+        CuratorCourseRollup.objects.bulk_create(
+            [CuratorCourseRollup(curator_id=c_id, course_id=course_id)
+             for (c_id, course_id) in set(self.course_students) | set(self.course_passed)
+             if self.course_students[c_id, course_id] or self.course_passed[c_id, course_id]],
+            ignore_conflicts=True,
+        )
+        CuratorTopicRollup.objects.bulk_create(
+            [CuratorTopicRollup(curator_id=c_id, topic_id=topic_id) for (c_id, topic_id), n in self.stuck.items() if n],
+            ignore_conflicts=True,
+        )
+        _apply(CuratorRollup.objects.all(), None, 'students', self.students)
+        _apply(CuratorCourseRollup.objects.all(), 'course_id', 'students', self.course_students)
+        _apply(CuratorCourseRollup.objects.all(), 'course_id', 'passed_topics', self.course_passed)
+        _apply(CuratorTopicRollup.objects.all(), 'topic_id', 'stuck', self.stuck)
+
+
+def _apply(queryset, second, field, counter):
+    grouped = defaultdict(list)
+    for key, delta in counter.items():
+        if not delta:
+            continue
+        if second is None:
+            grouped[delta, None].append(key)
+        else:
+            grouped[delta, key[0]].append(key[1])
+    for (delta, curator_id), ids in grouped.items():
+        if second is None:
+            subset = queryset.filter(pk__in=ids)
+        else:
+            subset = queryset.filter(curator_id=curator_id, **{f'{second}__in': ids})
+        subset.update(**{field: F(field) + delta})
+
+
+def refresh_progress(pairs):
+    """
+    Пересчитывает прогресс для пар (user_id, course_id) и переносит разницу
+    в сводки кураторов. Запросов — константа на вызов, не на пару.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return
+    user_ids = {user_id for user_id, _ in pairs}
+    course_ids = {course_id for _, course_id in pairs}
+
+    with transaction.atomic():
+        enrolled = pairs & set(
+            Enrollment.objects.filter(user_id__in=user_ids, course_id__in=course_ids).values_list('user_id', 'course_id')
+        )
+        old = {
+            (row.user_id, row.course_id): row
+            for row in StudentCourseProgress.objects.filter(user_id__in=user_ids, course_id__in=course_ids)
+            if (row.user_id, row.course_id) in pairs
+        }
+        if not enrolled and not old:
+            return
+        plans = _course_plans({course_id for _, course_id in enrolled})
+        passed_tests = defaultdict(set)
+        for user_id, test_id in UserTestResult.objects.filter(
+            user_id__in=user_ids, passed=True, test__topic__course_id__in=list(plans)
+        ).values_list('user_id', 'test_id'):
+            passed_tests[user_id].add(test_id)
+        curators = dict(User.objects.filter(pk__in=user_ids).values_list('id', 'curator_id'))
+
+        delta = RollupDelta()
+        to_create, to_update, to_delete = [], [], []
+        for pair in pairs:
+            user_id, course_id = pair
+            row = old.get(pair)
+            curator_id = curators.get(user_id)
+            if pair not in enrolled:
+                if row is not None:
+                    delta.remove(curator_id, row)
+                    to_delete.append(row.pk)
+                continue
+
+            plan = plans[course_id]
+            passed_topics, stuck_topic_id = _progress(plan, passed_tests[user_id])
+            values = (passed_topics, len(plan), stuck_topic_id)
+            if row is None:
+                row = StudentCourseProgress(user_id=user_id, course_id=course_id)
+                to_create.append(row)
+            elif (row.passed_topics, row.total_topics, row.stuck_topic_id) == values:
+                continue
+            else:
+                delta.remove(curator_id, row)
+                to_update.append(row)
+            row.passed_topics, row.total_topics, row.stuck_topic_id = values
+            delta.add(curator_id, row)
+
+        StudentCourseProgress.objects.bulk_create(to_create)
+        StudentCourseProgress.objects.bulk_update(to_update, ['passed_topics', 'total_topics', 'stuck_topic'])
+        StudentCourseProgress.objects.filter(pk__in=to_delete).delete()
+        delta.apply()
+        for course_id, plan in plans.items():
+            CuratorCourseRollup.objects.filter(course_id=course_id).exclude(
+                total_topics=len(plan)
+            ).update(total_topics=len(plan))
+
+
+def refresh_course(course_id):
+    """После изменения состава или порядка тем — пересчёт всех записей курса."""
+    pairs = set(Enrollment.objects.filter(course_id=course_id).values_list('user_id', 'course_id'))
+    pairs |= set(StudentCourseProgress.objects.filter(course_id=course_id).values_list('user_id', 'course_id'))
+    refresh_progress(pairs)
+
+
+def move_student(user_id, old_curator_id, new_curator_id):
+    """Переносит прогресс студента из сводок прежнего куратора в сводки нового."""
+    delta = RollupDelta()
+    for row in StudentCourseProgress.objects.filter(user_id=user_id):
+        delta.remove(old_curator_id, row)
+        delta.add(new_curator_id, row)
+    for curator_id, sign in ((old_curator_id, -1), (new_curator_id, 1)):
+        if curator_id is not None:
+            delta.students[curator_id] += sign
+    with transaction.atomic():
+        delta.apply()
+
+
+def add_students(curator_ids):
+    """Учитывает новых студентов (без записей на курсы): curator_ids — id куратора на каждого."""
+    delta = RollupDelta()
+    delta.students.update(c_id for c_id in curator_ids if c_id is not None)
+    with transaction.atomic():
+        delta.apply()
+
+
+# --------------------------------------
+
+
+def rebuild_progress(batch_size=1000):
+    """
+    Полная сверка: строит прогресс и сводки заново с нуля.
+    Возвращает число записей прогресса.
+    """
+    with transaction.atomic():
+        StudentCourseProgress.objects.all().delete()
+        CuratorRollup.objects.all().delete()
+        CuratorCourseRollup.objects.all().delete()
+        CuratorTopicRollup.objects.all().delete()
+        add_students(User.objects.filter(curator__isnull=False).values_list('curator_id', flat=True))
+
+        total = 0
+        pairs = Enrollment.objects.order_by('course_id', 'user_id').values_list('user_id', 'course_id')
+        batch = []
+        for pair in pairs.iterator(chunk_size=batch_size):
+            batch.append(pair)
+            if len(batch) >= batch_size:
+                refresh_progress(batch)
+                total += len(batch)
+                batch = []
+        refresh_progress(batch)
+        return total + len(batch)
+
+
+def curator_dashboard(curator):
+    """Сводка куратора: три запроса по готовым таблицам, независимо от числа студентов."""
+    students = CuratorRollup.objects.filter(curator=curator).values_list('students', flat=True).first() or 0
+    courses = []
+    for rollup in CuratorCourseRollup.objects.filter(curator=curator, students__gt=0).select_related('course').order_by('course_id'):
+        possible = rollup.students * rollup.total_topics
+        courses.append({
+            "course_id": rollup.course_id,
+            "course_title": rollup.course.title,
+            "students": rollup.students,
+            "total_topics": rollup.total_topics,
+            "average_passed_topics": round(rollup.passed_topics / rollup.students, 2),
+            "average_progress": round(rollup.passed_topics * 100 / possible, 1) if possible else None,
+        })
+    stuck = [
+        {
+            "topic_id": rollup.topic_id,
+            "topic_title": rollup.topic.title,
+            "course_id": rollup.topic.course_id,
+            "students": rollup.stuck,
+        }
+        for rollup in CuratorTopicRollup.objects.filter(curator=curator, stuck__gt=0).select_related('topic').order_by('topic_id')
+    ]
+    return {"students": students, "courses": courses, "stuck_topics": stuck}
@@ -0,0 +1,179 @@
+# courses/provisioning.py
+import csv
+import io
+import json
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+
+from .models import User
+from .progress import add_students
+from .search import index_users
+
+BULK_BATCH_SIZE = 500
+# Столько раз импорт переоценивает строки, если параллельный импорт занял юзернеймы
+IMPORT_ATTEMPTS = 3
+ROLES = {role for role, _ in User.ROLE_CHOICES}
+USER_FIELDS = ('username', 'name', 'role', 'password', 'curator')
+
+# Статусы строк в отчёте импорта
+CREATED = 'created'
+EXISTS = 'exists'
+DUPLICATE = 'duplicate'
+INVALID = 'invalid'
+CURATOR_NOT_FOUND = 'curator_not_found'
+
+
+def parse_user_rows(text, fmt='csv'):
+    """
+    Разбирает CSV (с заголовком) или JSON-массив объектов с полями
+    username, name, role, password, curator (юзернейм куратора).
+    """
+    if fmt == 'json':
+        rows = json.loads(text)
+        if not isinstance(rows, list):
+            raise ValueError("Ожидается JSON-массив пользователей.")
+        if not all(isinstance(row, dict) for row in rows):
+            raise ValueError("Каждый пользователь должен быть JSON-объектом.")
+    else:
+        rows = list(csv.DictReader(io.StringIO(text)))
+    return normalize_user_rows(rows)
+
+
+def normalize_user_rows(rows):
+    """Оставляет только известные поля и приводит значения к обрезанным строкам."""
+    return [
+        {key: str(row.get(key) or '').strip() for key in USER_FIELDS}
+        for row in rows
+    ]
+
+
+def _init_worker():
+    # При старте через spawn настройки Django нужно поднять заново
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'courses_project.settings')
+        django.setup()
+
+
+def _hash(password):
+    return make_password(password or None)
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    Хэширует пароли параллельно в пуле процессов: PBKDF2 упирается в CPU,
+    а потоки упрутся в GIL. При workers=1 считается в текущем процессе.
+    Пустой пароль даёт непригодный для входа хэш.
+    """
+    passwords = list(passwords)
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(passwords) <= 1:
+        return [_hash(p) for p in passwords]
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        return list(pool.map(_hash, passwords, chunksize=chunksize))
+
+
+def import_users(rows, workers=None, batch_size=BULK_BATCH_SIZE):
+    """
+    Создаёт пользователей пачкой.
+
+    Существующие юзернеймы и кураторы читаются одним запросом, пароли
+    хэшируются в пуле процессов, затем кураторы из файла и остальные
+    пользователи вставляются двумя bulk_create — так curator_id
+    проставляется сразу при вставке, без повторного UPDATE.
+    Если параллельный импорт успел создать те же юзернеймы, вставка
+    откатывается, а строки переоцениваются по базе и попадают в EXISTS.
+    Возвращает список {"username", "status"} в порядке входных данных.
+    """
+    hashes = {}
+    for attempt in range(IMPORT_ATTEMPTS):
+        results, valid, curator_ids = _plan(rows)
+        new = [row for row in valid if row['username'] not in hashes]
+        passwords = hash_passwords([row.get('password') for row in new], workers=workers)
+        hashes.update(zip((row['username'] for row in new), passwords))
+        try:
+            _create(valid, hashes, curator_ids, batch_size)
+        except IntegrityError:
+            if attempt == IMPORT_ATTEMPTS - 1:
+                raise
+            continue
+        return results
+
+
+def _plan(rows):
+    """Статусы строк по текущему состоянию базы: (results, строки к созданию, id кураторов)."""
+    usernames = {row['username'] for row in rows if row.get('username')}
+    curator_names = {row['curator'] for row in rows if row.get('curator')}
+    existing = {
+        username: (role, pk)
+        for username, role, pk in User.objects.filter(
+            username__in=usernames | curator_names
+        ).values_list('username', 'role', 'id')
+    }
+    existing_curators = {username for username, (role, _) in existing.items() if role == 'curator'}
+
+    statuses = []
+    seen = set()
+    for row in rows:
+        username = row.get('username')
+        if not username or row.get('role') not in ROLES:
+            status = INVALID
+        elif username in seen or username in existing:
+            status = DUPLICATE if username in seen else EXISTS
+        else:
+            status = CREATED
+        if username:
+            seen.add(username)
+        statuses.append(status)
+
+    # Куратор должен либо уже существовать, либо создаваться в этом же импорте.
+    # Кураторам из импорта назначить куратора можно только из уже существующих.
+    new_curators = {
+        row['username'] for row, status in zip(rows, statuses)
+        if status == CREATED and row['role'] == 'curator'
+    }
+    results = []
+    valid = []
+    for row, status in zip(rows, statuses):
+        if status == CREATED and row.get('curator'):
+            allowed = existing_curators if row['role'] == 'curator' else existing_curators | new_curators
+            if row['curator'] not in allowed:
+                status = CURATOR_NOT_FOUND
+        if status == CREATED:
+            valid.append(row)
+        results.append({"username": row.get('username'), "status": status})
+
+    curator_ids = {username: existing[username][1] for username in existing_curators}
+    return results, valid, curator_ids
+
+
+def _create(valid, hashes, curator_ids, batch_size):
+    users = [
+        User(username=row['username'], name=row.get('name', ''), role=row['role'], password=hashes[row['username']])
+        for row in valid
+    ]
+    curators = [(row, user) for row, user in zip(valid, users) if user.role == 'curator']
+    others = [(row, user) for row, user in zip(valid, users) if user.role != 'curator']
+    with transaction.atomic():
+        for group in (curators, others):
+            for row, user in group:
+                if row.get('curator'):
+                    user.curator_id = curator_ids[row['curator']]
+            group_users = [user for _, user in group]
+            for start in range(0, len(group_users), batch_size):
+                User.objects.bulk_create(group_users[start:start + batch_size])
+            curator_ids.update({user.username: user.pk for user in group_users if user.role == 'curator'})
+        # bulk_create не шлёт post_save — счётчики кураторов и поиск обновляем сами
+        add_students([user.curator_id for user in users if user.curator_id])
+        index_users(users)
+
+
+def summarize(results):
+    """Количество строк по каждому статусу."""
+    return dict(Counter(r['status'] for r in results))
@@ -0,0 +1,218 @@
+# courses/receivers.py
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from . import catalogue, feed, progress, search
+from .compression import invalidate_topic_body
+from .enrollments import invalidate_access, sync_course_expiry
+from .models import User, Course, Enrollment, Topic, Test, Question, Answer, UserTestResult
+from .pools import invalidate_question_pool
+from .scoring import invalidate_answer_key
+from .signals import enrollments_changed, test_passed, topics_reordered
+from .topics import sync_ordinals, refresh_course_totals
+
+
+@receiver(enrollments_changed)
+def drop_enrollment_access_cache(sender, pairs, **kwargs):
+    invalidate_access(pairs)
+
+
+@receiver(post_save, sender=Enrollment)
+def drop_single_enrollment_access_cache(sender, instance, **kwargs):
+    invalidate_access([(instance.user_id, instance.course_id)])
+
+
+@receiver(pre_save, sender=Course)
+def remember_course_access_days(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        instance._access_days_changed = False
+        return
+    old = Course.objects.filter(pk=instance.pk).values_list('access_days', flat=True).first()
+    instance._access_days_changed = old != instance.access_days
+
+
+@receiver(post_save, sender=Course)
+def resync_enrollment_expiry(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw and getattr(instance, '_access_days_changed', False):
+        sync_course_expiry(instance)
+
+
+def drop_test_caches(test_id, topic_id):
+    # Тест входит в тело темы: её версия растёт вместе с версией теста
+    Topic.objects.filter(pk=topic_id).update(content_version=F('content_version') + 1)
+    invalidate_answer_key(test_id)
+    invalidate_question_pool(test_id)
+    invalidate_topic_body(topic_id)
+
+
+@receiver([post_save, post_delete], sender=Test)
+def drop_answer_key_for_test(sender, instance, **kwargs):
+    drop_test_caches(instance.pk, instance.topic_id)
+
+
+def bump_test_version(test_id):
+    # Test.save() увеличивает версию сам; правка вопроса или ответа — здесь
+    Test.objects.filter(pk=test_id).update(content_version=F('content_version') + 1)
+
+
+@receiver([post_save, post_delete], sender=Question)
+def drop_answer_key_for_question(sender, instance, **kwargs):
+    bump_test_version(instance.test_id)
+    topic_id = Test.objects.filter(pk=instance.test_id).values_list('topic_id', flat=True).first()
+    drop_test_caches(instance.test_id, topic_id)
+
+
+@receiver([post_save, post_delete], sender=Answer)
+def drop_answer_key_for_answer(sender, instance, **kwargs):
+    ids = Question.objects.filter(pk=instance.question_id).values_list('test_id', 'test__topic_id').first()
+    if ids is not None:
+        bump_test_version(ids[0])
+        drop_test_caches(*ids)
+
+
+@receiver([post_save, post_delete], sender=Topic)
+def drop_topic_body(sender, instance, **kwargs):
+    invalidate_topic_body(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Topic)
+def refresh_totals_for_topic(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_course_totals([instance.course_id])
+
+
+# --------------------------------------
+# Сводки кураторов (courses.progress)
+
+
+@receiver(enrollments_changed)
+def refresh_progress_for_enrollments(sender, pairs, membership=True, **kwargs):
+    if membership:
+        progress.refresh_progress(pairs)
+
+
+@receiver(post_save, sender=Enrollment)
+def refresh_progress_for_enrollment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        progress.refresh_progress([(instance.user_id, instance.course_id)])
+
+
+@receiver(test_passed)
+def refresh_progress_for_passed_test(sender, user_id, test_id, **kwargs):
+    course_id = Topic.objects.filter(test__id=test_id).values_list('course_id', flat=True).first()
+    if course_id is not None:
+        progress.refresh_progress([(user_id, course_id)])
+
+
+@receiver(test_passed)
+def publish_passed_test(sender, user_id, test_id, score=None, **kwargs):
+    # Без открытых лент кураторов лишних запросов на отправке теста нет
+    if not feed.broker.watching():
+        return
+    curator_id = User.objects.filter(pk=user_id).values_list('curator_id', flat=True).first()
+    topic = Test.objects.filter(pk=test_id).values_list('topic_id', 'topic__course_id').first()
+    if curator_id is None or topic is None:
+        return
+    data = {"student_id": user_id, "course_id": topic[1], "topic_id": topic[0], "test_id": test_id, "score": score}
+    transaction.on_commit(lambda: feed.broker.publish(curator_id, 'topic_passed', data))
+
+
+@receiver([post_save, post_delete], sender=UserTestResult)
+def refresh_progress_for_result(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_progress_for_passed_test(sender, instance.user_id, instance.test_id)
+
+
+@receiver(pre_save, sender=Topic)
+def remember_topic_order(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        instance._order_changed = True
+        return
+    old = Topic.objects.filter(pk=instance.pk).values_list('order', flat=True).first()
+    instance._order_changed = old != instance.order
+
+
+@receiver(post_save, sender=Topic)
+def refresh_progress_for_topic(sender, instance, raw=False, **kwargs):
+    if getattr(instance, '_order_changed', False):
+        sync_ordinals(instance.course_id)
+        if not raw:
+            progress.refresh_course(instance.course_id)
+
+
+@receiver(post_delete, sender=Topic)
+def refresh_progress_for_deleted_topic(sender, instance, **kwargs):
+    sync_ordinals(instance.course_id)
+    progress.refresh_course(instance.course_id)
+
+
+@receiver(topics_reordered)
+def refresh_progress_for_reordered_topics(sender, course_id, **kwargs):
+    progress.refresh_course(course_id)
+
+
+@receiver([post_save, post_delete], sender=Test)
+def refresh_progress_for_test(sender, instance, created=True, raw=False, **kwargs):
+    if created and not raw:
+        course_id = Topic.objects.filter(pk=instance.topic_id).values_list('course_id', flat=True).first()
+        if course_id is not None:
+            progress.refresh_course(course_id)
+
+
+@receiver(pre_save, sender=User)
+def remember_user_curator(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._old_curator_id = None
+    if raw or instance.pk is None or (update_fields is not None and 'curator' not in update_fields):
+        instance._curator_changed = False
+        return
+    instance._old_curator_id = User.objects.filter(pk=instance.pk).values_list('curator_id', flat=True).first()
+    instance._curator_changed = instance._old_curator_id != instance.curator_id
+
+
+@receiver(post_save, sender=User)
+def move_student_rollups(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        if instance.curator_id is not None:
+            progress.add_students([instance.curator_id])
+    elif getattr(instance, '_curator_changed', False):
+        progress.move_student(instance.pk, instance._old_curator_id, instance.curator_id)
+
+
+@receiver(pre_delete, sender=User)
+def forget_student_rollups(sender, instance, **kwargs):
+    if instance.curator_id is not None:
+        progress.move_student(instance.pk, instance.curator_id, None)
+
+
+# --------------------------------------
+# Поисковый индекс админки (courses.search)
+
+
+@receiver(post_save, sender=User)
+def index_user(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'username', 'name'} & set(update_fields):
+        search.index_users([instance])
+
+
+@receiver(post_delete, sender=User)
+def unindex_user(sender, instance, **kwargs):
+    search.unindex(search.USER_INDEX, [instance.pk])
+
+
+@receiver(post_save, sender=Course)
+def index_course(sender, instance, **kwargs):
+    search.index_courses([instance])
+
+
+@receiver(post_delete, sender=Course)
+def unindex_course(sender, instance, **kwargs):
+    search.unindex(search.COURSE_INDEX, [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Course)
+def invalidate_catalogue(sender, **kwargs):
+    catalogue.invalidate()
@@ -0,0 +1,76 @@
+# courses/results.py
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils.timezone import now
+
+from .models import UserTestResult
+from .signals import test_passed
+
+
+def record_result(user_id, test_id, score, passed):
+    """
+    Сохраняет результат попытки одним INSERT ... ON CONFLICT DO UPDATE.
+
+    Лучший балл и факт прохождения сливаются внутри базы (GREATEST / OR),
+    поэтому параллельные попытки одного пользователя не падают на
+    unique_together('user', 'test') и не затирают лучший результат.
+    Возвращает итоговые (score, passed) записи. После пройденной попытки
+    отправляет test_passed.
+    """
+    qn = connection.ops.quote_name
+    table = qn(UserTestResult._meta.db_table)
+    # В SQLite скалярный MAX(a, b) — аналог GREATEST в PostgreSQL
+    greatest = 'MAX' if connection.vendor == 'sqlite' else 'GREATEST'
+    sql = (
+        f"INSERT INTO {table} ({qn('user_id')}, {qn('test_id')}, {qn('score')}, {qn('passed')}, {qn('created_at')}) "
+        f"VALUES (%s, %s, %s, %s, %s) "
+        f"ON CONFLICT ({qn('user_id')}, {qn('test_id')}) DO UPDATE SET "
+        f"{qn('score')} = {greatest}({table}.{qn('score')}, excluded.{qn('score')}), "
+        f"{qn('passed')} = ({table}.{qn('passed')} OR excluded.{qn('passed')})"
+    )
+    params = [user_id, test_id, score, passed, now()]
+    with connection.cursor() as cursor:
+        if connection.features.can_return_columns_from_insert:
+            cursor.execute(f"{sql} RETURNING {qn('score')}, {qn('passed')}", params)
+            best_score, best_passed = cursor.fetchone()
+        else:
+            cursor.execute(sql, params)
+            best_score, best_passed = UserTestResult.objects.filter(
+                user_id=user_id, test_id=test_id
+            ).values_list('score', 'passed').get()
+    if passed:
+        test_passed.send(sender=UserTestResult, user_id=user_id, test_id=test_id, score=best_score)
+    return best_score, bool(best_passed)
+
+
+# --------------------------------------
+# Идемпотентность отправки теста: клиент присылает заголовок
+# Idempotency-Key, повтор с тем же ключом получает сохранённый ответ
+# без повторной проверки и записи.
+
+IN_PROGRESS = 'in-progress'
+
+
+def _submission_key(user_id, topic_id, key):
+    return f'submit-test:{user_id}:{topic_id}:{key}'
+
+
+def claim_submission(user_id, topic_id, key):
+    """
+    Пытается занять ключ. Возвращает (True, None), если попытку нужно
+    обработать, иначе (False, сохранённый ответ или IN_PROGRESS).
+    """
+    cache_key = _submission_key(user_id, topic_id, key)
+    if cache.add(cache_key, IN_PROGRESS, settings.SUBMISSION_IDEMPOTENCY_TIMEOUT):
+        return True, None
+    return False, cache.get(cache_key, IN_PROGRESS)
+
+
+def remember_submission(user_id, topic_id, key, data):
+    cache.set(_submission_key(user_id, topic_id, key), data, settings.SUBMISSION_IDEMPOTENCY_TIMEOUT)
+
+
+def release_submission(user_id, topic_id, key):
+    """Освобождает ключ, если попытка завершилась ошибкой и её можно повторить."""
+    cache.delete(_submission_key(user_id, topic_id, key))
@@ -0,0 +1,124 @@
+# courses/richtext.py
+import re
+from urllib.parse import urlsplit
+
+import bleach
+from bleach.html5lib_shim import Filter
+from django.conf import settings
+from django.http.request import validate_host
+
+# --------------------------------------
+# HTML из Summernote для студентов.
+#
+# Текст вопросов и ответов хранится как ввёл автор (text) и в готовом для
+# выдачи виде (text_html), который считается при сохранении: разрешённые
+# теги и атрибуты, из style остаётся только font-size, без пустых span и
+# абзацев, комментариев и лишних пробелов. Ссылки на картинки из MEDIA_URL
+# нашего сайта переписываются на RICHTEXT_MEDIA_URL (по умолчанию
+# MEDIA_URL), например на CDN. API отдаёт text_html как есть.
+
+ALLOWED_TAGS = {
+    'p', 'br', 'b', 'strong', 'i', 'em', 'u', 's', 'sub', 'sup', 'span',
+    'ul', 'ol', 'li', 'blockquote', 'a', 'img',
+}
+ALLOWED_ATTRIBUTES = {
+    'a': ('href', 'title'),
+    'img': ('src', 'alt', 'width', 'height'),
+    'span': ('style',),
+    'p': ('style',),
+}
+# data: допускается только для картинок, вставленных в редактор без загрузки
+ALLOWED_PROTOCOLS = ('http', 'https', 'mailto', 'data')
+ALLOWED_STYLES = {
+    'font-size': re.compile(r'^\d+(\.\d+)?(px|pt|em|rem|%)$'),
+}
+BLOCK_TAGS = ('p', 'ul', 'ol', 'li', 'blockquote', 'br')
+
+_WHITESPACE = re.compile(r'\s+')
+_EMPTY_PARAGRAPH = re.compile(r'<p>(?:\s|\xa0|&nbsp;|<br>)*</p>')
+_AROUND_BLOCKS = re.compile(r'\s*(</?(?:%s)\b[^>]*>)\s*' % '|'.join(BLOCK_TAGS))
+
+
+def _allow_attribute(tag, name, value):
+    if name not in ALLOWED_ATTRIBUTES.get(tag, ()):
+        return False
+    if name in ('href', 'src') and value.strip().lower().startswith('data:'):
+        return tag == 'img' and value.strip().lower().startswith('data:image/')
+    return True
+
+
+class StyleSanitizer:
+    """Вместо bleach.css_sanitizer (нужен tinycss2): оставляет только ALLOWED_STYLES."""
+
+    def sanitize_css(self, style):
+        declarations = []
+        for declaration in style.split(';'):
+            name, _, value = declaration.partition(':')
+            name, value = name.strip().lower(), value.strip()
+            pattern = ALLOWED_STYLES.get(name)
+            if pattern is not None and pattern.match(value):
+                declarations.append(f"{name}: {value}")
+        return '; '.join(declarations)
+
+
+def media_url(src):
+    """Ссылка на наш медиафайл — на RICHTEXT_MEDIA_URL; чужие ссылки не меняются."""
+    parts = urlsplit(src)
+    if parts.netloc and not validate_host(parts.hostname or '', settings.ALLOWED_HOSTS):
+        return src
+    if not parts.path.startswith(settings.MEDIA_URL):
+        return src
+    target = getattr(settings, 'RICHTEXT_MEDIA_URL', settings.MEDIA_URL)
+    url = target + parts.path[len(settings.MEDIA_URL):]
+    return f"{url}?{parts.query}" if parts.query else url
+
+
+class CruftFilter(Filter):
+    """
+    Убирает пустые атрибуты (style без разрешённых свойств), разворачивает
+    span и a без атрибутов, схлопывает пробелы, переписывает src картинок.
+    """
+    UNWRAP = ('span', 'a')
+
+    def __iter__(self):
+        kept = {name: [] for name in self.UNWRAP}
+        for token in super().__iter__():
+            kind = token['type']
+            if kind in ('StartTag', 'EmptyTag'):
+                token['data'] = {name: value for name, value in token['data'].items() if value}
+            if kind == 'StartTag' and token['name'] in self.UNWRAP:
+                kept[token['name']].append(bool(token['data']))
+                if not token['data']:
+                    continue
+            elif kind == 'EndTag' and token['name'] in self.UNWRAP:
+                stack = kept[token['name']]
+                if stack and not stack.pop():
+                    continue
+            elif kind == 'EmptyTag' and token['name'] == 'img':
+                src = (None, 'src')
+                if src in token['data']:
+                    token['data'][src] = media_url(token['data'][src])
+            elif kind in ('Characters', 'SpaceCharacters'):
+                token['data'] = _WHITESPACE.sub(' ', token['data'])
+            yield token
+
+
+_cleaner = bleach.Cleaner(
+    tags=ALLOWED_TAGS,
+    attributes=_allow_attribute,
+    protocols=ALLOWED_PROTOCOLS,
+    strip=True,
+    strip_comments=True,
+    css_sanitizer=StyleSanitizer(),
+    filters=[CruftFilter],
+)
+
+
+def render_html(source):
+    """Безопасный и сжатый HTML для выдачи студентам."""
+    if not source:
+        return ''
+    html = _cleaner.clean(source)
+    html = _EMPTY_PARAGRAPH.sub('', html)
+    html = _AROUND_BLOCKS.sub(r'\1', html)
+    return html.strip()
@@ -0,0 +1,142 @@
+# courses/scoring.py
+from django.core.cache import cache
+
+from .models import Question, Answer
+
+ANSWER_KEY_TIMEOUT = 60 * 60 * 24
+
+
+class QuestionKey:
+    __slots__ = ('weight', 'multiple', 'correct', 'answers')
+
+    def __init__(self, weight, multiple, correct, answers):
+        self.weight = weight
+        self.multiple = multiple
+        self.correct = correct
+        self.answers = answers
+
+
+class AnswerKey:
+    """
+    Скомпилированный ключ теста: веса, верные ответы и правило прохождения.
+    Проверка попытки — проход по словарю в памяти, без запросов к базе.
+    """
+    __slots__ = ('test_id', 'version', 'pass_mode', 'pass_threshold', 'questions', 'question_ids', 'max_score')
+
+    def __init__(self, test_id, pass_mode, pass_threshold, questions, version=0):
+        self.test_id = test_id
+        self.version = version
+        self.pass_mode = pass_mode
+        self.pass_threshold = pass_threshold
+        self.questions = questions
+        self.question_ids = sorted(questions)
+        self.max_score = sum(q.weight for q in questions.values())
+
+    def is_passed(self, score, max_score=None):
+        max_score = self.max_score if max_score is None else max_score
+        if self.pass_mode == 'percent':
+            return max_score > 0 and score * 100 >= self.pass_threshold * max_score
+        return score >= self.pass_threshold
+
+    def grade(self, user_answers, question_ids=None):
+        """
+        Проверяет ответы вида {"question_id", "answer_id"} или
+        {"question_id", "answer_ids": [...]} (для мультивыбора).
+        question_ids ограничивает набор вопросов попытки (по умолчанию — все),
+        максимум и процент прохождения тогда считаются по этому набору.
+        Возвращает Grade.
+        """
+        if question_ids is None:
+            allowed = self.questions
+            max_score = self.max_score
+        else:
+            allowed = {q_id for q_id in question_ids if q_id in self.questions}
+            max_score = sum(self.questions[q_id].weight for q_id in allowed)
+        score = 0
+        details = []
+        chosen = []
+        seen = set()
+        for ua in user_answers:
+            q_id = _to_int(ua.get('question_id'))
+            question = self.questions.get(q_id) if q_id in allowed else None
+            if question is None or q_id in seen:
+                details.append({"question_id": ua.get('question_id'), "answered_correctly": False})
+                continue
+            seen.add(q_id)
+
+            raw = ua.get('answer_ids')
+            if raw is None:
+                raw = [ua.get('answer_id')]
+            selected = {a_id for a_id in map(_to_int, raw if isinstance(raw, list) else [raw])
+                        if a_id in question.answers}
+            chosen.extend((q_id, a_id) for a_id in selected)
+
+            if question.multiple:
+                correct = bool(selected) and selected == question.correct
+            else:
+                correct = len(selected) == 1 and selected <= question.correct
+            if correct:
+                score += question.weight
+            details.append({"question_id": q_id, "answered_correctly": correct})
+
+        return Grade(score, max_score, self.is_passed(score, max_score), details, chosen)
+
+
+class Grade:
+    __slots__ = ('score', 'max_score', 'passed', 'details', 'chosen')
+
+    def __init__(self, score, max_score, passed, details, chosen):
+        self.score = score
+        self.max_score = max_score
+        self.passed = passed
+        self.details = details
+        self.chosen = chosen
+
+    @property
+    def correct_question_ids(self):
+        return [d['question_id'] for d in self.details if d['answered_correctly']]
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _cache_key(test_id):
+    return f'answer-key:{test_id}'
+
+
+def compile_answer_key(test):
+    """Собирает ключ двумя запросами: вопросы и ответы теста."""
+    questions = {
+        q['id']: QuestionKey(q['weight'], q['multiple_choice'], set(), set())
+        for q in Question.objects.filter(test=test).values('id', 'weight', 'multiple_choice')
+    }
+    for a in Answer.objects.filter(question__test=test).values('id', 'question_id', 'is_correct'):
+        question = questions[a['question_id']]
+        question.answers.add(a['id'])
+        if a['is_correct']:
+            question.correct.add(a['id'])
+    for question in questions.values():
+        question.answers = frozenset(question.answers)
+        question.correct = frozenset(question.correct)
+    return AnswerKey(test.id, test.pass_mode, test.pass_threshold, questions, test.content_version)
+
+
+def get_answer_key(test):
+    """
+    Ключ из кэша, если он собран для текущей версии теста. cache.delete из
+    receivers сбрасывает только кэш своего процесса, а версия из строки
+    теста видна всем.
+    """
+    key = cache.get(_cache_key(test.id))
+    if key is None or key.version != test.content_version:
+        key = compile_answer_key(test)
+        cache.set(_cache_key(test.id), key, ANSWER_KEY_TIMEOUT)
+    return key
+
+
+def invalidate_answer_key(test_id):
+    cache.delete(_cache_key(test_id))
@@ -0,0 +1,102 @@
+# courses/search.py
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.text import smart_split, unescape_string_literal
+
+# --------------------------------------
+# Поиск подстрок для админки.
+#
+# icontains компилируется в LIKE '%term%', который не использует обычные
+# индексы. В SQLite рядом с таблицами лежат виртуальные таблицы FTS5 с
+# токенизатором trigram (rowid = pk объекта), их держат в актуальном
+# состоянии receivers и массовые операции. В PostgreSQL миграция создаёт
+# GIN-индексы pg_trgm по UPPER(поле) — ровно то выражение, в которое Django
+# превращает icontains, поэтому там хватает стандартного поиска админки.
+
+USER_INDEX = 'courses_user_search'
+COURSE_INDEX = 'courses_course_search'
+
+INDEXED_FIELDS = {
+    USER_INDEX: ('username', 'name'),
+    COURSE_INDEX: ('title',),
+}
+
+# trigram ищет подстроки от трёх символов; короче — обычный icontains
+MIN_TERM_LENGTH = 3
+
+
+def fts_enabled():
+    """Есть ли в базе таблицы FTS5 (миграция пропускает их, если SQLite собран без FTS5)."""
+    if connection.vendor != 'sqlite':
+        return False
+    enabled = getattr(connection, '_courses_fts_enabled', None)
+    if enabled is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [USER_INDEX])
+            enabled = cursor.fetchone() is not None
+        connection._courses_fts_enabled = enabled
+    return enabled
+
+
+def index_rows(index, rows):
+    """rows — кортежи (pk, *значения полей из INDEXED_FIELDS[index])."""
+    if not rows or not fts_enabled():
+        return
+    fields = INDEXED_FIELDS[index]
+    placeholders = ', '.join(['%s'] * (len(fields) + 1))
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {index} (rowid, {', '.join(fields)}) VALUES ({placeholders})",
+            [tuple('' if value is None else value for value in row) for row in rows],
+        )
+
+
+def unindex(index, pks):
+    if not pks or not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {index} WHERE rowid = %s", [(pk,) for pk in pks])
+
+
+def index_users(users):
+    index_rows(USER_INDEX, [(user.pk, user.username, user.name) for user in users])
+
+
+def index_courses(courses):
+    index_rows(COURSE_INDEX, [(course.pk, course.title) for course in courses])
+
+
+def _terms(search_term):
+    # Разбиение как в ModelAdmin.get_search_results: по пробелам, кавычки — одна фраза
+    terms = []
+    for bit in smart_split(search_term):
+        if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+            bit = unescape_string_literal(bit)
+        if bit:
+            terms.append(bit)
+    return terms
+
+
+def _matches(index, term):
+    phrase = '"' + term.replace('"', '""') + '"'
+    return RawSQL(f"SELECT rowid FROM {index} WHERE {index} MATCH %s", [phrase])
+
+
+def search_condition(search_term, lookups):
+    """
+    Условие поиска по индексу: каждое слово должно найтись хотя бы в одном
+    из lookups ({'pk': USER_INDEX} или {'user': USER_INDEX, 'course': COURSE_INDEX}).
+    None — индекс не подходит (нет FTS5 или слово короче трёх символов),
+    и нужно искать стандартно.
+    """
+    terms = _terms(search_term)
+    if not terms or not fts_enabled() or any(len(term) < MIN_TERM_LENGTH for term in terms):
+        return None
+    condition = Q()
+    for term in terms:
+        term_condition = Q()
+        for lookup, index in lookups.items():
+            term_condition |= Q(**{f'{lookup}__in': _matches(index, term)})
+        condition &= term_condition
+    return condition
@@ -5,6 +5,9 @@ from .models import (
     User, Course, Enrollment, Topic,
     Test, Question, Answer, UserTestResult, Registration
 )
+from .enrollments import parse_usernames
+from .provisioning import parse_user_rows, normalize_user_rows
+from .bundles import parse_bundle
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -15,23 +18,23 @@ class UserSerializer(serializers.ModelSerializer):
         }
 
     def create(self, validated_data):
+        # Хэшируем до вставки, чтобы не делать второй save()
         password = validated_data.pop('password', None)
-        user = super().create(validated_data)
-        if password:
-            user.password = make_password(password)
-            user.save()
-        return user
+        validated_data['password'] = make_password(password or None)
+        return super().create(validated_data)
 
 
 
 class CourseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Course
-        fields = ['id', 'title', 'description', 'course_type', 'sub_type', 'img',]
+        fields = ['id', 'title', 'description', 'course_type', 'sub_type', 'img', 'topic_count', 'total_minutes']
 
 
 
 class TopicSerializer(serializers.ModelSerializer):
+    # Номер темы в курсе (1, 2, 3...), а не внутренний order с промежутками
+    order = serializers.IntegerField(source='position', read_only=True)
     # Булево поле, не связанное напрямую с моделью
     is_unlocked = serializers.SerializerMethodField()
 
@@ -50,16 +53,20 @@ class TopicSerializer(serializers.ModelSerializer):
 
 
 class AnswerSerializer(serializers.ModelSerializer):
+    # Готовый HTML (courses.richtext), а не исходник из редактора
+    text = serializers.CharField(source='text_html', read_only=True)
+
     class Meta:
         model = Answer
         fields = ['id', 'text', 'is_correct']
 
 class QuestionSerializer(serializers.ModelSerializer):
+    text = serializers.CharField(source='text_html', read_only=True)
     answers = AnswerSerializer(many=True, read_only=True)
 
     class Meta:
         model = Question
-        fields = ['id', 'text', 'answers']
+        fields = ['id', 'text', 'weight', 'multiple_choice', 'answers']
 
 class TestSerializer(serializers.ModelSerializer):
     questions = QuestionSerializer(many=True, read_only=True)
@@ -92,3 +99,88 @@ class RegistrationSerializer(serializers.ModelSerializer):
 
 
 
+class BulkEnrollmentSerializer(serializers.Serializer):
+    course_id = serializers.PrimaryKeyRelatedField(queryset=Course.objects.all(), source='course')
+    usernames = serializers.ListField(child=serializers.CharField(), required=False)
+    file = serializers.FileField(required=False)
+
+    def validate(self, attrs):
+        usernames = list(attrs.get('usernames', []))
+        if 'file' in attrs:
+            try:
+                usernames += parse_usernames(attrs['file'].read().decode('utf-8-sig'))
+            except UnicodeDecodeError:
+                raise serializers.ValidationError({"file": "Файл должен быть в кодировке UTF-8."})
+        if not usernames:
+            raise serializers.ValidationError("Необходимо указать usernames или CSV-файл.")
+        attrs['usernames'] = usernames
+        return attrs
+
+
+
+class UserImportSerializer(serializers.Serializer):
+    users = serializers.ListField(child=serializers.DictField(), required=False)
+    file = serializers.FileField(required=False)
+
+    def validate(self, attrs):
+        rows = normalize_user_rows(attrs.get('users', []))
+        if 'file' in attrs:
+            upload = attrs['file']
+            fmt = 'json' if upload.name.lower().endswith('.json') else 'csv'
+            try:
+                rows += parse_user_rows(upload.read().decode('utf-8-sig'), fmt=fmt)
+            except (UnicodeDecodeError, ValueError):
+                raise serializers.ValidationError({"file": "Не удалось разобрать файл (CSV или JSON в UTF-8)."})
+        if not rows:
+            raise serializers.ValidationError("Необходимо указать users или файл.")
+        attrs['rows'] = rows
+        return attrs
+
+
+class CourseBundleSerializer(serializers.Serializer):
+    bundle = serializers.DictField(required=False)
+    file = serializers.FileField(required=False)
+
+    def validate(self, attrs):
+        if 'file' in attrs:
+            upload = attrs['file']
+            fmt = 'yaml' if upload.name.lower().endswith(('.yaml', '.yml')) else 'json'
+            try:
+                attrs['bundle'] = parse_bundle(upload.read().decode('utf-8-sig'), fmt=fmt)
+            except (UnicodeDecodeError, ValueError):
+                raise serializers.ValidationError({"file": "Не удалось разобрать файл (JSON или YAML в UTF-8)."})
+        if 'bundle' not in attrs:
+            raise serializers.ValidationError("Необходимо указать bundle или файл.")
+        return attrs
+
+
+class CourseCloneSerializer(serializers.Serializer):
+    title = serializers.CharField(max_length=255, required=False)
+    course_type = serializers.ChoiceField(choices=Course.TYPE_CHOICES, allow_null=True, required=False)
+    sub_type = serializers.ChoiceField(choices=Course.SUB_TYPE_CHOICES, allow_null=True, required=False)
+    link_files = serializers.BooleanField(default=False)
+
+
+class EnrollmentBulkActionSerializer(serializers.Serializer):
+    ACTION_CHOICES = ('refresh', 'delete')
+
+    action = serializers.ChoiceField(choices=ACTION_CHOICES)
+    course_id = serializers.IntegerField(required=False)
+    usernames = serializers.ListField(child=serializers.CharField(), required=False)
+    enrolled_before = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        if not any(key in attrs for key in ('course_id', 'usernames', 'enrolled_before')):
+            raise serializers.ValidationError("Укажите хотя бы один фильтр: course_id, usernames или enrolled_before.")
+        return attrs
+
+    def get_queryset(self):
+        data = self.validated_data
+        queryset = Enrollment.objects.all()
+        if 'course_id' in data:
+            queryset = queryset.filter(course_id=data['course_id'])
+        if 'usernames' in data:
+            queryset = queryset.filter(user__username__in=data['usernames'])
+        if 'enrolled_before' in data:
+            queryset = queryset.filter(enrolled_at__lt=data['enrolled_before'])
+        return queryset
@@ -0,0 +1,18 @@
+# courses/signals.py
+from django.dispatch import Signal
+
+# Отправляется после массовых операций над Enrollment (создание, обновление
+# даты, удаление). Аргумент pairs — список (user_id, course_id) затронутых
+# записей, чтобы зависящие от записи кэши сбрасывались одним вызовом,
+# а не на каждую строку. membership=True — записи созданы или удалены,
+# False — изменились только даты.
+enrollments_changed = Signal()
+
+# Отправляется courses.results.record_result после успешной попытки
+# (аргументы user_id, test_id, score — лучший балл): лучший результат мог
+# стать пройденным.
+test_passed = Signal()
+
+# Отправляется courses.topics.reorder_topics (аргумент course_id): порядок
+# тем изменён одним UPDATE, без post_save на каждую тему.
+topics_reordered = Signal()
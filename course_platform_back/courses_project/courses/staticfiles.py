@@ -0,0 +1,52 @@
+# courses/staticfiles.py
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+from .compression import compress_variants
+from .media import serve_file
+
+# --------------------------------------
+# Статика админки, nested_admin и summernote.
+#
+# collectstatic кладёт в STATIC_ROOT копии с хэшем содержимого в имени
+# (ManifestStaticFilesStorage) и рядом с текстовыми файлами — сжатые
+# варианты .gz и, если установлен пакет brotli, .br. Веб-сервер отдаёт их
+# как есть (nginx gzip_static / brotli_static), serve_static — так же для
+# запросов, дошедших до Django. Хэшированные файлы кэшируются навсегда.
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.eot', '.ttf')
+# Маленькие файлы после сжатия почти не уменьшаются
+MIN_COMPRESS_SIZE = 512
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+SUFFIXES = dict(ENCODINGS)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Манифест с хэшированными именами плюс сжатые варианты, готовые при collectstatic."""
+
+    def stored_name(self, name):
+        # Манифеста ещё нет (collectstatic не запускали, тесты) — имена без хэша
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for name in sorted(set(self.hashed_files.values())):
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS) or not self.exists(name):
+                continue
+            with self.open(name) as f:
+                data = f.read()
+            if len(data) < MIN_COMPRESS_SIZE:
+                continue
+            for encoding, body in compress_variants(data).items():
+                suffix = SUFFIXES[encoding]
+                with open(self.path(name + suffix), 'wb') as f:
+                    f.write(body)
+                yield name, name + suffix, True
+
+
+def serve_static(request, path):
+    return serve_file(request, settings.STATIC_ROOT, path, settings.STATIC_ACCEL_PREFIX, encodings=ENCODINGS)
@@ -0,0 +1,203 @@
+# courses/tasks.py
+import logging
+import os
+import socket
+import time
+import traceback
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from . import progress
+from .enrollments import sweep_expired
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+# --------------------------------------
+# Фоновые задачи.
+#
+# Очередь — таблица Task. enqueue добавляет строку (с dedup_key — не больше
+# одной ждущей задачи на ключ), команда run_tasks забирает созревшие задачи
+# условным UPDATE status='queued' -> 'running' (два воркера одну задачу не
+# получат) и выполняет их в пуле потоков. Упавшая задача повторяется с
+# растущей задержкой, пока не кончатся попытки. Периодические задачи
+# (TASKS_SCHEDULE) после каждого запуска ставят себя заново через
+# интервал. С TASKS_EAGER задачи выполняются сразу в enqueue.
+
+TaskSpec = namedtuple('TaskSpec', ['func', 'max_attempts', 'retry_delay'])
+
+WORKERS = 4
+POLL_SECONDS = 1
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 30
+# Задача, которая выполняется дольше, считается брошенной упавшим воркером
+STALE_SECONDS = 60 * 10
+
+registry = {}
+
+
+def task(name, max_attempts=MAX_ATTEMPTS, retry_delay=RETRY_DELAY):
+    """Регистрирует функцию как задачу name; аргументы — только JSON-совместимые kwargs."""
+    def decorator(func):
+        registry[name] = TaskSpec(func, max_attempts, retry_delay)
+        return func
+    return decorator
+
+
+def enqueue(name, kwargs=None, delay=0, dedup_key=None):
+    """
+    Ставит задачу в очередь через delay секунд. Если задача с тем же
+    dedup_key уже ждёт, новая не добавляется.
+    """
+    spec = registry[name]
+    kwargs = kwargs or {}
+    if settings.TASKS_EAGER:
+        spec.func(**kwargs)
+        return
+    Task.objects.bulk_create([Task(
+        name=name, kwargs=kwargs, run_at=now() + timedelta(seconds=delay),
+        max_attempts=spec.max_attempts, dedup_key=dedup_key,
+    )], ignore_conflicts=True)
+
+
+def schedule_periodic():
+    """Ставит периодические задачи из TASKS_SCHEDULE, которых ещё нет в очереди."""
+    for name in settings.TASKS_SCHEDULE:
+        enqueue(name, dedup_key=_schedule_key(name))
+
+
+def _schedule_key(name):
+    return f'schedule:{name}'
+
+
+# --------------------------------------
+# Выполнение
+
+
+def claim(worker_id, limit):
+    """Забирает до limit созревших задач; возвращает их уже в статусе running."""
+    at = now()
+    ids = list(
+        Task.objects.filter(status=Task.QUEUED, run_at__lte=at).order_by('run_at', 'pk').values_list('pk', flat=True)[:limit]
+    )
+    claimed = [
+        pk for pk in ids
+        if Task.objects.filter(pk=pk, status=Task.QUEUED).update(
+            status=Task.RUNNING, locked_by=worker_id, started_at=at, attempts=F('attempts') + 1,
+        )
+    ]
+    return list(Task.objects.filter(pk__in=claimed).order_by('run_at', 'pk'))
+
+
+def _requeue(task_id, run_at, **fields):
+    """Возвращает задачу в очередь; если такую же уже поставили заново, эта закрывается."""
+    try:
+        with transaction.atomic():
+            Task.objects.filter(pk=task_id).update(status=Task.QUEUED, run_at=run_at, locked_by='', **fields)
+    except IntegrityError:
+        Task.objects.filter(pk=task_id).update(
+            status=Task.DONE, finished_at=now(), last_error="Заменена такой же задачей в очереди",
+        )
+
+
+def requeue_stale(stale_seconds=STALE_SECONDS):
+    """Задачи упавших воркеров (running дольше stale_seconds) снова ставятся в очередь."""
+    at = now()
+    stale = Task.objects.filter(status=Task.RUNNING, started_at__lt=at - timedelta(seconds=stale_seconds))
+    for task_id in stale.values_list('pk', flat=True):
+        _requeue(task_id, at)
+
+
+def execute(task):
+    spec = registry.get(task.name)
+    try:
+        if spec is None:
+            raise LookupError(f"Неизвестная задача {task.name}")
+        spec.func(**task.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception(f"Task {task.name} #{task.pk} failed (attempt {task.attempts})")
+        if spec is not None and task.attempts < task.max_attempts:
+            # 30 с, 60 с, 120 с, ...
+            delay = spec.retry_delay * 2 ** (task.attempts - 1)
+            _requeue(task.pk, now() + timedelta(seconds=delay), last_error=error)
+            return
+        Task.objects.filter(pk=task.pk).update(status=Task.FAILED, finished_at=now(), last_error=error)
+    else:
+        Task.objects.filter(pk=task.pk).update(status=Task.DONE, finished_at=now())
+
+    interval = settings.TASKS_SCHEDULE.get(task.name)
+    if interval:
+        enqueue(task.name, delay=interval, dedup_key=_schedule_key(task.name))
+
+
+def _execute_in_thread(task):
+    try:
+        execute(task)
+    finally:
+        # У каждого потока пула своё соединение с базой
+        close_old_connections()
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_pending(limit=None):
+    """Выполняет созревшие задачи в текущем потоке, пока они есть. Возвращает их число."""
+    done = 0
+    while limit is None or done < limit:
+        batch = claim(worker_id(), 1)
+        if not batch:
+            return done
+        execute(batch[0])
+        done += 1
+    return done
+
+
+def run_worker(workers=WORKERS, poll=POLL_SECONDS, once=False):
+    """
+    Цикл воркера: забирает созревшие задачи пачками по workers и выполняет
+    их в пуле потоков. С once выходит, когда созревших задач не осталось.
+    """
+    name = worker_id()
+    schedule_periodic()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while True:
+            requeue_stale()
+            batch = claim(name, workers)
+            if batch:
+                list(pool.map(_execute_in_thread, batch))
+                continue
+            if once:
+                return
+            time.sleep(poll)
+
+
+# --------------------------------------
+# Задачи приложения
+
+
+@task('courses.expire_enrollments')
+def expire_enrollments():
+    deleted = sweep_expired()
+    logger.info(f"Expired enrollments removed: {deleted}")
+
+
+@task('courses.rebuild_progress')
+def rebuild_progress():
+    progress.rebuild_progress()
+
+
+@task('courses.purge_tasks')
+def purge_tasks():
+    """Удаляет завершённые задачи старше TASKS_KEEP_SECONDS."""
+    Task.objects.filter(
+        status__in=(Task.DONE, Task.FAILED), finished_at__lt=now() - timedelta(seconds=settings.TASKS_KEEP_SECONDS),
+    ).delete()
@@ -1,11 +1,68 @@
-from django.test import TestCase
-from .models import User, Course, Topic, Test, Question, Answer
+from datetime import timedelta
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import threading
+from unittest import mock, skipUnless
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction, IntegrityError, OperationalError
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from .models import (
+    User, Course, Enrollment, Topic, Test, Question, Answer, UserTestResult, TestAttempt, Registration,
+    StudentCourseProgress, Task, CacheVersion,
+)
+from .enrollments import (
+    bulk_enroll, parse_usernames, refresh_enrollments, delete_enrollments, sweep_expired,
+    get_access, ACCESS_ACTIVE, ACCESS_EXPIRED, ACCESS_NONE,
+)
+from .signals import enrollments_changed
+from .item_stats import ItemStatsBuffer, buffer as item_stats_buffer
+from .attempts import encode_answers, decode_answers, answer_distribution
+from .results import record_result
+from .scoring import get_answer_key
+from .pools import draw_test, draw_question_ids, get_question_pool
+from .progress import curator_dashboard, rebuild_progress
+from .search import search_condition, fts_enabled, USER_INDEX, COURSE_INDEX
+from .topics import reorder_topics
+from .bundles import BundleError, export_bundle, import_bundle, parse_bundle, stream_bundle
+from .cloning import clone_course
+from .richtext import render_html
+from .media import HashedMediaStorage, is_hashed, parse_range
+from .compression import CompressionMiddleware, cached_body, choose_encoding, topic_body_key
+from .videos import StubProvider, enrich_topics
+from . import catalogue, feed, tasks
+from .throttling import TokenBucketStore, store as throttle_store
+from .provisioning import hash_passwords, import_users, parse_user_rows
 from .serializers import (
     UserSerializer, CourseSerializer, TopicSerializer,
     TestSerializer, QuestionSerializer, AnswerSerializer
 )
 
 
+
+def reset_process_state(test_case):
+    """Кэш, корзины лимитов, буфер счётчиков, каталог и брокер ленты живут в памяти процесса между тестами."""
+    cache.clear()
+    catalogue.clear()
+    throttle_store.clear()
+    feed.broker.clear()
+    item_stats_buffer.clear()
+    test_case.addCleanup(item_stats_buffer.clear)
+
+
 class UserSerializerTest(TestCase):
     def setUp(self):
         self.curator = User.objects.create(
@@ -37,6 +94,16 @@ class UserSerializerTest(TestCase):
         serialized_data = self.serializer.data
         self.assertNotIn('password', serialized_data)
 
+    def test_password_hashed_in_single_insert(self):
+        self.assertTrue(self.serializer.is_valid())
+        # Остальные запросы — счётчик студентов куратора и поисковый индекс
+        with CaptureQueriesContext(connection) as ctx:
+            user = self.serializer.save()
+        user_queries = [q['sql'] for q in ctx.captured_queries if '"courses_user"' in q['sql']]
+        self.assertEqual(len(user_queries), 1)
+        self.assertTrue(user_queries[0].startswith('INSERT'))
+        self.assertTrue(user.check_password('testpassword123'))
+
 
 class CourseSerializerTest(TestCase):
     def setUp(self):
@@ -108,3 +175,1730 @@ class QuestionAnswerSerializerTest(TestCase):
         data = serializer.data
         self.assertEqual(data['text'], "10")
         self.assertIn('id', data)
+
+
+class BulkEnrollTest(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(title="Test Course", description="Test")
+        self.curator = User.objects.create(username="curator1", name="Curator", role="curator")
+        self.students = [
+            User.objects.create(username=f"student{i}", name=f"Student {i}", role="student")
+            for i in range(3)
+        ]
+        Enrollment.objects.create(user=self.students[0], course=self.course)
+
+    def test_parse_usernames_skips_header_and_blank_lines(self):
+        text = "username,name\nstudent0,Student 0\n\n student1 \n"
+        self.assertEqual(parse_usernames(text), ['student0', 'student1'])
+
+    def test_bulk_enroll_reports_per_row_status(self):
+        usernames = ['student0', 'student1', 'student2', 'student1', 'curator1', 'ghost']
+        # 5 запросов на саму запись и постоянное число на пересчёт сводок кураторов
+        with self.assertNumQueries(5 + 9):
+            results = bulk_enroll(self.course, usernames)
+        self.assertEqual([r['status'] for r in results], [
+            'already_enrolled', 'enrolled', 'enrolled', 'duplicate', 'not_student', 'not_found',
+        ])
+        self.assertEqual(Enrollment.objects.filter(course=self.course).count(), 3)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class BulkEnrollmentViewTest(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(title="Test Course", description="Test")
+        self.admin = User.objects.create(username="admin", name="Admin", role="curator", is_staff=True)
+        User.objects.create(username="student1", name="Student 1", role="student")
+        self.client = APIClient()
+        self.url = reverse('enrollments-bulk')
+
+    def test_requires_staff(self):
+        student = User.objects.get(username="student1")
+        self.client.force_authenticate(student)
+        response = self.client.post(self.url, {'course_id': self.course.id, 'usernames': ['student1']}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_bulk_enroll_from_csv(self):
+        self.client.force_authenticate(self.admin)
+        upload = SimpleUploadedFile("students.csv", b"username\nstudent1\nghost\n", content_type="text/csv")
+        response = self.client.post(self.url, {'course_id': self.course.id, 'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['summary'], {'enrolled': 1, 'not_found': 1})
+        self.assertTrue(Enrollment.objects.filter(course=self.course, user__username="student1").exists())
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class EnrollmentAdminBulkTest(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(title="Test Course", description="Test")
+        self.admin = User.objects.create_superuser(username="admin", password="pass", name="Admin", role="curator")
+        User.objects.create(username="student1", name="Student 1", role="student")
+        self.client.force_login(self.admin)
+
+    def test_course_action_redirects_to_bulk_form(self):
+        response = self.client.post(reverse('admin:courses_course_changelist'), {
+            'action': 'bulk_enroll_students',
+            '_selected_action': [self.course.pk],
+        })
+        self.assertRedirects(response, f"{reverse('admin:bulk_enroll')}?course={self.course.pk}")
+
+    def test_refresh_action_updates_selected(self):
+        student = User.objects.get(username="student1")
+        enrollment = Enrollment.objects.create(user=student, course=self.course)
+        Enrollment.objects.update(enrolled_at="2020-01-01T00:00:00Z")
+        self.client.post(reverse('admin:courses_enrollment_changelist'), {
+            'action': 'refresh_enrolled_at_selected',
+            '_selected_action': [enrollment.pk],
+        })
+        enrollment.refresh_from_db()
+        self.assertGreater(enrollment.enrolled_at.year, 2020)
+
+    def test_bulk_form_enrolls_students(self):
+        response = self.client.post(reverse('admin:bulk_enroll'), {
+            'course': self.course.pk,
+            'usernames': "student1\nghost",
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "ghost")
+        self.assertTrue(Enrollment.objects.filter(course=self.course, user__username="student1").exists())
+
+
+
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ImportUsersTest(TestCase):
+    def setUp(self):
+        self.curator = User.objects.create(username="curator1", name="Curator One", role="curator")
+        User.objects.create(username="taken", name="Taken", role="student")
+
+    def test_parse_csv(self):
+        rows = parse_user_rows("username,name,role,password,curator\n s1 ,S One,student,pw,curator1\n")
+        self.assertEqual(rows, [{'username': 's1', 'name': 'S One', 'role': 'student', 'password': 'pw', 'curator': 'curator1'}])
+
+    def test_import_resolves_existing_and_new_curators(self):
+        rows = [
+            {'username': 's1', 'name': 'S1', 'role': 'student', 'password': 'pw1', 'curator': 'curator2'},
+            {'username': 's2', 'name': 'S2', 'role': 'student', 'password': 'pw2', 'curator': 'curator1'},
+            {'username': 'curator2', 'name': 'C2', 'role': 'curator', 'password': 'pw3', 'curator': ''},
+            {'username': 's2', 'name': 'S2', 'role': 'student', 'password': 'pw2', 'curator': ''},
+            {'username': 'taken', 'name': 'T', 'role': 'student', 'password': 'pw', 'curator': ''},
+            {'username': 's3', 'name': 'S3', 'role': 'admin', 'password': 'pw', 'curator': ''},
+            {'username': 's4', 'name': 'S4', 'role': 'student', 'password': 'pw', 'curator': 'nobody'},
+        ]
+        results = import_users(rows, workers=1)
+        self.assertEqual([r['status'] for r in results], [
+            'created', 'created', 'created', 'duplicate', 'exists', 'invalid', 'curator_not_found',
+        ])
+        s1 = User.objects.get(username='s1')
+        self.assertEqual(s1.curator.username, 'curator2')
+        self.assertTrue(s1.check_password('pw1'))
+        self.assertEqual(User.objects.get(username='s2').curator, self.curator)
+        self.assertFalse(User.objects.filter(username__in=['s3', 's4']).exists())
+
+    def test_username_taken_by_concurrent_import_is_reported(self):
+        rows = [
+            {'username': 's1', 'name': 'S1', 'role': 'student', 'password': 'pw1', 'curator': ''},
+            {'username': 's2', 'name': 'S2', 'role': 'student', 'password': 'pw2', 'curator': ''},
+        ]
+
+        def racing_hash(passwords, workers=None):
+            # Другой импорт создаёт s2 между проверкой и вставкой
+            User.objects.get_or_create(username='s2', defaults={'name': 'Other', 'role': 'student'})
+            return hash_passwords(passwords, workers=1)
+
+        with mock.patch('courses.provisioning.hash_passwords', side_effect=racing_hash):
+            results = import_users(rows, workers=1)
+        self.assertEqual([r['status'] for r in results], ['created', 'exists'])
+        self.assertTrue(User.objects.get(username='s1').check_password('pw1'))
+        self.assertEqual(User.objects.get(username='s2').name, 'Other')
+
+    def test_hash_passwords_in_process_pool(self):
+        hashes = hash_passwords(['a', 'b', 'c'], workers=2)
+        user = User(username='x')
+        for password, encoded in zip(['a', 'b', 'c'], hashes):
+            user.password = encoded
+            self.assertTrue(user.check_password(password))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, PASSWORD_HASHERS=FAST_HASHERS)
+class UserImportViewTest(TestCase):
+    def test_import_from_json_file(self):
+        admin = User.objects.create(username="admin", name="Admin", role="curator", is_staff=True)
+        client = APIClient()
+        client.force_authenticate(admin)
+        upload = SimpleUploadedFile(
+            "users.json",
+            b'[{"username": "s1", "name": "S1", "role": "student", "password": "pw", "curator": "admin"}]',
+            content_type="application/json",
+        )
+        response = client.post(reverse('users-import'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['summary'], {'created': 1})
+        self.assertEqual(User.objects.get(username='s1').curator, admin)
+
+    @override_settings(USER_IMPORT_WORKERS=1)
+    def test_import_hashes_in_request_process(self):
+        admin = User.objects.create(username="admin", name="Admin", role="curator", is_staff=True)
+        client = APIClient()
+        client.force_authenticate(admin)
+        upload = SimpleUploadedFile(
+            "users.json",
+            b'[{"username": "s1", "name": "S1", "role": "student", "password": "pw", "curator": ""},'
+            b' {"username": "s2", "name": "S2", "role": "student", "password": "pw", "curator": ""}]',
+            content_type="application/json",
+        )
+        with mock.patch('courses.provisioning.ProcessPoolExecutor') as pool:
+            response = client.post(reverse('users-import'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['summary'], {'created': 2})
+        pool.assert_not_called()
+
+
+
+class BulkEnrollmentUpdateTest(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(title="Test Course", description="Test")
+        self.other = Course.objects.create(title="Other Course", description="Test")
+        self.students = [
+            User.objects.create(username=f"student{i}", name=f"Student {i}", role="student")
+            for i in range(3)
+        ]
+        for student in self.students:
+            Enrollment.objects.create(user=student, course=self.course)
+        Enrollment.objects.create(user=self.students[0], course=self.other)
+        Enrollment.objects.update(enrolled_at="2020-01-01T00:00:00Z")
+
+        self.changed = []
+        receiver = lambda sender, pairs, **kwargs: self.changed.append(sorted(pairs))
+        enrollments_changed.connect(receiver, weak=False, dispatch_uid='test-bulk-update')
+        self.addCleanup(enrollments_changed.disconnect, dispatch_uid='test-bulk-update')
+
+    def test_refresh_is_single_update(self):
+        with self.assertNumQueries(2):
+            updated = refresh_enrollments(Enrollment.objects.filter(course=self.course))
+        self.assertEqual(updated, 3)
+        self.assertEqual(Enrollment.objects.filter(enrolled_at__year=2020).count(), 1)
+        self.assertEqual(self.changed, [sorted((s.id, self.course.id) for s in self.students)])
+
+    def test_delete_is_single_delete(self):
+        with CaptureQueriesContext(connection) as ctx:
+            deleted = delete_enrollments(Enrollment.objects.filter(course=self.course))
+        enrollment_queries = [q['sql'] for q in ctx.captured_queries if 'courses_enrollment' in q['sql']]
+        self.assertEqual(len([sql for sql in enrollment_queries if sql.startswith('DELETE')]), 1)
+        self.assertFalse([sql for sql in enrollment_queries if sql.startswith('SELECT "courses_enrollment"."id"')])
+        self.assertEqual(deleted, 3)
+        self.assertEqual(Enrollment.objects.count(), 1)
+        self.assertEqual(len(self.changed), 1)
+
+    @override_settings(SECURE_SSL_REDIRECT=False)
+    def test_bulk_action_view(self):
+        admin = User.objects.create(username="admin", name="Admin", role="curator", is_staff=True)
+        client = APIClient()
+        client.force_authenticate(admin)
+        url = reverse('enrollments-bulk-action')
+
+        response = client.post(url, {'action': 'delete'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = client.post(url, {'action': 'delete', 'usernames': ['student0']}, format='json')
+        self.assertEqual(response.data, {'action': 'delete', 'affected': 2})
+        self.assertFalse(Enrollment.objects.filter(user=self.students[0]).exists())
+
+
+
+class EnrollmentExpiryTest(TestCase):
+    def setUp(self):
+        reset_process_state(self)
+        self.course = Course.objects.create(title="Limited", description="Test", access_days=30)
+        self.unlimited = Course.objects.create(title="Unlimited", description="Test")
+        self.student = User.objects.create(username="student1", name="Student 1", role="student")
+
+    def test_expiry_computed_on_save_and_bulk_enroll(self):
+        enrollment = Enrollment.objects.create(user=self.student, course=self.course)
+        self.assertAlmostEqual(enrollment.expires_at - enrollment.enrolled_at, timedelta(days=30),
+                               delta=timedelta(seconds=1))
+        self.assertIsNone(Enrollment.objects.create(user=self.student, course=self.unlimited).expires_at)
+
+        other = User.objects.create(username="student2", name="Student 2", role="student")
+        bulk_enroll(self.course, ["student2"])
+        enrollment = Enrollment.objects.get(user=other)
+        self.assertAlmostEqual(enrollment.expires_at - enrollment.enrolled_at, timedelta(days=30),
+                               delta=timedelta(seconds=1))
+
+    def test_refresh_extends_expiry(self):
+        enrollment = Enrollment.objects.create(user=self.student, course=self.course)
+        Enrollment.objects.update(enrolled_at=now() - timedelta(days=40), expires_at=now() - timedelta(days=10))
+        refresh_enrollments(Enrollment.objects.all())
+        enrollment.refresh_from_db()
+        self.assertGreater(enrollment.expires_at, now() + timedelta(days=29))
+
+    def test_changing_access_days_resyncs_enrollments(self):
+        enrollment = Enrollment.objects.create(user=self.student, course=self.course)
+        self.course.access_days = 7
+        self.course.save()
+        enrollment.refresh_from_db()
+        self.assertEqual(enrollment.expires_at - enrollment.enrolled_at, timedelta(days=7))
+
+    def test_access_is_cached_and_invalidated(self):
+        self.assertEqual(get_access(self.student.id, self.course.id), ACCESS_NONE)
+        Enrollment.objects.create(user=self.student, course=self.course)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_access(self.student.id, self.course.id), ACCESS_ACTIVE)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_access(self.student.id, self.course.id), ACCESS_ACTIVE)
+
+        refresh_enrollments(Enrollment.objects.all())
+        Enrollment.objects.update(expires_at=now() - timedelta(seconds=1))
+        cache.clear()
+        self.assertEqual(get_access(self.student.id, self.course.id), ACCESS_EXPIRED)
+
+        delete_enrollments(Enrollment.objects.all())
+        self.assertEqual(get_access(self.student.id, self.course.id), ACCESS_NONE)
+
+    def test_sweep_deletes_only_expired(self):
+        other = User.objects.create(username="student2", name="Student 2", role="student")
+        Enrollment.objects.create(user=self.student, course=self.course)
+        Enrollment.objects.create(user=other, course=self.course)
+        Enrollment.objects.create(user=self.student, course=self.unlimited)
+        Enrollment.objects.filter(user=other).update(expires_at=now() - timedelta(days=1))
+
+        self.assertEqual(sweep_expired(batch_size=1), 1)
+        self.assertEqual(Enrollment.objects.count(), 2)
+        self.assertFalse(Enrollment.objects.filter(user=other).exists())
+
+    @override_settings(SECURE_SSL_REDIRECT=False)
+    def test_expired_enrollment_is_forbidden(self):
+        Enrollment.objects.create(user=self.student, course=self.course)
+        Enrollment.objects.update(expires_at=now() - timedelta(days=1))
+        client = APIClient()
+        client.force_authenticate(self.student)
+
+        response = client.get(reverse('course-topics', args=[self.course.id]))
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data['detail'], "Срок доступа к курсу истёк.")
+        self.assertEqual(client.get(reverse('my-courses')).data, [])
+
+
+
+class TokenBucketStoreTest(TestCase):
+    def test_bucket_refills_and_reports_wait(self):
+        store = TokenBucketStore()
+        for _ in range(3):
+            self.assertEqual(store.take('k', 3, 60, now=0), 0)
+        self.assertAlmostEqual(store.take('k', 3, 60, now=0), 20)
+        self.assertAlmostEqual(store.take('k', 3, 60, now=15), 5)
+        self.assertEqual(store.take('k', 3, 60, now=20), 0)
+        self.assertEqual(store.take('other', 3, 60, now=20), 0)
+
+    def test_prune_forgets_only_full_buckets(self):
+        store = TokenBucketStore(max_keys=1)
+        store.take('a', 1, 60, now=0)
+        store.take('b', 1, 60, now=100)
+        self.assertEqual(set(store._buckets), {'b'})
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    REST_FRAMEWORK={
+        'DEFAULT_AUTHENTICATION_CLASSES': ('rest_framework_simplejwt.authentication.JWTAuthentication',),
+        'DEFAULT_THROTTLE_RATES': {'registration_ip': '2/min', 'submit_test_user': '1/min', 'submit_test_ip': '100/min'},
+    },
+)
+class ThrottledViewsTest(TestCase):
+    def setUp(self):
+        reset_process_state(self)
+        self.client = APIClient()
+
+    def test_registration_returns_429_with_retry_after(self):
+        data = {'name': 'Test', 'phone': '87001234567', 'selected_pair': 'math-physics'}
+        for _ in range(2):
+            self.assertEqual(self.client.post(reverse('register'), data, format='json').status_code, 201)
+        response = self.client.post(reverse('register'), data, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn(int(response['Retry-After']), (29, 30))
+
+    def test_submit_test_is_limited_per_user(self):
+        student = User.objects.create(username="student1", name="Student 1", role="student")
+        self.client.force_authenticate(student)
+        url = reverse('topic-submit-test', args=[999])
+        self.assertEqual(self.client.post(url, {}, format='json').status_code, 404)
+        response = self.client.post(url, {}, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+
+
+
+class RecordResultTest(TestCase):
+    def setUp(self):
+        course = Course.objects.create(title="Test Course", description="Test")
+        topic = Topic.objects.create(course=course, title="Topic", order=1, video_title="Video")
+        self.test = Test.objects.create(topic=topic)
+        self.student = User.objects.create(username="student1", name="Student 1", role="student")
+
+    def test_upsert_keeps_best_score_and_pass(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(record_result(self.student.id, self.test.id, 5, False), (5, False))
+        self.assertEqual(record_result(self.student.id, self.test.id, 9, True), (9, True))
+        self.assertEqual(record_result(self.student.id, self.test.id, 3, False), (9, True))
+        result = UserTestResult.objects.get(user=self.student, test=self.test)
+        self.assertEqual((result.score, result.passed), (9, True))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class SubmitTestIdempotencyTest(TestCase):
+    def setUp(self):
+        reset_process_state(self)
+        course = Course.objects.create(title="Test Course", description="Test")
+        self.topic = Topic.objects.create(course=course, title="Topic", order=1, video_title="Video")
+        test = Test.objects.create(topic=self.topic)
+        self.question = Question.objects.create(test=test, text="2+2?")
+        self.right = Answer.objects.create(question=self.question, text="4", is_correct=True)
+        self.wrong = Answer.objects.create(question=self.question, text="5")
+        self.student = User.objects.create(username="student1", name="Student 1", role="student")
+        Enrollment.objects.create(user=self.student, course=course)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+        self.url = reverse('topic-submit-test', args=[self.topic.id])
+
+    def submit(self, answer, key):
+        payload = {'answers': [{'question_id': self.question.id, 'answer_id': answer.id}]}
+        return self.client.post(self.url, payload, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_with_same_key_replays_response(self):
+        first = self.submit(self.wrong, 'attempt-1')
+        replay = self.submit(self.right, 'attempt-1')
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay.data, first.data)
+        self.assertEqual(UserTestResult.objects.get(user=self.student).score, 0)
+
+        self.assertEqual(self.submit(self.right, 'attempt-2').data['score'], 1)
+        self.assertEqual(UserTestResult.objects.get(user=self.student).score, 1)
+
+
+class RecordResultConcurrencyTest(TransactionTestCase):
+    def test_parallel_submissions_merge_into_one_row(self):
+        course = Course.objects.create(title="Test Course", description="Test")
+        topic = Topic.objects.create(course=course, title="Topic", order=1, video_title="Video")
+        test = Test.objects.create(topic=topic)
+        student = User.objects.create(username="student1", name="Student 1", role="student")
+
+        scores = list(range(20)) * 3
+        errors = []
+        barrier = threading.Barrier(6)
+
+        def submit(score):
+            # Тестовая SQLite в памяти работает в shared-cache режиме, где
+            # конкурирующая запись сразу получает "table is locked" вместо
+            # ожидания busy_timeout, — это не ошибка upsert, повторяем
+            while True:
+                try:
+                    return record_result(student.id, test.id, score, score >= 15)
+                except OperationalError as exc:
+                    if 'locked' not in str(exc):
+                        raise
+
+        def worker(chunk):
+            try:
+                barrier.wait()
+                for score in chunk:
+                    submit(score)
+            except Exception as exc:  # noqa: BLE001
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(scores[i::6],)) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        result = UserTestResult.objects.get(user=student, test=test)
+        self.assertEqual((result.score, result.passed), (19, True))
+
+
+
+class AttemptEncodingTest(TestCase):
+    def test_roundtrip_is_compact(self):
+        pairs = [(1042, 5210), (1041, 5207), (1043, 5213), (1043, 5214), (1050, 5190)]
+        data = encode_answers(pairs)
+        self.assertEqual(decode_answers(data), sorted(pairs))
+        self.assertLessEqual(len(data), 3 * len(pairs) + 2)
+        self.assertEqual(decode_answers(encode_answers([])), [])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class AttemptHistoryTest(TestCase):
+    def setUp(self):
+        reset_process_state(self)
+        course = Course.objects.create(title="Test Course", description="Test")
+        self.topic = Topic.objects.create(course=course, title="Topic", order=1, video_title="Video")
+        self.test = Test.objects.create(topic=self.topic)
+        self.question = Question.objects.create(test=self.test, text="2+2?")
+        self.right = Answer.objects.create(question=self.question, text="4", is_correct=True)
+        self.wrong = Answer.objects.create(question=self.question, text="5")
+        self.curator = User.objects.create(username="curator1", name="Curator", role="curator")
+        self.student = User.objects.create(username="student1", name="Student 1", role="student", curator=self.curator)
+        Enrollment.objects.create(user=self.student, course=course)
+        self.client = APIClient()
+
+    def submit(self, answer):
+        self.client.force_authenticate(self.student)
+        payload = {'answers': [{'question_id': self.question.id, 'answer_id': answer.id}]}
+        self.client.post(reverse('topic-submit-test', args=[self.topic.id]), payload, format='json')
+
+    def test_every_submission_is_logged(self):
+        self.submit(self.wrong)
+        self.submit(self.right)
+        self.assertEqual(TestAttempt.objects.filter(user=self.student).count(), 2)
+        self.assertEqual(UserTestResult.objects.filter(user=self.student).count(), 1)
+
+        distribution = answer_distribution(self.test.id)
+        self.assertEqual(distribution, {
+            "attempts": 2,
+            "questions": [{"question_id": self.question.id, "answers": {self.wrong.id: 1, self.right.id: 1}}],
+        })
+
+    def test_curator_sees_student_history(self):
+        self.submit(self.wrong)
+        self.client.force_authenticate(self.curator)
+        url = reverse('topic-attempts', args=[self.topic.id])
+        response = self.client.get(url, {'student_id': self.student.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['answers'], [{"question_id": self.question.id, "answer_ids": [self.wrong.id]}])
+
+        other = User.objects.create(username="curator2", name="Other", role="curator")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(url, {'student_id': self.student.id}).status_code, 403)
+
+        for bad in ('abc', '1.5', ''):
+            self.assertEqual(self.client.get(url, {'student_id': bad}).status_code, 400, bad)
+
+
+
+class ItemStatsTest(TestCase):
+    def setUp(self):
+        reset_process_state(self)
+        course = Course.objects.create(title="Test Course", description="Test")
+        self.topic = Topic.objects.create(course=course, title="Topic", order=1, video_title="Video")
+        test = Test.objects.create(topic=self.topic)
+        self.q1 = Question.objects.create(test=test, text="2+2?")
+        self.q2 = Question.objects.create(test=test, text="3+3?")
+        self.a1 = Answer.objects.create(question=self.q1, text="4", is_correct=True)
+        self.a2 = Answer.objects.create(question=self.q2, text="5")
+        self.curator = User.objects.create(username="curator1", name="Curator", role="curator")
+
+    @override_settings(ITEM_STATS_FLUSH_SECONDS=3600)
+    def test_buffer_batches_increments(self):
+        buffer = ItemStatsBuffer()
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                buffer.record([self.q1.id, self.q2.id], [self.q1.id], [self.a1.id, self.a2.id])
+        buffer.record([self.q1.id], [], [self.a1.id])
+        # 2 проверки существования, 2 вставки строк, по одному UPDATE на каждый
+        # различный прирост поля: shown (4, 3), correct (3), chosen (4, 3);
+        # плюс SAVEPOINT/RELEASE транзакции
+        with self.assertNumQueries(2 + 2 + 5 + 2):
+            buffer.flush()
+        self.assertEqual(self.q1.stats.times_shown, 4)
+        self.assertEqual(self.q1.stats.times_correct, 3)
+        self.assertEqual(self.q2.stats.times_shown, 3)
+        self.assertEqual(self.a1.stats.times_chosen, 4)
+
+    @override_settings(SECURE_SSL_REDIRECT=False, ITEM_STATS_FLUSH_SECONDS=3600)
+    def test_submission_feeds_analytics_endpoint(self):
+        student = User.objects.create(username="student1", name="Student 1", role="student")
+        Enrollment.objects.create(user=student, course=self.topic.course)
+        client = APIClient()
+        client.force_authenticate(student)
+        client.post(reverse('topic-submit-test', args=[self.topic.id]),
+                    {'answers': [{'question_id': self.q1.id, 'answer_id': self.a1.id}]}, format='json')
+
+        client.force_authenticate(self.curator)
+        response = client.get(reverse('topic-item-analytics', args=[self.topic.id]))
+        self.assertEqual(response.status_code, 200)
+        first, second = response.data
+        self.assertEqual((first['times_shown'], first['times_correct'], first['correct_rate']), (1, 1, 1.0))
+        self.assertEqual(first['answers'], [{"answer_id": self.a1.id, "is_correct": True, "times_chosen": 1}])
+        self.assertEqual((second['times_shown'], second['times_correct']), (1, 0))
+
+
+
+class ScoringPolicyTest(TestCase):
+    def setUp(self):
+        reset_process_state(self)
+        course = Course.objects.create(title="Test Course", description="Test")
+        topic = Topic.objects.create(course=course, title="Topic", order=1, video_title="Video")
+        self.test = Test.objects.create(topic=topic, pass_mode='percent', pass_threshold=60)
+        self.single = Question.objects.create(test=self.test, text="2+2?", weight=1)
+        self.s_right = Answer.objects.create(question=self.single, text="4", is_correct=True)
+        self.s_wrong = Answer.objects.create(question=self.single, text="5")
+        self.multi = Question.objects.create(test=self.test, text="Чётные?", weight=3, multiple_choice=True)
+        self.m_two = Answer.objects.create(question=self.multi, text="2", is_correct=True)
+        self.m_four = Answer.objects.create(question=self.multi, text="4", is_correct=True)
+        self.m_five = Answer.objects.create(question=self.multi, text="5")
+
+    def test_weighted_percent_and_multiple_choice(self):
+        key = get_answer_key(self.test)
+        self.assertEqual(key.max_score, 4)
+        with self.assertNumQueries(0):
+            grade = get_answer_key(self.test).grade([
+                {'question_id': self.single.id, 'answer_id': self.s_right.id},
+                {'question_id': self.multi.id, 'answer_ids': [self.m_two.id, self.m_four.id]},
+            ])
+        self.assertEqual((grade.score, grade.passed), (4, True))
+
+        grade = key.grade([
+            {'question_id': self.single.id, 'answer_id': self.s_right.id},
+            {'question_id': self.multi.id, 'answer_ids': [self.m_two.id]},
+        ])
+        self.assertEqual((grade.score, grade.passed), (1, False))
+        self.assertEqual(grade.details[1], {"question_id": self.multi.id, "answered_correctly": False})
+
+        grade = key.grade([{'question_id': self.multi.id, 'answer_ids': [self.m_two.id, self.m_four.id]}])
+        self.assertEqual((grade.score, grade.passed), (3, True))
+
+    def test_foreign_answers_and_repeats_are_not_scored(self):
+        grade = get_answer_key(self.test).grade([
+            {'question_id': self.single.id, 'answer_id': self.m_two.id},
+            {'question_id': self.single.id, 'answer_id': self.s_right.id},
+            {'question_id': 'abc', 'answer_id': 1},
+        ])
+        self.assertEqual(grade.score, 0)
+        self.assertEqual(grade.chosen, [])
+
+    def test_absolute_threshold_and_cache_invalidation(self):
+        self.test.pass_mode = 'absolute'
+        self.test.pass_threshold = 1
+        self.test.save()
+        key = get_answer_key(self.test)
+        self.assertTrue(key.grade([{'question_id': self.single.id, 'answer_id': self.s_right.id}]).passed)
+
+        self.s_wrong.is_correct = True
+        self.s_wrong.save()
+        grade = get_answer_key(self.test).grade([{'question_id': self.single.id, 'answer_id': self.s_wrong.id}])
+        self.assertTrue(grade.passed)
+
+    def test_stale_key_of_other_process_is_not_used(self):
+        stale = get_answer_key(self.test)
+        self.s_wrong.is_correct = True
+        self.s_wrong.save()
+        # В кэше другого процесса ключ остался: cache.delete до него не доходит
+        cache.set(f'answer-key:{self.test.id}', stale)
+        self.test.refresh_from_db()
+        grade = get_answer_key(self.test).grade([{'question_id': self.single.id, 'answer_id': self.s_wrong.id}])
+        self.assertEqual(grade.score, 1)
+
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class QuestionPoolTest(TestCase):
+    def setUp(self):
+        reset_process_state(self)
+        course = Course.objects.create(title="Test Course", description="Test")
+        self.topic = Topic.objects.create(course=course, title="Topic", order=1, video_title="Video")
+        self.test = Test.objects.create(
+            topic=self.topic, pass_mode='percent', pass_threshold=100, pool_size=3, shuffle_answers=True
+        )
+        self.right = {}
+        for i in range(10):
+            question = Question.objects.create(test=self.test, text=f"Вопрос {i}")
+            self.right[question.id] = Answer.objects.create(question=question, text="Да", is_correct=True).id
+            for j in range(3):
+                Answer.objects.create(question=question, text=f"Нет {j}")
+        self.student = User.objects.create(username="student1", name="Student 1", role="student")
+        Enrollment.objects.create(user=self.student, course=course)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_draw_is_deterministic_per_user_and_attempt(self):
+        first = draw_test(self.test, self.student.id, 1)
+        self.assertEqual(len(first['questions']), 3)
+        self.assertEqual(first, draw_test(self.test, self.student.id, 1))
+        self.assertNotEqual(
+            [q['id'] for q in first['questions']],
+            [q['id'] for q in draw_test(self.test, self.student.id, 2)['questions']],
+        )
+        question_ids = get_answer_key(self.test).question_ids
+        self.assertEqual(
+            draw_question_ids(self.test, self.student.id, 1, question_ids),
+            [q['id'] for q in first['questions']],
+        )
+        with self.assertNumQueries(0):
+            draw_test(self.test, self.student.id, 3)
+
+    def test_stale_pool_of_other_process_is_not_used(self):
+        stale = get_question_pool(self.test)
+        question = Question.objects.filter(test=self.test).order_by('id').first()
+        question.text = "Исправленный вопрос"
+        question.save()
+        # В кэше другого процесса остался пул прежней версии теста
+        cache.set(f'question-pool:{self.test.id}', (self.test.content_version, stale))
+        self.test.refresh_from_db()
+        self.assertIn("Исправленный вопрос", get_question_pool(self.test)[0]['text'])
+
+    def test_submit_grades_only_drawn_questions(self):
+        response = self.client.get(reverse('topic-detail', args=[self.topic.id]))
+        self.assertEqual(response.status_code, 200)
+        drawn = response.data['test']['questions']
+        self.assertEqual(response.data['test']['attempt'], 1)
+
+        answers = [{'question_id': q_id, 'answer_id': a_id} for q_id, a_id in self.right.items()]
+        response = self.client.post(
+            reverse('topic-submit-test', args=[self.topic.id]), {'answers': answers}, format='json'
+        )
+        self.assertEqual(response.data['max_score'], 3)
+        self.assertEqual(response.data['score'], 3)
+        self.assertTrue(response.data['passed'])
+        correct = [d['question_id'] for d in response.data['answers_detail'] if d['answered_correctly']]
+        self.assertEqual(sorted(correct), sorted(q['id'] for q in drawn))
+
+        response = self.client.get(reverse('topic-detail', args=[self.topic.id]))
+        self.assertEqual(response.data['test']['attempt'], 2)
+
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CuratorRollupTest(TestCase):
+    def setUp(self):
+        reset_process_state(self)
+        self.course = Course.objects.create(title="Test Course", description="Test")
+        self.topics = [
+            Topic.objects.create(course=self.course, title=f"Topic {i}", order=i, video_title="Video")
+            for i in range(1, 4)
+        ]
+        # Вторая тема без теста засчитывается автоматически
+        self.test1 = Test.objects.create(topic=self.topics[0], pass_threshold=1)
+        self.test3 = Test.objects.create(topic=self.topics[2], pass_threshold=1)
+        self.curator = User.objects.create(username="curator1", name="Curator", role="curator")
+        self.other = User.objects.create(username="curator2", name="Other", role="curator")
+        self.students = [
+            User.objects.create(username=f"student{i}", name=f"Student {i}", role="student", curator=self.curator)
+            for i in range(3)
+        ]
+        bulk_enroll(self.course, [s.username for s in self.students])
+
+    def rebuilt(self, curator):
+        before = curator_dashboard(curator)
+        rebuild_progress(batch_size=2)
+        self.assertEqual(curator_dashboard(curator), before)
+        return before
+
+    def test_rollups_follow_results_enrollments_and_curator(self):
+        dashboard = self.rebuilt(self.curator)
+        self.assertEqual(dashboard['students'], 3)
+        self.assertEqual(dashboard['courses'][0]['average_progress'], 0)
+        self.assertEqual(dashboard['stuck_topics'], [
+            {"topic_id": self.topics[0].id, "topic_title": "Topic 1", "course_id": self.course.id, "students": 3}
+        ])
+
+        record_result(self.students[0].id, self.test1.id, 1, True)
+        record_result(self.students[0].id, self.test3.id, 1, True)
+        record_result(self.students[1].id, self.test1.id, 1, True)
+        record_result(self.students[2].id, self.test1.id, 0, False)
+        dashboard = self.rebuilt(self.curator)
+        course = dashboard['courses'][0]
+        self.assertEqual((course['students'], course['total_topics']), (3, 3))
+        self.assertEqual(course['average_passed_topics'], round(5 / 3, 2))
+        self.assertEqual(
+            {t['topic_id']: t['students'] for t in dashboard['stuck_topics']},
+            {self.topics[0].id: 1, self.topics[2].id: 1},
+        )
+
+        self.students[1].curator = self.other
+        self.students[1].save()
+        delete_enrollments(Enrollment.objects.filter(user=self.students[2]))
+        dashboard = self.rebuilt(self.curator)
+        self.assertEqual(dashboard['students'], 2)
+        self.assertEqual(dashboard['courses'][0]['students'], 1)
+        self.assertEqual(dashboard['courses'][0]['average_progress'], 100)
+        self.assertEqual(dashboard['stuck_topics'], [])
+        self.assertEqual(self.rebuilt(self.other)['stuck_topics'][0]['topic_id'], self.topics[2].id)
+
+    def test_new_topic_changes_totals(self):
+        record_result(self.students[0].id, self.test1.id, 1, True)
+        record_result(self.students[0].id, self.test3.id, 1, True)
+        Topic.objects.create(course=self.course, title="Topic 4", order=4, video_title="Video")
+        self.assertEqual(self.rebuilt(self.curator)['courses'][0]['total_topics'], 4)
+        self.topics[1].delete()
+        self.assertEqual(self.rebuilt(self.curator)['courses'][0]['total_topics'], 3)
+
+    def test_views_read_rollups(self):
+        record_result(self.students[0].id, self.test1.id, 1, True)
+        client = APIClient()
+        client.force_authenticate(self.curator)
+        with self.assertNumQueries(2):
+            response = client.get(reverse('curator-progress'))
+        self.assertEqual(response.data[0]['courses'], [{
+            "course_id": self.course.id, "course_title": "Test Course", "passed_topics": 2, "total_topics": 3,
+        }])
+        self.assertEqual(response.data[1]['courses'][0]['passed_topics'], 0)
+
+        with self.assertNumQueries(3):
+            response = client.get(reverse('curator-dashboard'))
+        self.assertEqual(response.data['students'], 3)
+
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class AdminSearchIndexTest(TestCase):
+    def setUp(self):
+        self.assertTrue(fts_enabled())
+        self.course = Course.objects.create(title="Математика для первоклассников", description="Test")
+        self.other_course = Course.objects.create(title="Физика", description="Test")
+        self.ivan = User.objects.create(username="ivanov", name="Иван Петров", role="student")
+        self.anna = User.objects.create(username="anna_s", name="Анна Смирнова", role="student")
+        Enrollment.objects.create(user=self.ivan, course=self.other_course)
+        Enrollment.objects.create(user=self.anna, course=self.course)
+
+    def find_users(self, term):
+        return set(User.objects.filter(search_condition(term, {'pk': USER_INDEX})))
+
+    def test_substring_search_follows_changes(self):
+        self.assertEqual(self.find_users("ПЕТР"), {self.ivan})
+        self.assertEqual(self.find_users("anov смир"), set())
+        self.assertEqual(self.find_users("'Анна Смир'"), {self.anna})
+
+        self.ivan.name = "Иван Смирнов"
+        self.ivan.save()
+        self.assertEqual(self.find_users("смир"), {self.ivan, self.anna})
+        self.anna.delete()
+        self.assertEqual(self.find_users("смир"), {self.ivan})
+
+        import_users([{'username': 'petr_k', 'name': 'Пётр Смирнов', 'role': 'student', 'password': 'x'}], workers=1)
+        self.assertEqual({u.username for u in self.find_users("смир")}, {'ivanov', 'petr_k'})
+
+    def test_course_index_follows_changes(self):
+        def find_courses(term):
+            return set(Course.objects.filter(search_condition(term, {'pk': COURSE_INDEX})))
+
+        self.assertEqual(find_courses("перво"), {self.course})
+        self.other_course.title = "Физика для первоклассников"
+        self.other_course.save()
+        self.assertEqual(find_courses("перво"), {self.course, self.other_course})
+        self.course.delete()
+        self.assertEqual(find_courses("перво"), {self.other_course})
+
+    def test_short_terms_fall_back_to_icontains(self):
+        self.assertIsNone(search_condition("ив", {'pk': USER_INDEX}))
+        self.assertIsNone(search_condition("  ", {'pk': USER_INDEX}))
+
+    def test_admin_search_and_autocomplete(self):
+        admin = User.objects.create_superuser(username="admin", password="pass", name="Admin", role="curator")
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin:courses_enrollment_changelist'), {'q': 'первокл'})
+        self.assertEqual(list(response.context['cl'].result_list.values_list('user__username', flat=True)), ['anna_s'])
+
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'courses', 'model_name': 'enrollment', 'field_name': 'user', 'term': 'етро',
+        })
+        self.assertEqual([r['id'] for r in response.json()['results']], [str(self.ivan.pk)])
+
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CourseCatalogueTest(TestCase):
+    def setUp(self):
+        reset_process_state(self)
+        self.math1 = Course.objects.create(
+            title="Математика", description="Сложение и вычитание", course_type='student', sub_type='grade1'
+        )
+        self.math2 = Course.objects.create(
+            title="Алгебра", description="Математика для второго класса", course_type='student', sub_type='grade2'
+        )
+        self.method = Course.objects.create(
+            title="Методика преподавания математики", description="Для учителей", course_type='teacher'
+        )
+        self.url = reverse('public-courses-search')
+
+    def test_text_search_facets_and_ordering(self):
+        response = APIClient().get(self.url, {'q': 'МАТЕМАТ'})
+        self.assertEqual([c['id'] for c in response.data['results']], [self.math2.id, self.math1.id, self.method.id])
+        self.assertEqual(response.data['facets'], {
+            'course_type': {'student': 2, 'teacher': 1},
+            'sub_type': {'grade1': 1, 'grade2': 1},
+        })
+
+        response = APIClient().get(self.url, {'q': 'матем', 'course_type': 'student', 'ordering': '-id'})
+        self.assertEqual([c['id'] for c in response.data['results']], [self.math2.id, self.math1.id])
+        # Фасет course_type считается без собственного фильтра
+        self.assertEqual(response.data['facets']['course_type'], {'student': 2, 'teacher': 1})
+
+        response = APIClient().get(self.url, {'q': 'матем вычит', 'sub_type': 'grade1'})
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(APIClient().get(self.url, {'ordering': 'price'}).status_code, 400)
+
+    def test_index_is_rebuilt_after_course_change(self):
+        APIClient().get(self.url)
+        with self.assertNumQueries(0):
+            response = APIClient().get(self.url, {'q': 'физ'})
+        self.assertEqual(response.data['count'], 0)
+
+        Course.objects.create(title="Физика", description="Механика", course_type='student', sub_type='grade2')
+        self.math1.delete()
+        response = APIClient().get(self.url, {'course_type': 'student'})
+        self.assertEqual([c['title'] for c in response.data['results']], ['Алгебра', 'Физика'])
+
+    def test_change_in_other_process_is_seen_after_check_interval(self):
+        APIClient().get(self.url)
+        # Другой процесс добавил курс и увеличил версию в базе; кэш этого процесса не тронут
+        Course.objects.bulk_create([Course(title="Физика", description="Механика")])
+        CacheVersion.objects.update_or_create(name=catalogue.VERSION_NAME, defaults={'value': 100})
+        self.assertEqual(APIClient().get(self.url, {'q': 'физ'}).data['count'], 0)
+        with mock.patch.object(catalogue, 'VERSION_CHECK_SECONDS', 0):
+            self.assertEqual(APIClient().get(self.url, {'q': 'физ'}).data['count'], 1)
+
+
+
+@skipUnless(connection.vendor == 'sqlite', "План запроса проверяется через EXPLAIN QUERY PLAN SQLite")
+@override_settings(SECURE_SSL_REDIRECT=False)
+class HotQueryPlanTest(TestCase):
+    """Частые запросы из views.py должны идти по индексу, а не полным просмотром таблицы."""
+
+    def setUp(self):
+        reset_process_state(self)
+        self.course = Course.objects.create(title="Course", description="-")
+        self.topics = [
+            Topic.objects.create(course=self.course, title=f"Topic {i}", video_title="Video") for i in range(3)
+        ]
+        self.test = Test.objects.create(topic=self.topics[0], pass_threshold=1)
+        question = Question.objects.create(test=self.test, text="2+2?")
+        self.answer = Answer.objects.create(question=question, text="4", is_correct=True)
+        Test.objects.create(topic=self.topics[1], pass_threshold=1)
+        self.curator = User.objects.create(username="curator1", name="Curator", role="curator")
+        self.student = User.objects.create(username="student1", name="Student", role="student", curator=self.curator)
+        Enrollment.objects.create(user=self.student, course=self.course)
+        Registration.objects.create(name="Guest", phone="87001234567")
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+        self.client.post(reverse('topic-submit-test', args=[self.topics[0].id]), {
+            'answers': [{'question_id': question.id, 'answer_id': self.answer.id}],
+        }, format='json')
+        cache.clear()
+
+    def plan(self, query):
+        sql, params = query.sql_with_params()
+        return self.plan_sql(sql, params)
+
+    def plan_sql(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [row[3] for row in cursor.fetchall()]
+
+    def view_selects(self, user, url):
+        """SELECT-запросы, которые view выполнил на самом деле."""
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT')]
+
+    def assertPlanUsesIndexes(self, sql):
+        plan = self.plan_sql(sql)
+        for step in plan:
+            if step.startswith('SCAN'):
+                self.assertIn('USING', step, f"{sql}\n{plan}")
+        if 'FROM "courses_topic"' in sql and 'ORDER BY "courses_topic"."order"' in sql:
+            self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan, sql)
+
+    def test_hot_queries_use_indexes(self):
+        requests = [
+            (self.student, reverse('my-courses')),
+            (self.student, reverse('course-topics', args=[self.course.id])),
+            (self.student, reverse('topic-detail', args=[self.topics[1].id])),
+            (self.student, reverse('topic-attempts', args=[self.topics[0].id])),
+            (self.student, reverse('course-first-topic', args=[self.course.id])),
+            (self.curator, reverse('curator-progress')),
+            (self.curator, reverse('curator-dashboard')),
+            (self.curator, reverse('today-registrations')),
+        ]
+        for user, url in requests:
+            selects = self.view_selects(user, url)
+            self.assertTrue(selects, url)
+            for sql in selects:
+                with self.subTest(url=url, sql=sql):
+                    self.assertPlanUsesIndexes(sql)
+
+    def test_table_scan_is_detected(self):
+        plan = self.plan(Registration.objects.filter(phone='87001234567').query)
+        self.assertTrue(any(step.startswith('SCAN') and 'USING' not in step for step in plan))
+
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class TopicOrderingTest(TestCase):
+    def setUp(self):
+        reset_process_state(self)
+        self.course = Course.objects.create(title="Test Course", description="Test")
+        self.topics = [
+            Topic.objects.create(course=self.course, title=f"Topic {i}", video_title="Video")
+            for i in range(4)
+        ]
+        self.test = Test.objects.create(topic=self.topics[0], pass_threshold=1)
+        self.student = User.objects.create(username="student1", name="Student 1", role="student")
+        Enrollment.objects.create(user=self.student, course=self.course)
+
+    def positions(self):
+        return list(Topic.objects.filter(course=self.course).values_list('title', 'ordinal'))
+
+    def test_orders_are_gapped_unique_and_ordinals_follow(self):
+        self.assertEqual(
+            list(Topic.objects.filter(course=self.course).values_list('order', flat=True)), [10, 20, 30, 40]
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Topic.objects.create(course=self.course, title="Dup", order=20, video_title="Video")
+
+        Topic.objects.create(course=self.course, title="Inserted", order=15, video_title="Video")
+        self.assertEqual(self.positions()[:3], [("Topic 0", 0), ("Inserted", 1), ("Topic 1", 2)])
+        self.topics[0].delete()
+        self.assertEqual(self.positions()[0], ("Inserted", 0))
+
+    def test_bulk_reorder_is_one_update(self):
+        ids = [t.id for t in self.topics]
+        with CaptureQueriesContext(connection) as ctx:
+            reorder_topics(self.course.id, [ids[3], ids[0]])
+        topic_updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "courses_topic"')]
+        self.assertEqual(len(topic_updates), 1)
+        self.assertEqual(
+            self.positions(), [("Topic 3", 0), ("Topic 0", 1), ("Topic 1", 2), ("Topic 2", 3)]
+        )
+
+    def test_repeated_reorders_keep_order_bounded(self):
+        ids = [t.id for t in self.topics]
+        Topic.objects.create(course=self.course, title="Inserted", order=15, video_title="Video")
+        for i in range(20):
+            reorder_topics(self.course.id, ids[i % 4:] + ids[:i % 4])
+            orders = list(Topic.objects.filter(course=self.course).values_list('order', flat=True))
+            self.assertLessEqual(max(orders), 2 * len(orders) * Topic.ORDER_GAP)
+        # Шаг между темами восстановлен
+        self.assertEqual(len({b - a for a, b in zip(orders, orders[1:])}), 1)
+
+    def test_first_topic_and_unlocking(self):
+        client = APIClient()
+        response = client.get(reverse('course-first-topic', args=[self.course.id]))
+        self.assertEqual(response.data[0]['title'], "Topic 0")
+        self.assertEqual(response.data[0]['order'], 1)
+        self.assertEqual(
+            [t['is_unlocked'] for t in response.data], [True, False, False, False]
+        )
+
+        client.force_authenticate(self.student)
+        self.assertEqual(client.get(reverse('topic-detail', args=[self.topics[0].id])).status_code, 200)
+        self.assertEqual(client.get(reverse('topic-detail', args=[self.topics[2].id])).status_code, 403)
+        record_result(self.student.id, self.test.id, 1, True)
+        # Доступ к курсу уже в кэше: пройденные тесты и темы с тестами
+        with self.assertNumQueries(2):
+            response = client.get(reverse('course-topics', args=[self.course.id]))
+        self.assertTrue(all(t['is_unlocked'] for t in response.data))
+        self.assertEqual(client.get(reverse('topic-detail', args=[self.topics[2].id])).status_code, 200)
+
+    def test_admin_reorder_view(self):
+        admin = User.objects.create_superuser(username="admin", password="pass", name="Admin", role="curator")
+        self.client.force_login(admin)
+        url = reverse('admin:reorder_topics', args=[self.course.id])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.post(url, {f'position_{self.topics[2].id}': '1'})
+        self.assertEqual([title for title, _ in self.positions()], ["Topic 2", "Topic 0", "Topic 1", "Topic 3"])
+
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CourseAdminTreeTest(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(title="Test Course", description="Test")
+        self.admin = User.objects.create_superuser(username="admin", password="pass", name="Admin", role="curator")
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:courses_course_change', args=[self.course.id])
+
+    def add_topics(self, count):
+        for _ in range(count):
+            topic = Topic.objects.create(course=self.course, title="Topic", video_title="Video")
+            test = Test.objects.create(topic=topic)
+            for _ in range(3):
+                question = Question.objects.create(test=test, text="?")
+                Answer.objects.create(question=question, text="!", is_correct=True)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_compact_tree_loads_in_constant_queries(self):
+        self.add_topics(2)
+        few, response = self.count_queries(self.url)
+        self.assertNotContains(response, 'questions-TOTAL_FORMS')
+        self.add_topics(5)
+        many, _ = self.count_queries(self.url)
+        self.assertEqual(few, many)
+
+        _, response = self.count_queries(f"{self.url}?tree=full")
+        self.assertContains(response, 'questions-TOTAL_FORMS')
+
+    def test_compact_post_saves_topic_rows(self):
+        self.add_topics(2)
+        topics = list(Topic.objects.filter(course=self.course))
+        data = {
+            'title': self.course.title, 'description': self.course.description,
+            'topics-TOTAL_FORMS': '2', 'topics-INITIAL_FORMS': '2',
+            'topics-MIN_NUM_FORMS': '0', 'topics-MAX_NUM_FORMS': '33',
+        }
+        for i, topic in enumerate(topics):
+            data.update({
+                f'topics-{i}-id': topic.id, f'topics-{i}-course': self.course.id,
+                f'topics-{i}-order': topic.order, f'topics-{i}-title': f"Renamed {i}",
+                f'topics-{i}-video_title': topic.video_title,
+            })
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            list(Topic.objects.filter(course=self.course).values_list('title', flat=True)), ["Renamed 0", "Renamed 1"]
+        )
+        self.assertEqual(Question.objects.count(), 6)
+
+
+def make_bundle(topics=2, questions=2, answers=3):
+    return {
+        "format": "courses-bundle",
+        "version": 1,
+        "course": {"title": "Bundle", "description": "Курс из пакета", "course_type": "student"},
+        "topics": [
+            {
+                "title": f"Topic {t}", "video_title": f"Video {t}",
+                "test": {"pass_mode": "percent", "pass_threshold": 60, "questions": [
+                    {"text": f"Q {t}.{q}", "weight": 2, "answers": [
+                        {"text": f"A {a}", "is_correct": a == 0} for a in range(answers)
+                    ]}
+                    for q in range(questions)
+                ]},
+            }
+            for t in range(topics)
+        ] + [{"title": "Без теста", "video_title": "Video", "test": None}],
+    }
+
+
+class CourseBundleTest(TestCase):
+    def setUp(self):
+        reset_process_state(self)
+
+    def count_import_queries(self, bundle):
+        with CaptureQueriesContext(connection) as ctx:
+            import_bundle(bundle)
+        return len(ctx.captured_queries)
+
+    def test_round_trip(self):
+        bundle = make_bundle()
+        course = import_bundle(bundle)
+        topics = list(Topic.objects.filter(course=course).order_by('order'))
+        self.assertEqual([(t.order, t.ordinal) for t in topics], [(10, 0), (20, 1), (30, 2)])
+        self.assertEqual(Answer.objects.filter(question__test__topic__course=course).count(), 12)
+
+        exported = export_bundle(course)
+        self.assertEqual(exported['course']['title'], "Bundle")
+        self.assertEqual(exported['topics'][0]['test']['questions'][1]['answers'][0],
+                         {"text": "A 0", "is_correct": True})
+        self.assertIsNone(exported['topics'][2]['test'])
+        # Повторный импорт экспорта даёт то же дерево
+        self.assertEqual(export_bundle(import_bundle(exported))['topics'], exported['topics'])
+
+    def test_streamed_yaml_and_json_parse_back(self):
+        course = import_bundle(make_bundle())
+        expected = export_bundle(course)
+        for fmt in ('json', 'yaml'):
+            self.assertEqual(parse_bundle(''.join(stream_bundle(course, fmt)), fmt=fmt), expected)
+        empty = Course.objects.create(title="Пустой", description="-")
+        self.assertEqual(parse_bundle(''.join(stream_bundle(empty, 'yaml')), fmt='yaml')['topics'], [])
+
+    def test_validation_reports_every_error_and_writes_nothing(self):
+        bundle = make_bundle()
+        bundle['course']['course_type'] = 'alien'
+        bundle['topics'][0]['test']['questions'][1]['weight'] = -1
+        bundle['topics'][1]['test']['questions'][0]['answers'][2] = {"txt": "typo"}
+        with self.assertRaises(BundleError) as ctx:
+            import_bundle(bundle)
+        paths = [error.split(':')[0] for error in ctx.exception.errors]
+        self.assertIn('course.course_type', paths)
+        self.assertIn('topics[0].test.questions[1].weight', paths)
+        self.assertIn('topics[1].test.questions[0].answers[2].txt', paths)
+        self.assertIn('topics[1].test.questions[0].answers[2].text', paths)
+        self.assertFalse(Course.objects.exists())
+
+    def test_import_queries_do_not_grow_with_bundle(self):
+        small = self.count_import_queries(make_bundle(topics=2, questions=2))
+        large = self.count_import_queries(make_bundle(topics=5, questions=10))
+        self.assertEqual(small, large)
+
+    @override_settings(SECURE_SSL_REDIRECT=False)
+    def test_api_import_and_export(self):
+        admin = User.objects.create_superuser(username="admin", password="pass", name="Admin", role="curator")
+        client = APIClient()
+        client.force_authenticate(admin)
+
+        response = client.post(reverse('course-import'), {"bundle": make_bundle()}, format='json')
+        self.assertEqual(response.status_code, 201)
+        course_id = response.data['course_id']
+
+        upload = SimpleUploadedFile("bad.json", b'{"course": {"title": ""}}')
+        response = client.post(reverse('course-import'), {"file": upload}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(any(error.startswith('course.title') for error in response.data['errors']))
+
+        response = client.get(reverse('course-export', args=[course_id]), {"as": "yaml"})
+        self.assertEqual(response.status_code, 200)
+        data = parse_bundle(b''.join(response.streaming_content).decode(), fmt='yaml')
+        self.assertEqual(len(data['topics']), 3)
+
+
+class CourseCloneTest(TestCase):
+    def setUp(self):
+        reset_process_state(self)
+        self.course = import_bundle(make_bundle())
+
+    def test_clone_copies_tree(self):
+        copy = clone_course(self.course, sub_type='grade2')
+        self.assertEqual(copy.title, "Bundle (копия)")
+        self.assertEqual(copy.sub_type, 'grade2')
+        original, cloned = export_bundle(self.course), export_bundle(copy)
+        self.assertEqual(cloned['topics'], original['topics'])
+        self.assertEqual(
+            list(Topic.objects.filter(course=copy).order_by('order').values_list('order', 'ordinal')),
+            list(Topic.objects.filter(course=self.course).order_by('order').values_list('order', 'ordinal')),
+        )
+        # Исходные объекты остались у исходного курса
+        self.assertEqual(Answer.objects.filter(question__test__topic__course=self.course).count(), 12)
+
+    def test_clone_queries_do_not_grow_with_course(self):
+        with CaptureQueriesContext(connection) as small:
+            clone_course(self.course)
+        large = import_bundle(make_bundle(topics=5, questions=10))
+        with CaptureQueriesContext(connection) as ctx:
+            clone_course(large)
+        self.assertEqual(len(small.captured_queries), len(ctx.captured_queries))
+
+    def test_image_is_shared_or_hardlinked(self):
+        with tempfile.TemporaryDirectory() as media, self.settings(MEDIA_ROOT=media):
+            self.course.img = SimpleUploadedFile("cover.png", b"png-bytes")
+            self.course.save()
+
+            shared = clone_course(self.course)
+            self.assertEqual(shared.img.name, self.course.img.name)
+
+            # Файл с хэшем в имени не меняется — копия делит его и кэшируется навсегда
+            linked = clone_course(self.course, link_files=True)
+            self.assertEqual(linked.img.name, self.course.img.name)
+
+            # Старый файл без хэша получает жёсткую ссылку под хэшированным именем
+            with open(os.path.join(media, "legacy.png"), "wb") as f:
+                f.write(b"legacy-bytes")
+            self.course.img.name = "legacy.png"
+            linked = clone_course(self.course, link_files=True)
+            self.assertNotEqual(linked.img.name, "legacy.png")
+            self.assertTrue(is_hashed(linked.img.name))
+            self.assertTrue(os.path.samefile(linked.img.path, self.course.img.path))
+
+    @override_settings(SECURE_SSL_REDIRECT=False)
+    def test_api_and_admin_action(self):
+        admin = User.objects.create_superuser(username="admin", password="pass", name="Admin", role="curator")
+        client = APIClient()
+        client.force_authenticate(admin)
+        response = client.post(reverse('course-clone', args=[self.course.id]),
+                               {"title": "Вариант 2", "sub_type": "grade2"}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['sub_type'], 'grade2')
+        self.assertEqual(Topic.objects.filter(course_id=response.data['id']).count(), 3)
+
+        self.client.force_login(admin)
+        response = self.client.post(reverse('admin:courses_course_changelist'), {
+            'action': 'clone_courses', '_selected_action': [self.course.id],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Course.objects.filter(title="Bundle (копия)").exists())
+
+
+class RichTextTest(TestCase):
+    def setUp(self):
+        reset_process_state(self)
+
+    def test_render_sanitizes_and_minifies(self):
+        html = render_html(
+            '<p style="color: red; font-size: 18px">Сколько   будет\n <b>5+5</b>?</p><p><br></p>'
+            '<!-- note --><script>alert(1)</script><span style="color: red">a</span> '
+            '<a href="javascript:alert(1)">x</a><img src="x.png" onerror="steal()">'
+        )
+        self.assertEqual(
+            html,
+            '<p style="font-size: 18px">Сколько будет <b>5+5</b>?</p>alert(1)a x<img src="x.png">',
+        )
+        self.assertEqual(render_html('5 < 6'), '5 &lt; 6')
+
+    @override_settings(ALLOWED_HOSTS=['api.example.com'], RICHTEXT_MEDIA_URL='https://cdn.example.com/m/')
+    def test_own_media_images_are_rewritten(self):
+        html = render_html(
+            '<img src="https://api.example.com/media/django-summernote/a.png">'
+            '<img src="https://other.example.org/media/b.png">'
+        )
+        self.assertEqual(
+            html,
+            '<img src="https://cdn.example.com/m/django-summernote/a.png">'
+            '<img src="https://other.example.org/media/b.png">',
+        )
+
+    def test_rendered_on_save_and_served(self):
+        course = Course.objects.create(title="Course", description="-")
+        test = Test.objects.create(topic=Topic.objects.create(course=course, title="T", video_title="V"))
+        question = Question.objects.create(test=test, text='<p>Вопрос <span>один</span></p><p>&nbsp;</p>')
+        answer = Answer.objects.create(question=question, text='<b>Да</b><!-- x -->', is_correct=True)
+        self.assertEqual(question.text_html, '<p>Вопрос один</p>')
+
+        question.text = '<p>Новый</p>'
+        question.save(update_fields=['text'])
+        question.refresh_from_db()
+        self.assertEqual(question.text_html, '<p>Новый</p>')
+
+        data = TestSerializer(test).data
+        self.assertEqual(data['questions'][0]['text'], '<p>Новый</p>')
+        self.assertEqual(data['questions'][0]['answers'][0]['text'], '<b>Да</b>')
+
+        copy = clone_course(course)
+        self.assertEqual(
+            Answer.objects.get(question__test__topic__course=copy).text_html, answer.text_html
+        )
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, MEDIA_SERVE_MODE='django')
+class MediaServingTest(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = self.settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.storage = HashedMediaStorage(location=media.name)
+        self.name = self.storage.save('covers/cover.png', SimpleUploadedFile('cover.png', b'0123456789'))
+
+    def test_storage_names_files_by_content(self):
+        self.assertRegex(self.name, r'^covers/cover\.[0-9a-f]{12}\.png$')
+        again = self.storage.save('covers/cover.png', SimpleUploadedFile('cover.png', b'0123456789'))
+        self.assertEqual(again, self.name)
+        other = self.storage.save('covers/cover.png', SimpleUploadedFile('cover.png', b'other'))
+        self.assertNotEqual(other, self.name)
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=2-5', 10), (2, 5))
+        self.assertEqual(parse_range('bytes=7-', 10), (7, 9))
+        self.assertEqual(parse_range('bytes=-3', 10), (7, 9))
+        self.assertEqual(parse_range('bytes=5-100', 10), (5, 9))
+        self.assertIsNone(parse_range('bytes=0-1,4-5', 10))
+        self.assertIsNone(parse_range(None, 10))
+        with self.assertRaises(ValueError):
+            parse_range('bytes=10-', 10)
+
+    def test_full_range_and_conditional_responses(self):
+        url = f'/media/{self.name}'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+
+        response = self.client.get(url, HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=20-').status_code, 416)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Устаревший If-Range — файл целиком
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"old"').status_code, 200)
+        self.assertEqual(self.client.get('/media/../settings.py').status_code, 404)
+
+    def test_protected_files_and_accel_mode(self):
+        # Вложения Summernote закрыты по умолчанию
+        name = self.storage.save('django-summernote/2026-01-01/note.pdf', SimpleUploadedFile('note.pdf', b'%PDF'))
+        url = f'/media/{name}'
+        self.assertEqual(self.client.get(url).status_code, 403)
+        # Обход префикса через '.' и '..' не проходит
+        self.storage.save('public/readme.txt', SimpleUploadedFile('readme.txt', b'hi'))
+        for bypass in (f'/media/public/../{name}', f'/media/./{name}', f'/media/public/..%2F{name}'):
+            self.assertEqual(self.client.get(bypass).status_code, 404, bypass)
+
+        user = User.objects.create_user(username="student", password="pass", name="Student", role="student")
+        self.client.force_login(user)
+        with self.settings(MEDIA_SERVE_MODE='x-accel'):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{name}')
+        self.assertEqual(response.content, b'')
+        self.assertTrue(response['Cache-Control'].startswith('private'))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, MEDIA_SERVE_MODE='django')
+class StaticPipelineTest(TestCase):
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        with tempfile.TemporaryDirectory() as root, self.settings(STATIC_ROOT=root):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            with open(os.path.join(root, 'staticfiles.json')) as f:
+                paths = json.load(f)['paths']
+            hashed = paths['admin/css/base.css']
+            self.assertRegex(hashed, r'^admin/css/base\.[0-9a-f]{12}\.css$')
+            self.assertEqual(staticfiles_storage.url('admin/css/base.css'), f'/static/{hashed}')
+            with open(os.path.join(root, hashed), 'rb') as f, gzip.open(os.path.join(root, hashed + '.gz')) as gz:
+                self.assertEqual(gz.read(), f.read())
+
+            response = self.client.get(f'/static/{hashed}', HTTP_ACCEPT_ENCODING='gzip, deflate')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['Content-Type'], 'text/css')
+            self.assertIn('Accept-Encoding', response['Vary'])
+            self.assertIn('immutable', response['Cache-Control'])
+            self.assertNotIn('Content-Encoding', self.client.get(f'/static/{hashed}'))
+            # q=0 — кодировка запрещена, а не принята
+            refused = self.client.get(f'/static/{hashed}', HTTP_ACCEPT_ENCODING='br;q=0, gzip;q=0')
+            self.assertNotIn('Content-Encoding', refused)
+
+    def test_admin_renders_without_manifest(self):
+        self.assertEqual(staticfiles_storage.url('admin/css/base.css'), '/static/admin/css/base.css')
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ResponseCompressionTest(TestCase):
+    def setUp(self):
+        reset_process_state(self)
+        self.course = Course.objects.create(title="Course", description="Описание курса " * 20)
+        self.topic = Topic.objects.create(course=self.course, title="Topic", video_title="Video")
+        self.test = Test.objects.create(topic=self.topic)
+        for i in range(10):
+            question = Question.objects.create(test=self.test, text=f"<p>Вопрос номер {i}?</p>")
+            for j in range(4):
+                Answer.objects.create(question=question, text=f"Ответ {j}", is_correct=j == 0)
+        self.student = User.objects.create_user(username="student", password="pass", name="S", role="student")
+        Enrollment.objects.create(user=self.student, course=self.course)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+        self.url = reverse('topic-detail', args=[self.topic.id])
+
+    def test_choose_encoding(self):
+        self.assertEqual(choose_encoding('gzip, deflate, br', ('br', 'gzip')), 'br')
+        self.assertEqual(choose_encoding('br;q=0.5, gzip', ('br', 'gzip')), 'gzip')
+        self.assertEqual(choose_encoding('*', ('gzip',)), 'gzip')
+        self.assertIsNone(choose_encoding('gzip;q=0, identity', ('gzip',)))
+        self.assertIsNone(choose_encoding('', ('gzip',)))
+
+    def test_topic_body_is_cached_with_compressed_variant(self):
+        plain = self.client.get(self.url)
+        self.assertEqual(plain.status_code, 200)
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        self.assertEqual(len(plain.json()['test']['questions']), 10)
+
+        body = cache.get(topic_body_key(self.topic.id))
+        self.assertEqual(body['identity'], plain.content)
+        compressed = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(compressed.content, body['gzip'])
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+
+        # Правка вопроса сбрасывает готовое тело
+        question = Question.objects.filter(test=self.test).first()
+        question.text = "<p>Новый текст</p>"
+        question.save()
+        self.assertIsNone(cache.get(topic_body_key(self.topic.id)))
+        self.assertIn('Новый текст', self.client.get(self.url).json()['test']['questions'][0]['text'])
+
+    def test_stale_topic_body_of_other_process_is_not_used(self):
+        self.client.get(self.url)
+        stale = cache.get(topic_body_key(self.topic.id))
+        answer = Answer.objects.filter(question__test=self.test).first()
+        answer.text = "Исправленный ответ"
+        answer.save()
+        # В кэше другого процесса тело осталось: cache.delete до него не доходит
+        cache.set(topic_body_key(self.topic.id), stale)
+        self.assertIn("Исправленный ответ", self.client.get(self.url).content.decode())
+
+    def test_html_with_csrf_token_is_not_compressed(self):
+        response = self.client.get('/admin/login/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(response.content), 860)
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_other_responses_compressed_on_the_fly(self):
+        for i in range(30):
+            Course.objects.create(title=f"Курс {i}", description="Описание " * 10)
+        response = self.client.get(reverse('public-courses-search'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content))['count'], 31)
+
+        small = self.client.get(reverse('user-me'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', small)
+
+    async def test_middleware_runs_natively_under_asgi(self):
+        body = json.dumps({"items": ["значение"] * 200}).encode()
+
+        async def view(request):
+            return HttpResponse(body, content_type='application/json')
+
+        async def stream(request):
+            return StreamingHttpResponse(iter([b"data: {}\n\n"]), content_type='text/event-stream')
+
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        middleware = CompressionMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(request)
+        self.assertEqual(gzip.decompress(response.content), body)
+        # Поток событий отдаётся как есть
+        response = await CompressionMiddleware(stream)(request)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertNotIn('Vary', response)
+
+
+VIDEO_STUB = {
+    'https://vimeo.com/1': {'title': "Сложение", 'duration': 125},
+    'https://vimeo.com/2': {'title': "Вычитание", 'duration': 600},
+}
+
+
+@override_settings(VIDEO_METADATA_PROVIDER='courses.videos.StubProvider', VIDEO_METADATA_STUB=VIDEO_STUB)
+class VideoMetadataTest(TestCase):
+    def setUp(self):
+        reset_process_state(self)
+        self.course = Course.objects.create(title="Course", description="-")
+
+    def add_topic(self, url, **fields):
+        fields.setdefault('video_title', '')
+        return Topic.objects.create(course=self.course, title="Topic", video_url=url, **fields)
+
+    def test_totals_follow_topic_changes(self):
+        first = self.add_topic('https://vimeo.com/1', duration_in_minutes=5)
+        self.add_topic(None, video_title="Без видео")
+        self.course.refresh_from_db()
+        self.assertEqual((self.course.topic_count, self.course.total_minutes), (2, 5))
+        first.delete()
+        self.course.refresh_from_db()
+        self.assertEqual((self.course.topic_count, self.course.total_minutes), (1, 0))
+
+    def test_enrich_fills_blank_fields_in_batches(self):
+        blank = self.add_topic('https://vimeo.com/1')
+        typed = self.add_topic('https://vimeo.com/2', video_title="Своё название")
+        same_url = self.add_topic('https://vimeo.com/1', duration_in_minutes=7)
+        unknown = self.add_topic('https://vimeo.com/404')
+
+        stats = enrich_topics(batch_size=2, workers=2)
+        self.assertEqual(stats, {"checked": 4, "updated": 3, "failed": 1})
+        for topic in (blank, typed, same_url, unknown):
+            topic.refresh_from_db()
+        self.assertEqual((blank.video_title, blank.duration_in_minutes), ("Сложение", 3))
+        self.assertEqual((typed.video_title, typed.duration_in_minutes), ("Своё название", 10))
+        self.assertEqual((same_url.video_title, same_url.duration_in_minutes), ("Сложение", 7))
+        self.assertIsNone(unknown.duration_in_minutes)
+
+        self.course.refresh_from_db()
+        self.assertEqual((self.course.topic_count, self.course.total_minutes), (4, 20))
+        self.assertEqual(CourseSerializer(self.course).data['total_minutes'], 20)
+        # Заполненное второй раз не запрашивается
+        self.assertEqual(enrich_topics(provider=StubProvider({}))["checked"], 1)
+
+    def test_enrich_is_visible_to_other_processes(self):
+        topic = self.add_topic('https://vimeo.com/1')
+        stale = cached_body(topic_body_key(topic.pk), lambda: {"video_title": ""}, version=topic.content_version)
+        catalogue_version = CacheVersion.objects.get(name=catalogue.VERSION_NAME).value
+
+        enrich_topics()
+        # Команда работает отдельным процессом: кэш веб-процесса она не видит
+        cache.set(topic_body_key(topic.pk), stale)
+        topic.refresh_from_db()
+        body = cached_body(topic_body_key(topic.pk), lambda: {"video_title": topic.video_title},
+                           version=topic.content_version)
+        self.assertIn("Сложение", body['identity'].decode())
+        self.assertGreater(CacheVersion.objects.get(name=catalogue.VERSION_NAME).value, catalogue_version)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, TASKS_SCHEDULE={})
+class TaskQueueTest(TestCase):
+    def setUp(self):
+        reset_process_state(self)
+        self.calls = []
+        self.failures = 0
+        tasks.task('tests.record', max_attempts=2, retry_delay=10)(self.record)
+        self.addCleanup(tasks.registry.pop, 'tests.record')
+
+    def record(self, value):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("boom")
+        self.calls.append(value)
+
+    def test_dedup_key_keeps_one_queued_task(self):
+        tasks.enqueue('tests.record', {'value': 1}, dedup_key='k')
+        tasks.enqueue('tests.record', {'value': 2}, dedup_key='k')
+        self.assertEqual(Task.objects.count(), 1)
+        self.assertEqual(tasks.run_pending(), 1)
+        self.assertEqual(self.calls, [1])
+        # Выполненная задача ключ не держит
+        tasks.enqueue('tests.record', {'value': 3}, dedup_key='k')
+        self.assertEqual(tasks.run_pending(), 1)
+        self.assertEqual(self.calls, [1, 3])
+
+    def test_delayed_task_waits_and_claim_is_exclusive(self):
+        tasks.enqueue('tests.record', {'value': 1}, delay=60)
+        self.assertEqual(tasks.run_pending(), 0)
+        Task.objects.update(run_at=now())
+        self.assertEqual(len(tasks.claim('w1', 10)), 1)
+        self.assertEqual(tasks.claim('w2', 10), [])
+
+        # Брошенная упавшим воркером задача возвращается в очередь
+        Task.objects.update(started_at=now() - timedelta(hours=1))
+        tasks.requeue_stale()
+        self.assertEqual(tasks.run_pending(), 1)
+        self.assertEqual(self.calls, [1])
+
+    def test_failed_task_is_retried_with_backoff(self):
+        self.failures = 1
+        tasks.enqueue('tests.record', {'value': 1})
+        with self.assertLogs('courses.tasks', 'ERROR'):
+            tasks.run_pending()
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), (Task.QUEUED, 1))
+        self.assertIn("boom", task.last_error)
+        self.assertGreater(task.run_at, now() + timedelta(seconds=5))
+
+        Task.objects.update(run_at=now())
+        tasks.run_pending()
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts, self.calls), (Task.DONE, 2, [1]))
+
+        self.failures = 2
+        tasks.enqueue('tests.record', {'value': 2})
+        with self.assertLogs('courses.tasks', 'ERROR'):
+            tasks.run_pending()
+            Task.objects.filter(status=Task.QUEUED).update(run_at=now())
+            tasks.run_pending()
+        self.assertEqual(Task.objects.filter(status=Task.FAILED).count(), 1)
+
+    def test_periodic_task_reschedules_itself(self):
+        with override_settings(TASKS_SCHEDULE={'tests.record': 60}):
+            tasks.enqueue('tests.record', {'value': 1}, dedup_key='schedule:tests.record')
+            tasks.schedule_periodic()
+            self.assertEqual(tasks.run_pending(), 1)
+            self.assertEqual(self.calls, [1])
+            following = Task.objects.get(status=Task.QUEUED)
+            self.assertGreater(following.run_at, now() + timedelta(seconds=50))
+            tasks.schedule_periodic()
+            self.assertEqual(Task.objects.filter(status=Task.QUEUED).count(), 1)
+
+    def test_submit_refreshes_curator_rollups_without_worker(self):
+        course = Course.objects.create(title="Course", description="-")
+        topic = Topic.objects.create(course=course, title="Topic", order=1, video_title="Video")
+        test = Test.objects.create(topic=topic, pass_threshold=1)
+        question = Question.objects.create(test=test, text="2+2?")
+        right = Answer.objects.create(question=question, text="4", is_correct=True)
+        curator = User.objects.create(username="curator1", name="Curator", role="curator")
+        student = User.objects.create(username="student1", name="Student", role="student", curator=curator)
+        Enrollment.objects.create(user=student, course=course)
+        client = APIClient()
+        client.force_authenticate(student)
+
+        payload = {'answers': [{'question_id': question.id, 'answer_id': right.id}]}
+        for _ in range(2):
+            response = client.post(reverse('topic-submit-test', args=[topic.id]), payload, format='json')
+            self.assertTrue(response.data['passed'])
+        # Пересчёт одной пары дешёвый и идёт сразу: отчёт куратора не ждёт воркера
+        self.assertFalse(Task.objects.exists())
+        self.assertEqual(StudentCourseProgress.objects.get(user=student).passed_topics, 1)
+        self.assertEqual(curator_dashboard(curator)['courses'][0]['average_progress'], 100)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CuratorFeedTest(TestCase):
+    def setUp(self):
+        reset_process_state(self)
+        course = Course.objects.create(title="Course", description="-")
+        self.topic = Topic.objects.create(course=course, title="Topic", order=1, video_title="Video")
+        self.test = Test.objects.create(topic=self.topic, pass_threshold=1)
+        self.curator = User.objects.create(username="curator1", name="Curator", role="curator")
+        self.other = User.objects.create(username="curator2", name="Other", role="curator")
+        self.student = User.objects.create(username="student1", name="Student", role="student", curator=self.curator)
+        self.stranger = User.objects.create(username="student2", name="Stranger", role="student", curator=self.other)
+        self.url = reverse('curator-progress-stream')
+
+    def pass_test(self, student):
+        with self.captureOnCommitCallbacks(execute=True):
+            record_result(student.id, self.test.id, 3, True)
+
+    def test_stream_requires_curator_and_asgi(self):
+        client = APIClient()
+        self.assertEqual(client.get(self.url).status_code, 401)
+        client.force_login(self.student)
+        self.assertEqual(client.get(self.url).status_code, 403)
+        # Синхронный клиент — это WSGI: бесконечный поток там не отдаётся
+        token = AccessToken.for_user(self.curator)
+        self.assertEqual(
+            APIClient().get(self.url, HTTP_AUTHORIZATION=f"Bearer {token}").status_code, 501
+        )
+
+    def test_stream_accepts_ticket_instead_of_token_in_url(self):
+        ticket_url = reverse('curator-progress-stream-ticket')
+        client = APIClient()
+        client.force_authenticate(self.student)
+        self.assertEqual(client.post(ticket_url).status_code, 403)
+        client.force_authenticate(self.curator)
+        ticket = client.post(ticket_url).data['ticket']
+
+        anonymous = APIClient()
+        self.assertEqual(anonymous.get(self.url, {'ticket': ticket}).status_code, 501)
+        # JWT в адресе больше не принимается, а билет — не токен API
+        token = AccessToken.for_user(self.curator)
+        self.assertEqual(anonymous.get(self.url, {'token': str(token)}).status_code, 401)
+        self.assertEqual(anonymous.get(self.url, {'ticket': str(token)}).status_code, 401)
+        self.assertEqual(
+            anonymous.get(reverse('curator-progress'), HTTP_AUTHORIZATION=f"Bearer {ticket}").status_code, 401
+        )
+        with mock.patch.object(feed, 'TICKET_MAX_AGE', -1):
+            self.assertEqual(anonymous.get(self.url, {'ticket': ticket}).status_code, 401)
+
+    def test_pass_costs_no_queries_when_nobody_watches(self):
+        # INSERT результата и пересчёт сводок пары студент-курс (курс теста,
+        # записи, сводки и savepoint); лента своих запросов не добавляет
+        with self.assertNumQueries(6):
+            self.pass_test(self.student)
+        self.assertFalse(feed.broker.watching())
+
+    async def test_stream_delivers_passes_of_own_students(self):
+        await self.async_client.aforce_login(self.curator)
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b"retry: 3000\n\n")
+
+        await sync_to_async(self.pass_test)(self.stranger)
+        await sync_to_async(self.pass_test)(self.student)
+        chunk = await asyncio.wait_for(anext(stream), 1)
+        lines = chunk.decode().strip().split("\n")
+        self.assertEqual(lines[1], "event: topic_passed")
+        self.assertEqual(json.loads(lines[2][len("data: "):]), {
+            "student_id": self.student.id, "course_id": self.topic.course_id,
+            "topic_id": self.topic.id, "test_id": self.test.id, "score": 3,
+        })
+        await stream.aclose()
+
+    async def test_reconnect_replays_missed_events(self):
+        broker = feed.broker
+        first, backlog = broker.subscribe(self.curator.id)
+        self.assertEqual(backlog, [])
+        broker.publish(self.curator.id, 'topic_passed', {"n": 1})
+        seen = await first.queue.get()
+        broker.unsubscribe(first)
+
+        # Пока клиент переподключается, события продолжают записываться
+        self.assertTrue(broker.watching())
+        broker.publish(self.curator.id, 'topic_passed', {"n": 2})
+        broker.publish(self.curator.id, 'topic_passed', {"n": 3})
+        second, backlog = broker.subscribe(self.curator.id, seen.id)
+        self.assertEqual([event.data["n"] for event in backlog], [2, 3])
+        self.assertEqual(broker.subscribe(self.curator.id, "old-1")[1], [feed.RESYNC])
+
+        # Все ушли дольше, чем на переподключение: старые id недействительны
+        broker.clear()
+        self.assertFalse(broker.watching())
+        self.assertEqual(broker.subscribe(self.curator.id, seen.id)[1], [feed.RESYNC])
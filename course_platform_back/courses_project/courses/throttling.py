@@ -0,0 +1,120 @@
+# courses/throttling.py
+import threading
+import time
+
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'10/min' -> (10, 60): ёмкость корзины и за сколько секунд она наполняется целиком."""
+    num, period = rate.split('/')
+    return int(num), PERIODS[period[0]]
+
+
+class TokenBucketStore:
+    """
+    Корзины токенов в памяти процесса. Каждая корзина хранит число
+    токенов и время последнего пересчёта; пополнение считается лениво при
+    обращении, так что проверка — это словарь и пара арифметических
+    операций под одной блокировкой.
+
+    Хранилище локально для процесса: при нескольких воркерах лимит
+    действует на каждый воркер отдельно.
+    """
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, period, now=None):
+        """
+        Забирает один токен. Возвращает 0, если запрос пропущен, иначе
+        сколько секунд ждать до появления следующего токена.
+        """
+        now = time.monotonic() if now is None else now
+        rate = capacity / period
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / rate
+            # Третье значение — момент, когда корзина снова станет полной
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return wait
+
+    def _prune(self, now):
+        # Полную корзину можно забыть: при следующем обращении она
+        # создастся заново с тем же числом токенов
+        self._buckets = {
+            key: value for key, value in self._buckets.items()
+            if value[2] > now
+        }
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+store = TokenBucketStore()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Лимит по алгоритму token bucket. Ставка берётся из
+    REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'][scope] в формате DRF ('10/min'):
+    до 10 запросов подряд, дальше по одному каждые 6 секунд. При отказе DRF
+    отвечает 429 и ставит Retry-After из wait().
+    """
+    scope = None
+
+    def get_cache_key(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        key = self.get_cache_key(request, view)
+        if rate is None or key is None:
+            return True
+        capacity, period = parse_rate(rate)
+        self._wait = store.take(f'{self.scope}:{key}', capacity, period)
+        return self._wait == 0
+
+    def wait(self):
+        return self._wait
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Корзина на пользователя; для анонимных — на IP."""
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """Корзина на IP-адрес клиента (с учётом NUM_PROXIES)."""
+
+    def get_cache_key(self, request, view):
+        return f'ip:{self.get_ident(request)}'
+
+
+class SubmitTestUserThrottle(UserTokenBucketThrottle):
+    scope = 'submit_test_user'
+
+
+class SubmitTestIPThrottle(IPTokenBucketThrottle):
+    scope = 'submit_test_ip'
+
+
+class RegistrationIPThrottle(IPTokenBucketThrottle):
+    scope = 'registration_ip'
@@ -0,0 +1,79 @@
+# courses/topics.py
+from django.db import transaction
+from django.db.models import Case, Count, F, Max, Min, OuterRef, PositiveIntegerField, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from . import catalogue
+from .models import Course, Topic
+from .signals import topics_reordered
+
+# --------------------------------------
+# Порядок тем курса.
+#
+# order уникален в пределах курса и идёт с шагом Topic.ORDER_GAP. Любая
+# перестановка пишется одним UPDATE (order и ordinal через CASE) в свежий
+# диапазон выше текущего максимума или ниже минимума: новые значения не
+# пересекаются со старыми, поэтому уникальный индекс не срабатывает
+# посреди оператора, как при обмене соседних значений. Перестановки
+# чередуют два диапазона — с нуля и сразу над ним, — так что order не
+# растёт, а шаг ORDER_GAP каждый раз восстанавливается. После правки одной
+# темы ordinal пересчитывается одним UPDATE с коррелированным подзапросом.
+
+
+def sync_ordinals(course_id):
+    """Пересчитывает ordinal тем курса одним UPDATE."""
+    before = Topic.objects.filter(
+        course_id=OuterRef('course_id'), order__lt=OuterRef('order')
+    ).order_by().values('course_id').annotate(n=Count('pk')).values('n')
+    Topic.objects.filter(course_id=course_id).update(ordinal=Coalesce(Subquery(before), 0))
+
+
+def reorder_topics(course_id, topic_ids):
+    """
+    Ставит темы курса в порядке topic_ids (остальные темы — после них, в
+    прежнем порядке) одним UPDATE независимо от числа тем.
+    Возвращает число перенумерованных тем.
+    """
+    with transaction.atomic():
+        current = list(Topic.objects.filter(course_id=course_id).order_by('order').values_list('pk', flat=True))
+        known = set(current)
+        ids = [pk for pk in dict.fromkeys(topic_ids) if pk in known]
+        chosen = set(ids)
+        ids += [pk for pk in current if pk not in chosen]
+        if not ids:
+            return 0
+        bounds = Topic.objects.filter(course_id=course_id).aggregate(first=Min('order'), last=Max('order'))
+        # Новый диапазон — ниже текущего минимума, если помещается, иначе выше
+        # максимума, но не ниже len(ids) * ORDER_GAP: тогда следующая
+        # перестановка уже поместится снизу
+        span = len(ids) * Topic.ORDER_GAP
+        start = 0 if bounds['first'] > span else max(bounds['last'], span)
+        Topic.objects.filter(course_id=course_id).update(
+            order=Case(
+                *[When(pk=pk, then=Value(start + (i + 1) * Topic.ORDER_GAP)) for i, pk in enumerate(ids)],
+                default=F('order'), output_field=PositiveIntegerField(),
+            ),
+            ordinal=Case(
+                *[When(pk=pk, then=Value(i)) for i, pk in enumerate(ids)],
+                default=F('ordinal'), output_field=PositiveIntegerField(),
+            ),
+        )
+    topics_reordered.send(sender=Topic, course_id=course_id)
+    return len(ids)
+
+
+def refresh_course_totals(course_ids):
+    """
+    Пересчитывает Course.topic_count и total_minutes одним UPDATE с
+    подзапросами. Темы без длительности в сумму не входят.
+    """
+    course_ids = list(course_ids)
+    if not course_ids:
+        return
+    topics = Topic.objects.filter(course_id=OuterRef('pk')).order_by().values('course_id')
+    Course.objects.filter(pk__in=course_ids).update(
+        topic_count=Coalesce(Subquery(topics.annotate(n=Count('pk')).values('n')), 0),
+        total_minutes=Coalesce(Subquery(topics.annotate(m=Sum('duration_in_minutes')).values('m')), 0),
+    )
+    # update() минует post_save курса — каталог сбрасываем сами
+    catalogue.invalidate()
@@ -1,5 +1,6 @@
 # courses/urls.py
 from django.urls import path
+from .feed import progress_stream
 from .views import (
     CourseListView,
     MyCoursesListView,
@@ -7,7 +8,10 @@ from .views import (
     TopicDetailView,
     SubmitTestView,
     CuratorStudentsProgressView, CourseFirstTopicView, CurrentUserView, CourseDetailView, RegistrationView,
-    TodayRegistrationsView,
+    TodayRegistrationsView, BulkEnrollmentView, TestAttemptsView, TestAnswerDistributionView,
+    TestItemAnalyticsView, EnrollmentBulkActionView, UserImportView, CuratorDashboardView,
+    CourseCatalogueView, CourseImportView, CourseExportView,
+    CourseCloneView, StreamTicketView,
 )
 
 urlpatterns = [
@@ -17,6 +21,7 @@ urlpatterns = [
     # Публичные
     path('register/', RegistrationView.as_view(), name='register'),
     path('public-courses/', CourseListView.as_view(), name='public-courses'),
+    path('public-courses/search/', CourseCatalogueView.as_view(), name='public-courses-search'),
     path('public-courses/<int:course_id>/first-topic/', CourseFirstTopicView.as_view(), name='course-first-topic'),
     path('public-courses/<int:course_id>/', CourseDetailView.as_view(), name='course-detail'),
     # path('topics/<int:topic_id>/check-test/', CheckTestView.as_view(), name='topic-check-test'),
@@ -28,10 +33,25 @@ urlpatterns = [
     path('my-courses/<int:course_id>/topics/', CourseTopicsView.as_view(), name='course-topics'),
     path('topics/<int:topic_id>/', TopicDetailView.as_view(), name='topic-detail'),
     path('topics/<int:topic_id>/submit-test/', SubmitTestView.as_view(), name='topic-submit-test'),
+    path('topics/<int:topic_id>/attempts/', TestAttemptsView.as_view(), name='topic-attempts'),
 
     # Для кураторов
     path('curator/progress/', CuratorStudentsProgressView.as_view(), name='curator-progress'),
+    path('curator/progress/stream/', progress_stream, name='curator-progress-stream'),
+    path('curator/progress/stream/ticket/', StreamTicketView.as_view(), name='curator-progress-stream-ticket'),
+    path('curator/dashboard/', CuratorDashboardView.as_view(), name='curator-dashboard'),
+    path('topics/<int:topic_id>/answer-distribution/', TestAnswerDistributionView.as_view(),
+         name='topic-answer-distribution'),
+    path('topics/<int:topic_id>/item-analytics/', TestItemAnalyticsView.as_view(), name='topic-item-analytics'),
 
     # Для продавцов
     path('seller/today-registrations/', TodayRegistrationsView.as_view(), name='today-registrations'),
+
+    # Для администраторов
+    path('enrollments/bulk/', BulkEnrollmentView.as_view(), name='enrollments-bulk'),
+    path('enrollments/bulk-action/', EnrollmentBulkActionView.as_view(), name='enrollments-bulk-action'),
+    path('users/import/', UserImportView.as_view(), name='users-import'),
+    path('courses/import/', CourseImportView.as_view(), name='course-import'),
+    path('courses/<int:course_id>/export/', CourseExportView.as_view(), name='course-export'),
+    path('courses/<int:course_id>/clone/', CourseCloneView.as_view(), name='course-clone'),
 ]
@@ -0,0 +1,155 @@
+# courses/videos.py
+import json
+import logging
+import math
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+from urllib.parse import urlencode, urlsplit
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .compression import invalidate_topic_body
+from .models import Topic
+from .topics import refresh_course_totals
+
+logger = logging.getLogger(__name__)
+
+# --------------------------------------
+# Метаданные видео тем.
+#
+# Название и длительность берутся у провайдера (VIDEO_METADATA_PROVIDER):
+# класс с методом fetch(url) -> VideoMetadata или None. enrich_topics
+# обходит темы пачками, запрашивает уникальные ссылки пачки в пуле потоков
+# не больше чем из workers соединений и пишет результат одним
+# bulk_update на пачку, после чего пересчитывает итоги затронутых курсов.
+
+VideoMetadata = namedtuple('VideoMetadata', ['title', 'duration_seconds'])
+
+BATCH_SIZE = 50
+WORKERS = 4
+TIMEOUT = 10
+
+
+class VideoMetadataError(Exception):
+    pass
+
+
+class StubProvider:
+    """
+    Локальный провайдер без сети: VIDEO_METADATA_STUB = {url: {"title": ..., "duration": секунды}}.
+    Для тестов и окружений без доступа наружу.
+    """
+
+    def __init__(self, catalog=None):
+        self.catalog = getattr(settings, 'VIDEO_METADATA_STUB', {}) if catalog is None else catalog
+
+    def fetch(self, url):
+        entry = self.catalog.get(url)
+        if entry is None:
+            return None
+        return VideoMetadata(entry.get('title') or '', entry.get('duration'))
+
+
+class OEmbedProvider:
+    """
+    oEmbed видеохостингов. Vimeo отдаёт длительность (duration), YouTube —
+    только название; длительность тогда остаётся пустой.
+    """
+    ENDPOINTS = {
+        'youtube.com': 'https://www.youtube.com/oembed',
+        'youtu.be': 'https://www.youtube.com/oembed',
+        'vimeo.com': 'https://vimeo.com/api/oembed.json',
+    }
+
+    def __init__(self, timeout=TIMEOUT):
+        self.timeout = timeout
+
+    def endpoint(self, url):
+        host = (urlsplit(url).hostname or '').lower()
+        for domain, endpoint in self.ENDPOINTS.items():
+            if host == domain or host.endswith('.' + domain):
+                return endpoint
+        return None
+
+    def fetch(self, url):
+        endpoint = self.endpoint(url)
+        if endpoint is None:
+            return None
+        request = Request(f"{endpoint}?{urlencode({'url': url, 'format': 'json'})}",
+                          headers={'User-Agent': 'courses-video-metadata'})
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                data = json.load(response)
+        except (URLError, OSError, ValueError) as exc:
+            raise VideoMetadataError(f"{url}: {exc}")
+        duration = data.get('duration')
+        return VideoMetadata(data.get('title') or '', int(duration) if duration else None)
+
+
+def get_provider():
+    return import_string(getattr(settings, 'VIDEO_METADATA_PROVIDER', 'courses.videos.OEmbedProvider'))()
+
+
+def _fetch(provider, url):
+    try:
+        return provider.fetch(url)
+    except VideoMetadataError as exc:
+        logger.warning(f"Video metadata unavailable: {exc}")
+        return None
+
+
+def enrich_topics(queryset=None, overwrite=False, provider=None, batch_size=BATCH_SIZE, workers=WORKERS):
+    """
+    Заполняет video_title и duration_in_minutes тем по ссылке на видео.
+    Без overwrite трогает только пустые поля. Возвращает
+    {"checked": ..., "updated": ..., "failed": ...}.
+    """
+    provider = provider or get_provider()
+    topics = (queryset if queryset is not None else Topic.objects.all()).exclude(video_url__isnull=True)
+    topics = topics.exclude(video_url='')
+    if not overwrite:
+        topics = topics.filter(Q(duration_in_minutes__isnull=True) | Q(video_title=''))
+    ids = list(topics.order_by('pk').values_list('pk', flat=True))
+
+    stats = {"checked": 0, "updated": 0, "failed": 0}
+    courses = set()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for start in range(0, len(ids), batch_size):
+            batch = list(Topic.objects.filter(pk__in=ids[start:start + batch_size]).only(
+                'id', 'course_id', 'video_url', 'video_title', 'duration_in_minutes', 'content_version'
+            ))
+            _enrich_batch(batch, pool, provider, overwrite, stats, courses)
+    refresh_course_totals(courses)
+    return stats
+
+
+def _enrich_batch(batch, pool, provider, overwrite, stats, courses):
+    urls = list({topic.video_url for topic in batch})
+    metadata = dict(zip(urls, pool.map(lambda url: _fetch(provider, url), urls)))
+    changed = []
+    for topic in batch:
+        stats["checked"] += 1
+        meta = metadata[topic.video_url]
+        if meta is None:
+            stats["failed"] += 1
+            continue
+        before = (topic.video_title, topic.duration_in_minutes)
+        if meta.title and (overwrite or not topic.video_title):
+            topic.video_title = meta.title[:Topic._meta.get_field('video_title').max_length]
+        if meta.duration_seconds and (overwrite or topic.duration_in_minutes is None):
+            topic.duration_in_minutes = math.ceil(meta.duration_seconds / 60)
+        if (topic.video_title, topic.duration_in_minutes) != before:
+            topic.content_version += 1
+            changed.append(topic)
+            courses.add(topic.course_id)
+    # bulk_update минует save() и receivers: версии тем растут здесь же (по ним
+    # готовые тела устаревают во всех процессах), свой кэш сбрасываем сразу,
+    # итоги курсов пересчитываются в конце
+    Topic.objects.bulk_update(changed, ['video_title', 'duration_in_minutes', 'content_version'])
+    for topic in changed:
+        invalidate_topic_body(topic.pk)
+    stats["updated"] += len(changed)
@@ -1,15 +1,57 @@
 # courses/views.py
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.utils.timezone import now
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import localtime
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from .models import Course, Topic, Enrollment, UserTestResult, Test, Answer, Question, Registration
-from .serializers import CourseSerializer, TopicSerializer, TestSerializer, RegistrationSerializer
+from .models import (
+    Course, Topic, UserTestResult, Test, Registration, StudentCourseProgress,
+)
+from .serializers import (
+    CourseSerializer, TopicSerializer, TestSerializer, RegistrationSerializer, BulkEnrollmentSerializer,
+    UserImportSerializer, EnrollmentBulkActionSerializer, CourseBundleSerializer,
+    CourseCloneSerializer,
+)
+from .enrollments import (
+    bulk_enroll, summarize, refresh_enrollments, delete_enrollments,
+    get_access, ACCESS_NONE, ACCESS_EXPIRED,
+)
+from . import provisioning
+from . import catalogue
+from .compression import cached_body, body_response, topic_body_key
+from .bundles import BundleError, import_bundle, stream_bundle
+from .cloning import clone_course
+from .attempts import log_attempt, attempt_history, answer_distribution
+from . import item_stats
+from . import feed
+from .scoring import get_answer_key
+from .pools import attempt_number, draw_question_ids, draw_test
+from .progress import curator_dashboard
+from .results import record_result, claim_submission, remember_submission, release_submission, IN_PROGRESS
+from .throttling import SubmitTestUserThrottle, SubmitTestIPThrottle, RegistrationIPThrottle
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def enrollment_error(user, course_id):
+    """Ответ 403, если у пользователя нет действующей записи на курс, иначе None."""
+    access = get_access(user.id, course_id)
+    if access == ACCESS_NONE:
+        return Response({"detail": "Вы не записаны на этот курс."},
+                        status=status.HTTP_403_FORBIDDEN)
+    if access == ACCESS_EXPIRED:
+        return Response({"detail": "Срок доступа к курсу истёк."},
+                        status=status.HTTP_403_FORBIDDEN)
+    return None
+
 # --------------------------------------
 
 
@@ -17,9 +59,32 @@ class CourseListView(APIView):
     permission_classes = [permissions.AllowAny]
     logger.info("Course list requested")
     def get(self, request):
-        courses = Course.objects.all()
-        serializer = CourseSerializer(courses, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        # Тело вместе со сжатыми вариантами живёт в кэше до изменения любого курса
+        body = cached_body(
+            f'course-list:{catalogue.current_version()}',
+            lambda: CourseSerializer(Course.objects.all(), many=True).data,
+        )
+        return body_response(body)
+
+
+class CourseCatalogueView(APIView):
+    """
+    Поиск по каталогу: ?q=слова&course_type=...&sub_type=...&ordering=title|-title|id|-id.
+    Отвечает из индекса в памяти (courses.catalogue), вместе со счётчиками фасетов.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        ordering = request.query_params.get('ordering', 'title')
+        if ordering not in catalogue.ORDERINGS:
+            return Response({"detail": f"Сортировка возможна по: {', '.join(catalogue.ORDERINGS)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        data = catalogue.get_index().search(
+            query=request.query_params.get('q', ''),
+            filters={facet: request.query_params.get(facet) for facet in catalogue.FACETS},
+            ordering=ordering,
+        )
+        return Response(data, status=status.HTTP_200_OK)
 
 
 class CourseDetailView(APIView):
@@ -42,7 +107,7 @@ class MyCoursesListView(APIView):
         # Для студентов: список курсов, где он заэнроллен
         # Для кураторов: можно возвращать пустой или по желанию - все курсы, которые ведут его студенты
         if user.role == 'student':
-            enrollments = user.enrollment_set.select_related('course')
+            enrollments = user.enrollment_set.active().select_related('course')
             courses = [en.course for en in enrollments]
         else:
             courses = []
@@ -60,14 +125,17 @@ class CourseTopicsView(APIView):
     def get(self, request, course_id):
         user = request.user
 
-        # 1. Проверяем, что user зачислен на курс
-        enrolled = user.enrollment_set.filter(course_id=course_id).exists()
-        if not enrolled:
-            return Response({"detail": "Вы не записаны на этот курс."},
-                            status=status.HTTP_403_FORBIDDEN)
+        # 1. Проверяем, что user зачислен на курс и срок доступа не истёк
+        error = enrollment_error(user, course_id)
+        if error:
+            return error
 
         # 2. Получаем все темы данного курса, отсортированные по order
-        topics = Topic.objects.filter(course_id=course_id).order_by('order')
+        topics = Topic.objects.filter(course_id=course_id).select_related('test').order_by('order')
+        # Пройденные тесты курса — одним запросом, а не по запросу на тему
+        passed_tests = set(UserTestResult.objects.filter(
+            user=user, passed=True, test__topic__course_id=course_id
+        ).values_list('test_id', flat=True))
 
         # 3. Для каждой темы определяем is_unlocked
         unlocked_topic_ids = set()
@@ -88,11 +156,8 @@ class CourseTopicsView(APIView):
             # Если у темы есть тест, проверим проходил ли пользователь его
             test_id = topic_test_map.get(topic.id)
             if test_id:
-                user_result = UserTestResult.objects.filter(
-                    user=user, test_id=test_id, passed=True
-                ).exists()
                 # passed_previous станет True только если есть запись о passed=True
-                passed_previous = user_result
+                passed_previous = test_id in passed_tests
             else:
                 # Если теста нет, то автоматически считаем её пройденной
                 passed_previous = True
@@ -140,31 +205,21 @@ class CourseFirstTopicView(APIView):
             return Response({"detail": "Курс не найден."},
                             status=status.HTTP_404_NOT_FOUND)
 
-        # 2. Получаем все темы, отсортированные по order
-        topics_qs = Topic.objects.filter(course=course).order_by('order')
-        if not topics_qs.exists():
+        # 2. Первая тема — одна выборка по уникальному индексу (course, order)
+        first_topic = Topic.objects.filter(course=course).order_by('order').first()
+        if first_topic is None:
             return Response({"detail": "В курсе нет тем."},
                             status=status.HTTP_404_NOT_FOUND)
 
-        # 3. Сериализуем все темы
-        serializer = TopicSerializer(topics_qs, many=True)
-        data = serializer.data  # это список словарей
-
-        # 4. Обрабатываем так, что "первая" тема остаётся полной,
-        #    а все остальные темы — "сокращённые" (закрытые).
-        for i, topic_item in enumerate(data):
-            if i == 0:
-                # Первая тема (индекс 0): оставляем все поля
-                topic_item['is_unlocked'] = True
-            else:
-                # Остальные темы: "урезаем" поля
-                locked_data = {
-                    'id': topic_item['id'],
-                    'title': topic_item['title'],
-                    'duration_in_minutes': topic_item.get('duration_in_minutes'),
-                    'is_unlocked': False
-                }
-                data[i] = locked_data
+        # 3. Первая тема остаётся полной, а все остальные — "сокращённые"
+        #    (закрытые): для них достаточно трёх полей, без сериализатора
+        first_data = TopicSerializer(first_topic).data
+        first_data['is_unlocked'] = True
+        data = [first_data]
+        for topic_item in Topic.objects.filter(course=course, order__gt=first_topic.order).order_by('order').values(
+            'id', 'title', 'duration_in_minutes'
+        ):
+            data.append({**topic_item, 'is_unlocked': False})
 
         return Response(data, status=status.HTTP_200_OK)
 
@@ -186,35 +241,20 @@ class TopicDetailView(APIView):
                             status=status.HTTP_404_NOT_FOUND)
 
         # Проверяем, что пользователь зачислен на курс
-        enrolled = user.enrollment_set.filter(course=topic.course).exists()
-        if not enrolled:
-            return Response({"detail": "Вы не записаны на этот курс."},
-                            status=status.HTTP_403_FORBIDDEN)
-
-        # Проверяем, разблокирована ли тема
-        # Логика та же, что в CourseTopicsView, но можно вынести в отдельную функцию
-        # или переиспользовать. Здесь, для краткости, сделаем “упрощённую” проверку:
-        topics = Topic.objects.filter(course=topic.course).order_by('order')
-        # собираем их в список, чтобы понять, какие прошёл пользователь
-        passed_previous = True
-        unlocked_topic_ids = set()
-        topic_test_map = {t.id: t.test.id for t in topics if hasattr(t, 'test')}
-
-        for t in topics:
-            if passed_previous:
-                unlocked_topic_ids.add(t.id)
-            else:
-                break
-            test_id = topic_test_map.get(t.id)
-            if test_id:
-                user_result = UserTestResult.objects.filter(
-                    user=user, test_id=test_id, passed=True
-                ).exists()
-                passed_previous = user_result
-            else:
-                passed_previous = True
-
-        if topic_id not in unlocked_topic_ids:
+        error = enrollment_error(user, topic.course_id)
+        if error:
+            return error
+
+        # Проверяем, разблокирована ли тема: та же логика, что в CourseTopicsView —
+        # тема открыта, если пройдены тесты всех предыдущих тем. Один запрос
+        # по индексу (course, order) вместо обхода всех тем курса
+        locked = Test.objects.filter(
+            topic__course_id=topic.course_id, topic__order__lt=topic.order
+        ).filter(
+            ~Exists(UserTestResult.objects.filter(user=user, test=OuterRef('pk'), passed=True))
+        ).exists()
+
+        if locked:
             return Response({"detail": "Тема ещё не разблокирована."},
                             status=status.HTTP_403_FORBIDDEN)
 
@@ -228,12 +268,18 @@ class TopicDetailView(APIView):
             "duration_in_minutes": topic.duration_in_minutes,
         }
 
-        if hasattr(topic, 'test'):
-            test_serializer = TestSerializer(topic.test)
-            topic_data["test"] = test_serializer.data
-        else:
-            topic_data["test"] = None
+        def shared_data():
+            # Без пула тема одинакова для всех студентов — тело кэшируется целиком
+            if hasattr(topic, 'test') and topic.test.is_randomized:
+                return None
+            return dict(topic_data, test=TestSerializer(topic.test).data if hasattr(topic, 'test') else None)
+
+        body = cached_body(topic_body_key(topic.id), shared_data, version=topic.content_version)
+        if body is not None:
+            return body_response(body)
 
+        # Режим пула: набор вопросов и порядок ответов зависят от номера попытки
+        topic_data["test"] = draw_test(topic.test, user.id, attempt_number(user.id, topic.test.id))
         return Response(topic_data, status=status.HTTP_200_OK)
 
 
@@ -243,6 +289,7 @@ class TopicDetailView(APIView):
 
 class SubmitTestView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [SubmitTestUserThrottle, SubmitTestIPThrottle]
 
     def post(self, request, topic_id):
         user = request.user
@@ -257,10 +304,9 @@ class SubmitTestView(APIView):
                             status=status.HTTP_404_NOT_FOUND)
 
         # Проверяем, что пользователь зачислен
-        enrolled = user.enrollment_set.filter(course=topic.course).exists()
-        if not enrolled:
-            return Response({"detail": "Вы не записаны на этот курс."},
-                            status=status.HTTP_403_FORBIDDEN)
+        error = enrollment_error(user, topic.course_id)
+        if error:
+            return error
 
         # Получаем ответы
         user_answers = request.data.get('answers', [])
@@ -269,77 +315,116 @@ class SubmitTestView(APIView):
             return Response({"detail": "Необходимо указать ответы."},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        score = 0
-        answers_detail = []  # Тут будем хранить {question_id, answered_correctly}
+        # Повтор с тем же Idempotency-Key получает сохранённый ответ
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if idempotency_key:
+            claimed, previous = claim_submission(user.id, topic_id, idempotency_key)
+            if not claimed:
+                if previous == IN_PROGRESS:
+                    return Response({"detail": "Эта попытка уже обрабатывается."},
+                                    status=status.HTTP_409_CONFLICT)
+                return Response(previous, status=status.HTTP_200_OK)
 
-        # Сопоставляем ответы с базой
-        for ua in user_answers:
-            q_id = ua.get('question_id')
-            a_id = ua.get('answer_id')
+        try:
+            # Ключ теста (верные ответы, веса, порог) берётся из кэша —
+            # проверка идёт в памяти без запросов к базе
+            answer_key = get_answer_key(test)
+            question_ids = answer_key.question_ids
+            if test.pool_size:
+                # Тот же набор, что выдал TopicDetailView: попытка ещё не записана,
+                # значит номер совпадает
+                question_ids = draw_question_ids(
+                    test, user.id, attempt_number(user.id, test.id), question_ids
+                )
+            grade = answer_key.grade(user_answers, question_ids=question_ids)
+            logger.info(f"User {user.id} scored {grade.score}, passed: {grade.passed}")
+            # Лучший балл и passed сливаются в базе одним upsert — без гонок
+            # между параллельными отправками
+            record_result(user.id, test.id, grade.score, grade.passed)
+            log_attempt(user.id, test.id, grade.score, grade.passed, grade.chosen)
+            item_stats.buffer.record(
+                shown_question_ids=question_ids,
+                correct_question_ids=grade.correct_question_ids,
+                chosen_answer_ids=[a_id for _, a_id in grade.chosen],
+            )
+        except Exception:
+            if idempotency_key:
+                release_submission(user.id, topic_id, idempotency_key)
+            raise
 
-            # Ищем вопрос
-            try:
-                question = test.questions.get(id=q_id)
-            except Question.DoesNotExist:
-                # Если вопрос не найден, можем добавить запись, что он “неверный”
-                answers_detail.append({
-                    "question_id": q_id,
-                    "answered_correctly": False,
-                })
-                continue
+        data = {
+            "score": grade.score,
+            "max_score": grade.max_score,
+            "passed": grade.passed,
+            "answers_detail": grade.details,  # <-- тут детальная инфа по каждому вопросу
+        }
+        if idempotency_key:
+            remember_submission(user.id, topic_id, idempotency_key, data)
+        return Response(data, status=status.HTTP_200_OK)
+
+
+
+class TestAttemptsView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
 
-            # Ищем ответ
+    def get(self, request, topic_id):
+        user = request.user
+        test = Test.objects.filter(topic_id=topic_id).first()
+        if test is None:
+            return Response({"detail": "Тест для данной темы не найден."},
+                            status=status.HTTP_404_NOT_FOUND)
+
+        # Студент видит свои попытки, куратор — попытки своих студентов
+        student_id = request.query_params.get('student_id')
+        if student_id is None:
+            student_id = user.id
+        else:
             try:
-                answer = question.answers.get(id=a_id)
-            except Answer.DoesNotExist:
-                # Аналогично, если не нашли ответ
-                answers_detail.append({
-                    "question_id": q_id,
-                    "answered_correctly": False,
-                })
-                continue
+                student_id = int(student_id)
+            except ValueError:
+                return Response({"detail": "student_id должен быть целым числом."},
+                                status=status.HTTP_400_BAD_REQUEST)
+            if not (user.is_staff or user.students.filter(id=student_id).exists()):
+                return Response({"detail": "Студент не найден среди ваших студентов."},
+                                status=status.HTTP_403_FORBIDDEN)
 
-            # Проверяем, правильный ли ответ
-            answered_correctly = answer.is_correct
-            if answered_correctly:
-                score += 1
+        return Response(attempt_history(student_id, test.id), status=status.HTTP_200_OK)
 
-            answers_detail.append({
-                "question_id": q_id,
-                "answered_correctly": answered_correctly,
-            })
 
-        passed = (score >= 9)
-        logger.info(f"User {user.id} scored {score}, passed: {passed}")
-        # Проверяем, есть ли у пользователя старая запись (UserTestResult)
-        # Если да – не затираем, а только обновляем, если новая попытка лучше
-        utr, created = UserTestResult.objects.get_or_create(
-            user=user,
-            test=test,
-            defaults={'score': score, 'passed': passed}
-        )
-        if not created:
-            # если запись уже была, сравниваем
-            if passed and not utr.passed:
-                # если ранее был не пройден, а теперь пройден – обновляем
-                utr.score = score
-                utr.passed = True
-                utr.save()
-            else:
-                # если уже был пройден (passed=True), то ничего не меняем
-                # или если у нас сейчас неудачная попытка, но раньше было passed=True, то оставляем как есть
-                if score > utr.score:
-                    utr.score = score
-                    utr.save()
+class TestAnswerDistributionView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
 
-        data = {
-            "score": score,
-            "passed": passed,
-            "answers_detail": answers_detail,  # <-- тут детальная инфа по каждому вопросу
-        }
+    def get(self, request, topic_id):
+        user = request.user
+        if not (user.is_staff or user.role == 'curator'):
+            return Response({"detail": "Доступно только кураторам."},
+                            status=status.HTTP_403_FORBIDDEN)
+        test = Test.objects.filter(topic_id=topic_id).first()
+        if test is None:
+            return Response({"detail": "Тест для данной темы не найден."},
+                            status=status.HTTP_404_NOT_FOUND)
+
+        params = request.query_params
+        since = parse_datetime(params['since']) if params.get('since') else None
+        until = parse_datetime(params['until']) if params.get('until') else None
+        data = answer_distribution(test.id, since=since, until=until)
         return Response(data, status=status.HTTP_200_OK)
 
 
+class TestItemAnalyticsView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, topic_id):
+        user = request.user
+        if not (user.is_staff or user.role == 'curator'):
+            return Response({"detail": "Доступно только кураторам."},
+                            status=status.HTTP_403_FORBIDDEN)
+        test = Test.objects.filter(topic_id=topic_id).first()
+        if test is None:
+            return Response({"detail": "Тест для данной темы не найден."},
+                            status=status.HTTP_404_NOT_FOUND)
+        return Response(item_stats.item_analytics(test.id), status=status.HTTP_200_OK)
+
 
 # class CheckTestView(APIView):
 #     permission_classes = [permissions.AllowAny]  # или IsAuthenticated, если нужно
@@ -421,50 +506,53 @@ class CuratorStudentsProgressView(APIView):
             return Response({"detail": "Доступно только кураторам."},
                             status=status.HTTP_403_FORBIDDEN)
 
-        students = user.students.all()  # related_name='students' у поля curator
-        data_out = []
-
-        for student in students:
-            # Список курсов, на которые записан данный студент
-            enrollments = student.enrollment_set.select_related('course')
-            courses_progress = []
-
-            for en in enrollments:
-                course = en.course
-                # Общее число тем
-                topics = course.topics.all()
-                total_topics = topics.count()
-
-                # Считаем, сколько тем прошло = количество тестов, где passed=True
-                # но нужно понимать, что если у темы нет теста, считаем её автоматически пройденной
-                total_passed = 0
-                for t in topics:
-                    if hasattr(t, 'test'):
-                        # проверяем UserTestResult
-                        if UserTestResult.objects.filter(user=student, test=t.test, passed=True).exists():
-                            total_passed += 1
-                        else:
-                            break
-                    else:
-                        # если у темы нет теста, считаем пройденной
-                        total_passed += 1
-
-                courses_progress.append({
-                    "course_id": course.id,
-                    "course_title": course.title,
-                    "passed_topics": total_passed,
-                    "total_topics": total_topics,
-                })
-
-            data_out.append({
-                "student_id": student.id,
-                "student_name": student.name,
-                "courses": courses_progress
+        # Прогресс берётся из StudentCourseProgress (обновляется в courses.progress),
+        # а не пересчитывается по темам и результатам каждого студента
+        courses_by_student = defaultdict(list)
+        rows = StudentCourseProgress.objects.filter(user__curator=user).select_related('course').order_by('id')
+        for row in rows:
+            courses_by_student[row.user_id].append({
+                "course_id": row.course_id,
+                "course_title": row.course.title,
+                "passed_topics": row.passed_topics,
+                "total_topics": row.total_topics,
             })
 
+        data_out = [
+            {
+                "student_id": student_id,
+                "student_name": student_name,
+                "courses": courses_by_student.get(student_id, []),
+            }
+            for student_id, student_name in user.students.order_by('id').values_list('id', 'name')
+        ]
+
         return Response(data_out, status=status.HTTP_200_OK)
 
 
+class StreamTicketView(APIView):
+    """Билет для curator/progress/stream/ (см. courses.feed)."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        if request.user.role != 'curator':
+            return Response({"detail": "Доступно только кураторам."},
+                            status=status.HTTP_403_FORBIDDEN)
+        data = {"ticket": feed.issue_ticket(request.user), "expires_in": feed.TICKET_MAX_AGE}
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class CuratorDashboardView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+        if user.role != 'curator':
+            return Response({"detail": "Доступно только кураторам."},
+                            status=status.HTTP_403_FORBIDDEN)
+        return Response(curator_dashboard(user), status=status.HTTP_200_OK)
+
+
 # --------------------------------------
 
 
@@ -491,6 +579,8 @@ class CurrentUserView(APIView):
 
 class RegistrationView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [RegistrationIPThrottle]
+
     def post(self, request):
         logger.info(f"Registration attempt with data: {request.data}")
         serializer = RegistrationSerializer(data=request.data)
@@ -502,7 +592,110 @@ class RegistrationView(APIView):
 
 class TodayRegistrationsView(APIView):
     def get(self, request):
-        today = now().date()
-        registrations = Registration.objects.filter(created_at__date=today)
+        # Диапазон по created_at, а не created_at__date: так работает индекс
+        today_start = localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        registrations = Registration.objects.filter(
+            created_at__gte=today_start, created_at__lt=today_start + timedelta(days=1)
+        )
         serializer = RegistrationSerializer(registrations, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+# --------------------------------------
+
+
+class BulkEnrollmentView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        serializer = BulkEnrollmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        course = serializer.validated_data['course']
+        usernames = serializer.validated_data['usernames']
+        logger.info(f"User {request.user.id} bulk-enrolls {len(usernames)} users to course {course.id}")
+
+        results = bulk_enroll(course, usernames)
+        data = {
+            "course_id": course.id,
+            "summary": summarize(results),
+            "results": results,
+        }
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class EnrollmentBulkActionView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        serializer = EnrollmentBulkActionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        action = serializer.validated_data['action']
+        queryset = serializer.get_queryset()
+
+        if action == 'refresh':
+            affected = refresh_enrollments(queryset)
+        else:
+            affected = delete_enrollments(queryset)
+        logger.info(f"User {request.user.id} bulk {action}: {affected} enrollments")
+        return Response({"action": action, "affected": affected}, status=status.HTTP_200_OK)
+
+
+class UserImportView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        serializer = UserImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        rows = serializer.validated_data['rows']
+        logger.info(f"User {request.user.id} imports {len(rows)} users")
+
+        results = provisioning.import_users(rows, workers=settings.USER_IMPORT_WORKERS)
+        data = {
+            "summary": provisioning.summarize(results),
+            "results": results,
+        }
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class CourseImportView(APIView):
+    """Создаёт курс со всеми темами и тестами из пакета (courses.bundles): JSON в bundle или файл .json/.yaml."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        serializer = CourseBundleSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            course = import_bundle(serializer.validated_data['bundle'])
+        except BundleError as exc:
+            return Response({"detail": str(exc), "errors": exc.errors}, status=status.HTTP_400_BAD_REQUEST)
+        logger.info(f"User {request.user.id} imported course {course.id}")
+        return Response({"course_id": course.id, "title": course.title}, status=status.HTTP_201_CREATED)
+
+
+class CourseExportView(APIView):
+    """Пакет курса потоком, по теме за раз: ?as=json (по умолчанию) или yaml."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, course_id):
+        course = get_object_or_404(Course, id=course_id)
+        # format занят под согласование формата в DRF
+        fmt = request.query_params.get('as', 'json')
+        if fmt not in ('json', 'yaml'):
+            return Response({"detail": "Формат пакета: json или yaml."}, status=status.HTTP_400_BAD_REQUEST)
+        content_type = 'application/yaml' if fmt == 'yaml' else 'application/json'
+        response = StreamingHttpResponse(stream_bundle(course, fmt), content_type=f'{content_type}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="course-{course.id}.{fmt}"'
+        return response
+
+
+class CourseCloneView(APIView):
+    """Копия курса со всеми темами и тестами; в теле можно задать title, course_type, sub_type, link_files."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request, course_id):
+        course = get_object_or_404(Course, id=course_id)
+        serializer = CourseCloneSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        copy = clone_course(course, **serializer.validated_data)
+        logger.info(f"User {request.user.id} cloned course {course.id} into {copy.id}")
+        return Response(CourseSerializer(copy).data, status=status.HTTP_201_CREATED)
@@ -3,6 +3,11 @@ ASGI config for courses_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Живая лента кураторов (courses.feed, curator/progress/stream/) работает
+только здесь и держит брокер событий в памяти процесса: API обслуживается
+одним процессом ASGI, например
+``uvicorn courses_project.asgi:application --workers 1``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -60,6 +60,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Сжатие gzip/brotli (courses.compression) — до всех, кто читает тело ответа
+    'courses.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -77,6 +79,7 @@ CORS_ALLOW_HEADERS = [
     'content-type',
     'authorization',
     'Retry-After',
+    'Idempotency-Key',
 ]
 
 CORS_EXPOSE_HEADERS = [
@@ -160,6 +163,31 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
+STORAGES = {
+    # Имена загружаемых файлов с хэшем содержимого (courses.media)
+    'default': {'BACKEND': 'courses.media.HashedMediaStorage'},
+    # Хэшированные имена и сжатые .gz/.br при collectstatic (courses.staticfiles)
+    'staticfiles': {'BACKEND': 'courses.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+
+# Отдача медиа и статики (courses.media, courses.staticfiles): 'django' — сам Django с Range,
+# 'x-accel' — через nginx (internal location MEDIA_ACCEL_PREFIX с alias на
+# MEDIA_ROOT и STATIC_ACCEL_PREFIX на STATIC_ROOT), 'x-sendfile' — Apache mod_xsendfile / lighttpd
+MEDIA_SERVE_MODE = 'django'
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+STATIC_ACCEL_PREFIX = '/protected-static/'
+# Файлы только для вошедших пользователей (пути относительно MEDIA_ROOT);
+# django-summernote/ — вложения из редактора вопросов и ответов
+MEDIA_PROTECTED_PREFIXES = ('django-summernote/',)
+# Сколько кэшируются файлы без хэша в имени; с хэшем — год, immutable
+MEDIA_CACHE_SECONDS = 60 * 60
+
+# Откуда брать название и длительность видео тем (courses.videos):
+# OEmbedProvider — oEmbed YouTube/Vimeo, StubProvider — словарь VIDEO_METADATA_STUB
+VIDEO_METADATA_PROVIDER = 'courses.videos.OEmbedProvider'
+
+# Куда ведут картинки в тексте вопросов и ответов (courses.richtext), например CDN
+RICHTEXT_MEDIA_URL = MEDIA_URL
 
 SUMMERNOTE_CONFIG = {
     'iframe': True,  # Использовать iframe для изоляции стилей
@@ -193,7 +221,13 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
-    )
+    ),
+    # Ставки для courses.throttling (token bucket): ёмкость/период
+    'DEFAULT_THROTTLE_RATES': {
+        'submit_test_user': '10/min',
+        'submit_test_ip': '120/min',
+        'registration_ip': '20/min',
+    },
 }
 
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 4000
@@ -233,4 +267,36 @@ LOGGING = {
 }
 
 
+# CACHES не задан: кэш по умолчанию (LocMem) у каждого процесса свой, и
+# cache.delete не доходит до других процессов — веб-воркеров, команд
+# (enrich_videos, import_course) и run_tasks. Поэтому всё, что держится в
+# кэше долго (ключи и пулы тестов, тела тем, каталог и список курсов),
+# сверяется с версией в базе: Test.content_version, Topic.content_version,
+# CacheVersion. Короткоживущие записи (срок записи на курс, ответы по
+# Idempotency-Key) при нескольких процессах требуют общего кэша (Redis,
+# Memcached) в CACHES.
+
+# Сколько секунд кэшируется срок записи пользователя на курс
+ENROLLMENT_ACCESS_CACHE_TIMEOUT = 60
+
+# Сколько секунд хранится ответ на отправку теста по Idempotency-Key
+SUBMISSION_IDEMPOTENCY_TIMEOUT = 60 * 60 * 24
+
+# Как часто (в секундах) накопленные счётчики вопросов сбрасываются в базу
+ITEM_STATS_FLUSH_SECONDS = 10
+
+# Фоновые задачи (courses.tasks, команда run_tasks). TASKS_EAGER — выполнять
+# сразу в enqueue, без воркера
+TASKS_EAGER = False
+# Периодические задачи: имя -> интервал в секундах
+TASKS_SCHEDULE = {
+    'courses.expire_enrollments': 60 * 60,
+    'courses.rebuild_progress': 60 * 60 * 24,
+    'courses.purge_tasks': 60 * 60 * 24,
+}
+# Сколько хранятся завершённые задачи
+TASKS_KEEP_SECONDS = 60 * 60 * 24 * 7
 
+# Процессов для хэширования паролей при импорте через API: запрос не должен
+# занимать все ядра сервера (команда import_users берёт их все по умолчанию)
+USER_IMPORT_WORKERS = 1
@@ -15,11 +15,13 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from courses.media import serve_media
+from courses.staticfiles import serve_static
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -27,7 +29,8 @@ urlpatterns = [
     path('api/courses/', include('courses.urls')),
     path('summernote/', include('django_summernote.urls')),
     path('nested_admin/', include('nested_admin.urls')),
-]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    # Публичные файлы лучше отдавать веб-сервером напрямую; сюда приходят
+    # остальные запросы, в т.ч. к закрытым файлам (см. courses.media)
+    re_path(rf'^{settings.MEDIA_URL.lstrip("/")}(?P<path>.+)$', serve_media, name='media'),
+    re_path(rf'^{settings.STATIC_URL.lstrip("/")}(?P<path>.+)$', serve_static, name='static'),
+]
\ No newline at end of file